@@ -0,0 +1,132 @@
+"""
+Backtests a sweep of MarketProfile parameters against a synthetic random-walk
+market, one profile at a time and with the profiles stepped together across
+every core.
+
+Usage: poetry run python -m benchmarks.backtest [books] [workers]
+"""
+
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from market_maker.classes.backtest import (
+    MarketHistory,
+    run_backtest,
+    sweep,
+    sweep_profiles,
+)
+from market_maker.classes.order_book import PRICE_LEVELS
+from market_maker.classes.profiles import Distribution, MarketProfile
+
+BASE_PROFILE = MarketProfile(
+    market_ticker="SYNTHETIC",
+    instant_liquidity_cents=10000,
+    max_exposure_cents=20000,
+    price_stickyness=40,
+    spread=3,
+    depth=5,
+    max_spread=10,
+    max_yes_price=90,
+    min_yes_price=10,
+    snipe_timeout_seconds=60,
+    clear_time=None,
+    distribution=Distribution.LINEAR,
+)
+
+GRID = {
+    "spread": [1, 3, 5],
+    "depth": [2, 4, 6],
+    "price_stickyness": [10, 40, 160],
+    "max_exposure_cents": [10000, 20000, 40000],
+}
+
+
+def synthetic_history(books: int, seed: int = 0) -> MarketHistory:
+    """A market whose midpoint random walks between 15 and 85 cents, with a
+    book every second and a trade about every other second."""
+    rng = np.random.default_rng(seed)
+    times = 1.6e9 + np.arange(books, dtype=np.float64)
+    mid = np.clip(
+        50 + np.cumsum(rng.choice([-1, 0, 1], books, p=[0.05, 0.9, 0.05])), 15, 85
+    )
+    half_spread = rng.integers(1, 3, books)
+
+    yes = np.zeros((books, PRICE_LEVELS), dtype=np.int64)
+    no = np.zeros((books, PRICE_LEVELS), dtype=np.int64)
+    rows = np.arange(books)
+    for level in range(10):
+        yes[rows, mid - half_spread - level - 1] = rng.integers(10, 200, books)
+        no[rows, 100 - mid - half_spread - level - 1] = rng.integers(10, 200, books)
+
+    traded = rng.random(books) < 0.5
+    trade_times = times[traded] + 0.5
+    taker_yes = rng.random(len(trade_times)) < 0.5
+    trade_mid = mid[traded]
+    trade_half = half_spread[traded]
+    trade_prices = np.where(
+        taker_yes, trade_mid + trade_half, trade_mid - trade_half
+    ) + rng.integers(0, 3, len(trade_times)) * np.where(taker_yes, 1, -1)
+    trade_counts = rng.integers(1, 100, len(trade_times))
+    volume = (
+        1000
+        + np.concatenate([[0], np.cumsum(trade_counts)])[
+            np.searchsorted(trade_times, times)
+        ]
+    )
+
+    return MarketHistory(
+        times=times,
+        yes=yes,
+        no=no,
+        volume=volume,
+        trade_times=trade_times,
+        trade_prices=trade_prices,
+        trade_counts=trade_counts,
+        trade_taker_yes=taker_yes,
+        settlement=int(mid[-1] > 50) * 100,
+    )
+
+
+if __name__ == "__main__":
+    books = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    history = synthetic_history(books)
+    profiles = sweep_profiles(BASE_PROFILE, GRID)
+
+    start = perf_counter()
+    run_backtest(BASE_PROFILE, history)
+    single = perf_counter() - start
+
+    start = perf_counter()
+    results = sweep(profiles, history, max_workers=workers)
+    elapsed = perf_counter() - start
+
+    print(
+        "%d books, %d trades: %.0fms per backtest"
+        % (books, len(history.trade_times), single * 1e3)
+    )
+    print(
+        "%d profiles on %d workers: %.1fs (%.1fx serial)"
+        % (len(profiles), workers, elapsed, single * len(profiles) / elapsed)
+    )
+    print()
+    print("spread depth sticky max_exp      pnl  drawdown  fills  max_exp  uptime")
+    for result in sorted(results, key=lambda r: -r.pnl_cents)[:10]:
+        p = result.profile
+        print(
+            "%6d %5d %6d %7d %8.0f %9.0f %6d %8d %6.1f%%"
+            % (
+                p.spread,
+                p.depth,
+                p.price_stickyness,
+                p.max_exposure_cents,
+                result.pnl_cents,
+                result.max_drawdown_cents,
+                result.fills,
+                result.max_exposure_cents,
+                result.quote_uptime * 100,
+            )
+        )
@@ -0,0 +1,89 @@
+"""
+Compares the time to cancel every resting order market by market, fetching
+and cancelling each market's orders in turn, against the kill switch's paged
+sweep and parallel batch cancels, on the local mock exchange.
+
+Usage: poetry run python -m benchmarks.kill_switch [markets] [orders] [latency_ms]
+"""
+
+import io
+import sys
+from contextlib import redirect_stdout
+from dataclasses import replace
+from time import perf_counter
+from typing import Callable, Tuple
+
+from benchmarks.make import BASE_PROFILE, UNLIMITED
+from market_maker.classes.environment import Environment
+from market_maker.classes.kill_switch import KillSwitch
+from market_maker.classes.maker_client import MakerClient
+from market_maker.classes.market_maker import MarketMaker
+from market_maker.classes.mock_exchange import MockExchange, MockExchangeConfig
+from market_maker.classes.profiles import StrategyProfile
+
+
+def per_market(client: MakerClient, exchange: MockExchange) -> None:
+    for market_id in list(exchange.markets):
+        client.reconcile_orders(market_id)
+        client.clear_orders(client.order_state.market_order_ids(market_id))
+
+
+def kill_switch(client: MakerClient, exchange: MockExchange) -> None:
+    KillSwitch(client, max_concurrency=16).flatten()
+
+
+def measure(
+    flatten: Callable[[MakerClient, MockExchange], None],
+    markets: int,
+    orders: int,
+    latency_ms: float,
+) -> Tuple[float, int]:
+    """Rests `orders` orders in each market, then flattens them. Returns the
+    seconds it took and the requests it made."""
+    strategy = StrategyProfile(
+        Environment.LOCAL,
+        [replace(BASE_PROFILE, market_ticker="LOCAL-%d" % i) for i in range(markets)],
+        rate_limit=UNLIMITED,
+    )
+    exchange = MockExchange(
+        MockExchangeConfig(latency_secs=latency_ms / 1e3), port=0
+    ).start()
+    try:
+        for market in strategy.markets:
+            market_id = exchange.add_market(market.market_ticker)
+            for i in range(orders):
+                exchange.create_order(
+                    {
+                        "market_id": market_id,
+                        "price": 10 + i % 50,
+                        "side": "yes" if i % 2 == 0 else "no",
+                        "count": 10,
+                        "expiration_unix_ts": 0,
+                    }
+                )
+
+        with redirect_stdout(io.StringIO()):
+            maker = MarketMaker(
+                "benchmark", "benchmark", strategy=strategy, exchange=exchange
+            )
+            requests = sum(exchange.requests.values())
+            start = perf_counter()
+            flatten(maker.client, exchange)
+            seconds = perf_counter() - start
+
+        resting = [o for o in exchange.orders.values() if o["status"] == "resting"]
+        assert len(resting) == 0
+        return seconds, sum(exchange.requests.values()) - requests
+    finally:
+        exchange.stop()
+
+
+if __name__ == "__main__":
+    markets = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    orders = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 20.0
+
+    print("%d markets, %d orders each, %.0fms latency" % (markets, orders, latency_ms))
+    for name, flatten in (("per market", per_market), ("kill switch", kill_switch)):
+        seconds, requests = measure(flatten, markets, orders, latency_ms)
+        print("%-12s time to flat %8.2fs  %5d requests" % (name, seconds, requests))
@@ -0,0 +1,124 @@
+"""
+Measures MarketMaker's polling cycle against the local mock exchange at
+increasing numbers of markets: cycle latency, requests per cycle and the CPU
+the trading loop spends per market.
+
+The first cycle places every quote. In each steady-state cycle after it, one
+order in a tenth of the markets is partially filled, so those markets are
+reconciled and topped up.
+
+Usage: poetry run python -m benchmarks.make [sizes] [cycles] [latency_ms]
+"""
+
+import io
+import random
+import sys
+from contextlib import redirect_stdout
+from dataclasses import replace
+from statistics import mean, median
+from time import perf_counter, thread_time
+from typing import Tuple
+
+from market_maker.classes.environment import Environment
+from market_maker.classes.market_maker import MarketMaker
+from market_maker.classes.mock_exchange import MockExchange, MockExchangeConfig
+from market_maker.classes.profiles import Distribution, MarketProfile, StrategyProfile
+from market_maker.classes.rate_limiter import RateLimitConfig
+from market_maker.classes.scheduler import MarketScheduler
+
+BASE_PROFILE = MarketProfile(
+    market_ticker="",
+    instant_liquidity_cents=10000,
+    max_exposure_cents=20000,
+    price_stickyness=40,
+    spread=3,
+    depth=5,
+    max_spread=10,
+    max_yes_price=67,
+    min_yes_price=10,
+    snipe_timeout_seconds=1200,
+    clear_time=None,
+    distribution=Distribution.LINEAR,
+)
+
+# The benchmark measures the client, not the exchange's rate limits.
+UNLIMITED = RateLimitConfig(
+    reads_per_sec=1e9, read_burst=10**9, writes_per_sec=1e9, write_burst=10**9
+)
+
+
+def run_cycle(
+    maker: MarketMaker, exchange: MockExchange, scheduler: MarketScheduler
+) -> Tuple[float, int, float]:
+    """Runs one full polling cycle. Returns its wall time, the requests it
+    made and the CPU time of the trading loop."""
+    requests = sum(exchange.requests.values())
+    start, cpu = perf_counter(), thread_time()
+    snapshot = maker.refresh()
+    maker.requote(scheduler, sorted(maker.active_market_ids), snapshot)
+    return (
+        perf_counter() - start,
+        sum(exchange.requests.values()) - requests,
+        thread_time() - cpu,
+    )
+
+
+def benchmark(markets: int, cycles: int, latency_ms: float) -> None:
+    strategy = StrategyProfile(
+        Environment.LOCAL,
+        [replace(BASE_PROFILE, market_ticker="LOCAL-%d" % i) for i in range(markets)],
+        rate_limit=UNLIMITED,
+    )
+    exchange = MockExchange(
+        MockExchangeConfig(latency_secs=latency_ms / 1e3, page_size=100), port=0
+    ).start()
+    for market in strategy.markets:
+        exchange.add_market(market.market_ticker)
+    rng = random.Random(0)
+
+    try:
+        with redirect_stdout(io.StringIO()):
+            maker = MarketMaker(
+                "benchmark", "benchmark", strategy=strategy, exchange=exchange
+            )
+            maker.cleanup()
+            scheduler = MarketScheduler(strategy.scheduler)
+
+            first = run_cycle(maker, exchange, scheduler)
+            steady = []
+            for _ in range(cycles):
+                for market_id in rng.sample(
+                    sorted(maker.active_market_ids), max(1, markets // 10)
+                ):
+                    order_ids = maker.client.order_state.market_order_ids(market_id)
+                    if order_ids:
+                        exchange.fill(rng.choice(order_ids), 5)
+                steady.append(run_cycle(maker, exchange, scheduler))
+    finally:
+        exchange.stop()
+
+    latencies = [wall for wall, _, _ in steady]
+    print(
+        "%5d markets | first cycle %8.1fms %5d requests | "
+        "steady p50 %8.1fms max %8.1fms %6.1f requests %7.1fus CPU/market"
+        % (
+            markets,
+            first[0] * 1e3,
+            first[1],
+            median(latencies) * 1e3,
+            max(latencies) * 1e3,
+            mean(requests for _, requests, _ in steady),
+            mean(cpu for _, _, cpu in steady) / markets * 1e6,
+        )
+    )
+
+
+if __name__ == "__main__":
+    sizes = [
+        int(n)
+        for n in (sys.argv[1] if len(sys.argv) > 1 else "1,10,100,1000").split(",")
+    ]
+    cycles = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    for markets in sizes:
+        benchmark(markets, cycles, latency_ms)
@@ -0,0 +1,97 @@
+"""
+Compares the per-market cost of building and diffing books with the previous
+pandas representation against the array-backed OrderBook.
+
+Usage: poetry run python -m benchmarks.order_book [iterations]
+"""
+
+import sys
+import tracemalloc
+from time import perf_counter
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from market_maker.classes.order_book import OrderBook
+from market_maker.classes.order_state import RestingOrder
+
+ORDERS = [RestingOrder("y%d" % p, "m", p, True, 25) for p in range(36, 41)] + [
+    RestingOrder("n%d" % p, "m", p, False, 20) for p in range(54, 59)
+]
+LEVELS = [[p, 10 * p] for p in range(20, 45)]
+DESIRED_YES = {p: 25 for p in range(35, 40)}
+DESIRED_NO = {p: 20 for p in range(54, 59)}
+
+
+def pandas_cycle() -> List[int]:
+    yes_levels = pd.DataFrame(LEVELS, columns=["p", "q"])
+    yes_levels = yes_levels.sort_values("p", ascending=False).reset_index(drop=True)
+    yes_levels.set_index("p").reindex(np.arange(1, 100, 1), fill_value=0)
+
+    orders = pd.DataFrame([o.__dict__ for o in ORDERS])
+    pseudo_book = (
+        orders.groupby(["price", "is_yes"])
+        .sum()[["remaining_count"]]
+        .reset_index()
+        .rename(columns={"remaining_count": "q", "price": "p"})
+    )
+    books: Tuple[pd.DataFrame, pd.DataFrame] = (
+        pseudo_book.query("is_yes==True")[["p", "q"]]
+        .set_index("p")
+        .reindex(np.arange(1, 100, 1), fill_value=0),
+        pseudo_book.query("is_yes==False")[["p", "q"]]
+        .set_index("p")
+        .reindex(np.arange(1, 100, 1), fill_value=0),
+    )
+
+    changed = []
+    for book, desired in zip(books, (DESIRED_YES, DESIRED_NO)):
+        for price in book.index:
+            current_resting = book.loc[price]["q"]
+            if current_resting > 0:
+                if price not in desired or current_resting != desired[price]:
+                    changed.append(price)
+    return changed
+
+
+def order_book_cycle() -> List[int]:
+    OrderBook.from_levels(LEVELS, [])
+    current = OrderBook.from_orders(ORDERS)
+    desired = OrderBook()
+    for side, levels in ((desired.yes, DESIRED_YES), (desired.no, DESIRED_NO)):
+        for price, count in levels.items():
+            side[price - 1] = count
+
+    changed = []
+    for is_yes in (True, False):
+        side = current.side(is_yes)
+        stale = (side > 0) & (side != desired.side(is_yes))
+        changed += (np.flatnonzero(stale) + 1).tolist()
+    return changed
+
+
+def measure(cycle: Callable[[], List[int]], n: int) -> Dict[str, float]:
+    start = perf_counter()
+    for _ in range(n):
+        cycle()
+    elapsed = perf_counter() - start
+
+    tracemalloc.start()
+    cycle()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"us": elapsed / n * 1e6, "peak_kb": peak / 1024}
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    assert pandas_cycle() == order_book_cycle()
+    for name, cycle in (("pandas", pandas_cycle), ("OrderBook", order_book_cycle)):
+        result = measure(cycle, n)
+        print(
+            "%-10s %9.1fus per market  peak allocated %7.1fKiB"
+            % (name, result["us"], result["peak_kb"])
+        )
@@ -0,0 +1,75 @@
+"""
+Compares producing desired books one market at a time against producing
+every market's book in one vectorized pass, for each ladder distribution.
+
+Usage: poetry run python -m benchmarks.quoting [iterations] [depth]
+"""
+
+import random
+import sys
+from time import perf_counter
+from typing import Callable, List
+
+from market_maker.classes.order_book import OrderBook
+from market_maker.classes.positions import Position
+from market_maker.classes.profiles import Distribution, MarketProfile
+from market_maker.classes.quoting import produce_book, vectorized_books
+
+MARKET_COUNTS = (1, 10, 100, 1000)
+
+
+def markets(count: int, depth: int, distribution: Distribution) -> List[tuple]:
+    rand = random.Random(0)
+    result = []
+    for i in range(count):
+        profile = MarketProfile(
+            market_ticker="BENCH-%d" % i,
+            instant_liquidity_cents=rand.randint(1000, 20000),
+            max_exposure_cents=rand.randint(5000, 50000),
+            price_stickyness=40,
+            spread=rand.choice((1, 3, 5)),
+            depth=depth,
+            max_spread=10,
+            max_yes_price=90,
+            min_yes_price=10,
+            snipe_timeout_seconds=None,
+            clear_time=None,
+            distribution=distribution,
+        )
+        contracts = rand.randint(-100, 100)
+        position = Position(contracts, abs(contracts) * rand.randint(20, 80))
+        current = OrderBook()
+        current.yes[rand.randint(20, 60) - 1] = rand.randint(0, 50)
+        result.append((profile, position, current, rand.randint(15, 85)))
+    return result
+
+
+def measure(produce: Callable[[], object], n: int) -> float:
+    start = perf_counter()
+    for _ in range(n):
+        produce()
+    return (perf_counter() - start) / n
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    for distribution in Distribution:
+        for count in MARKET_COUNTS:
+            inputs = markets(count, depth, distribution)
+            columns = [list(column) for column in zip(*inputs)]
+            assert vectorized_books(*columns) == [produce_book(*m) for m in inputs]
+
+            loop = measure(lambda: [produce_book(*market) for market in inputs], n)
+            vectorized = measure(lambda: vectorized_books(*columns), n)
+            print(
+                "%-15s %5d markets, depth %d  per market %8.1fus  vectorized %8.1fus"
+                % (
+                    distribution.name,
+                    count,
+                    depth,
+                    loop / count * 1e6,
+                    vectorized / count * 1e6,
+                )
+            )
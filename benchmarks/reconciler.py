@@ -0,0 +1,70 @@
+"""
+Times Reconciler.plan and compares the requests it issues after random partial
+fills against the previous cancel-and-replace behavior.
+
+Usage: poetry run python -m benchmarks.reconciler [iterations]
+"""
+
+import random
+import sys
+from time import perf_counter
+from typing import List, Tuple
+
+from market_maker.classes.order_book import OrderBook
+from market_maker.classes.order_state import RestingOrder
+from market_maker.classes.reconciler import Reconciler
+
+DEPTH = 5
+LEVEL_SIZE = 25
+
+
+def random_market(rng: random.Random) -> Tuple[OrderBook, List[RestingOrder]]:
+    desired = OrderBook()
+    orders: List[RestingOrder] = []
+    for is_yes, top in ((True, rng.randint(30, 50)), (False, rng.randint(45, 65))):
+        for price in range(top - DEPTH + 1, top + 1):
+            desired.side(is_yes)[price - 1] = LEVEL_SIZE
+            remaining = LEVEL_SIZE
+            # Split each level into a few orders and fill some of them.
+            while remaining > 0:
+                count = min(remaining, rng.randint(5, LEVEL_SIZE))
+                remaining -= count
+                filled = rng.randint(0, count) if rng.random() < 0.2 else 0
+                if count - filled > 0:
+                    orders.append(
+                        RestingOrder(
+                            "o%d" % len(orders), "m", price, is_yes, count - filled
+                        )
+                    )
+    return desired, orders
+
+
+def cancel_replace_requests(desired: OrderBook, orders: List[RestingOrder]) -> int:
+    current = OrderBook.from_orders(orders)
+    requests = 0
+    for is_yes in (True, False):
+        stale = current.side(is_yes) != desired.side(is_yes)
+        stale_prices = set((stale.nonzero()[0] + 1).tolist())
+        requests += sum(
+            1 for o in orders if o.is_yes == is_yes and o.price in stale_prices
+        )
+        requests += len(stale_prices)
+    return requests
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rng = random.Random(0)
+    markets = [random_market(rng) for _ in range(n)]
+    reconciler = Reconciler()
+
+    start = perf_counter()
+    plans = [reconciler.plan("m", desired, orders, 0) for desired, orders in markets]
+    elapsed = perf_counter() - start
+
+    minimal = sum(len(p.cancels) + len(p.decreases) + len(p.posts) for p in plans)
+    replaced = sum(cancel_replace_requests(d, o) for d, o in markets)
+
+    print("%d markets, %.1fus per plan" % (n, elapsed / n * 1e6))
+    print("requests per market: minimal diff %.2f" % (minimal / n))
+    print("requests per market: cancel/replace %.2f" % (replaced / n))
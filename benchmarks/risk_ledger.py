@@ -0,0 +1,111 @@
+"""
+Compares a pre-trade exposure check that sums the positions and resting
+orders of every market, as the exposure was computed before the risk ledger,
+against reserving a requote's orders in the ledger, for growing numbers of
+markets.
+
+Usage: poetry run python -m benchmarks.risk_ledger [iterations] [depth]
+"""
+
+import sys
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Callable, Dict, List
+
+from market_maker.classes.order_state import OrderState
+from market_maker.classes.positions import PositionStore
+from market_maker.classes.risk_ledger import RiskLedger, RiskLimits
+
+MARKET_COUNTS = (10, 100, 1000)
+# Markets per event.
+EVENT_SIZE = 5
+
+
+@dataclass
+class State:
+    ledger: RiskLedger
+    order_state: OrderState
+    positions: PositionStore
+    market_ids: List[str]
+
+
+def build(markets: int, depth: int) -> State:
+    """A ledger fed by the resting orders and positions of `markets` markets,
+    each with `depth` levels on both sides."""
+    ledger = RiskLedger(
+        RiskLimits(
+            max_market_cents=10**9, max_event_cents=10**9, max_total_cents=10**12
+        )
+    )
+    order_state = OrderState(ledger=ledger)
+    positions = PositionStore(ledger)
+    market_ids = ["market-%04d" % i for i in range(markets)]
+    ledger.set_events(
+        {m: "event-%03d" % (i // EVENT_SIZE) for i, m in enumerate(market_ids)}
+    )
+    for market_id in market_ids:
+        order_state.replace(
+            market_id,
+            [
+                {
+                    "order_id": "%s-%d-%d" % (market_id, is_yes, level),
+                    "market_id": market_id,
+                    "price": 40 - level,
+                    "is_yes": is_yes,
+                    "remaining_count": 10,
+                }
+                for is_yes in (True, False)
+                for level in range(depth)
+            ],
+        )
+    positions.refresh(
+        {"market_id": market_id, "position": 5, "position_cost": 200}
+        for market_id in market_ids
+    )
+    return State(ledger, order_state, positions, market_ids)
+
+
+def recompute(state: State, costs: Dict[str, int]) -> None:
+    order_state = state.order_state
+    total = sum(
+        state.positions.get(market_id).position_cost
+        + sum(o.price * o.remaining_count for o in order_state.market_orders(market_id))
+        for market_id in state.market_ids
+    )
+    assert total + sum(costs.values()) < 10**12
+
+
+def reserve(state: State, costs: Dict[str, int]) -> None:
+    state.ledger.reserve(costs)
+    state.ledger.release(costs)
+
+
+def measure(
+    check: Callable[[State, Dict[str, int]], None],
+    state: State,
+    costs: Dict[str, int],
+    iterations: int,
+) -> float:
+    check(state, costs)
+    start = perf_counter()
+    for _ in range(iterations):
+        check(state, costs)
+    return (perf_counter() - start) / iterations * 1e6
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    for markets in MARKET_COUNTS:
+        state = build(markets, depth)
+        # A requote posts to one market at a time.
+        costs = {"market-0000": 2 * depth * 10 * 40}
+        print(
+            "%5d markets | recompute %9.1fus | ledger %6.1fus per check"
+            % (
+                markets,
+                measure(recompute, state, costs, iterations),
+                measure(reserve, state, costs, iterations),
+            )
+        )
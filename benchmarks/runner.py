@@ -0,0 +1,119 @@
+"""
+Compares running several profiles side by side, each with its own client and
+market data as separate processes would, against sharing one client and one
+copy of the market data the way the runner does. Counts the requests and
+logins of each steady polling cycle against the local mock exchange.
+
+Usage: poetry run python -m benchmarks.runner [profiles] [markets] [cycles]
+"""
+
+import io
+import sys
+from contextlib import redirect_stdout
+from dataclasses import replace
+from statistics import median
+from time import perf_counter, sleep
+from typing import List, Tuple
+
+from benchmarks.make import BASE_PROFILE, UNLIMITED
+from market_maker.classes.environment import Environment
+from market_maker.classes.maker_client import MakerClient
+from market_maker.classes.market_data import MarketData
+from market_maker.classes.market_maker import MarketMaker
+from market_maker.classes.mock_exchange import MockExchange, MockExchangeConfig
+from market_maker.classes.profiles import StrategyProfile
+from market_maker.classes.rate_limiter import RateLimiter
+from market_maker.classes.scheduler import MarketScheduler, SchedulerConfig
+
+# Shared market data is served to every profile refreshing within this interval.
+REFRESH_INTERVAL_SECS = 0.5
+
+
+def strategy(profile: int, markets: int) -> StrategyProfile:
+    return StrategyProfile(
+        env=Environment.LOCAL,
+        markets=[
+            replace(BASE_PROFILE, market_ticker="RUN-%d-%d" % (profile, i))
+            for i in range(markets)
+        ],
+        rate_limit=UNLIMITED,
+        scheduler=SchedulerConfig(
+            min_interval_secs=REFRESH_INTERVAL_SECS,
+            refresh_interval_secs=REFRESH_INTERVAL_SECS,
+        ),
+    )
+
+
+def run(profiles: int, markets: int, cycles: int, shared: bool) -> Tuple[float, float]:
+    """Runs every profile's polling cycle in turn. Returns the median requests
+    and milliseconds of a steady cycle over all profiles."""
+    exchange = MockExchange(MockExchangeConfig(page_size=100), port=0).start()
+    strategies = [strategy(p, markets) for p in range(profiles)]
+    for s in strategies:
+        for market in s.markets:
+            exchange.add_market(market.market_ticker)
+    client = MakerClient(
+        Environment.LOCAL, "local", "local", True, rate_limiter=RateLimiter(UNLIMITED)
+    )
+    client.host = exchange.url
+    market_data = MarketData(client, REFRESH_INTERVAL_SECS)
+
+    makers: List[MarketMaker] = []
+    with redirect_stdout(io.StringIO()):
+        for p, s in enumerate(strategies):
+            maker = MarketMaker(
+                "noop",
+                "profile-%d" % p,
+                strategy=s,
+                exchange=exchange,
+                client=client if shared else None,
+                market_data=market_data if shared else None,
+            )
+            maker.start_making()
+            makers.append(maker)
+
+    requests, seconds = [], []
+    try:
+        for cycle in range(cycles + 1):
+            sleep(REFRESH_INTERVAL_SECS)
+            before = sum(exchange.requests.values())
+            start = perf_counter()
+            with redirect_stdout(io.StringIO()):
+                for maker in makers:
+                    snapshot = maker.refresh()
+                    maker.requote(
+                        MarketScheduler(maker.strategy.scheduler),
+                        sorted(maker.active_market_ids),
+                        snapshot,
+                    )
+            if cycle > 0:
+                seconds.append((perf_counter() - start) * 1e3)
+                requests.append(sum(exchange.requests.values()) - before)
+        logins = exchange.requests[("POST", "/v1/log_in")]
+    finally:
+        for maker in makers:
+            maker.close()
+        exchange.stop()
+    print(
+        "%2d profiles x %4d markets | %-8s | %d logins | steady %6.1f requests "
+        "%7.1fms"
+        % (
+            profiles,
+            markets,
+            "shared" if shared else "separate",
+            logins,
+            median(requests),
+            median(seconds),
+        )
+    )
+    return median(requests), median(seconds)
+
+
+if __name__ == "__main__":
+    profiles = [int(sys.argv[1])] if len(sys.argv) > 1 else [2, 4, 8]
+    markets = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    cycles = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    for n in profiles:
+        for shared in (False, True):
+            run(n, markets, cycles, shared)
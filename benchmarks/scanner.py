@@ -0,0 +1,136 @@
+"""
+Times computing and filtering the scanner's features one market at a time
+and with the scanner's pandas frame, over synthetic market lists, then counts
+the requests of a first scan and of rescans against the local mock exchange.
+
+Usage: poetry run python -m benchmarks.scanner [markets] [iterations]
+"""
+
+import sys
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from time import perf_counter, time
+from typing import Any, Dict, List
+
+from benchmarks.make import BASE_PROFILE, UNLIMITED
+from market_maker.classes.environment import Environment
+from market_maker.classes.maker_client import MakerClient
+from market_maker.classes.market_data import MarketData
+from market_maker.classes.market_scanner import MarketScanner, market_features
+from market_maker.classes.mock_exchange import MockExchange, MockExchangeConfig
+from market_maker.classes.profiles import ScannerConfig
+from market_maker.classes.rate_limiter import RateLimiter
+
+CONFIG = ScannerConfig(
+    templates={"SCAN-": BASE_PROFILE},
+    min_volume=100,
+    max_spread=8,
+    min_depth=150,
+)
+
+
+def market_recs(n: int, now: datetime) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": "market-%05d" % i,
+            "ticker_name": ("SCAN-%05d" if i % 4 else "OTHER-%05d") % i,
+            "status": "active" if i % 10 else "closed",
+            "yes_bid": 40,
+            "yes_ask": 42 + i % 10,
+            "volume": i % 500,
+            "close_date": (now + timedelta(hours=1 + i % 200)).isoformat(),
+        }
+        for i in range(n)
+    ]
+
+
+def per_market(recs: List[Dict[str, Any]], now: float) -> List[str]:
+    """The features and filters of the scanner, one record at a time."""
+    passed = []
+    for rec in recs:
+        spread = rec["yes_ask"] - rec["yes_bid"]
+        hours = (datetime.fromisoformat(rec["close_date"]).timestamp() - now) / 3600
+        template = None
+        for prefix in sorted(CONFIG.templates, key=len):
+            if rec["ticker_name"].startswith(prefix):
+                template = prefix
+        if (
+            rec["status"] == "active"
+            and template is not None
+            and rec["volume"] >= CONFIG.min_volume
+            and CONFIG.min_spread <= spread <= (CONFIG.max_spread or 100)
+            and hours >= CONFIG.min_hours_to_close
+        ):
+            passed.append(rec["ticker_name"])
+    return passed
+
+
+def with_frame(recs: List[Dict[str, Any]], now: float) -> List[str]:
+    frame = market_features(recs, now, CONFIG.templates)
+    passes = (
+        (frame.status == "active")
+        & frame.template.notna()
+        & (frame.volume >= CONFIG.min_volume)
+        & (frame.spread >= CONFIG.min_spread)
+        & (frame.spread <= (CONFIG.max_spread or 100))
+        & (frame.hours_to_close >= CONFIG.min_hours_to_close)
+    )
+    return list(frame.ticker_name[passes])
+
+
+def rescan_requests(markets: int, config: ScannerConfig) -> None:
+    exchange = MockExchange(MockExchangeConfig(page_size=100), port=0).start()
+    now = datetime.now(timezone.utc)
+    for rec in market_recs(markets, now):
+        exchange.add_market(
+            rec["ticker_name"],
+            yes_bid=rec["yes_bid"],
+            yes_ask=rec["yes_ask"],
+            volume=rec["volume"],
+            close_date=rec["close_date"],
+        )
+    client = MakerClient(
+        Environment.LOCAL, "local", "local", True, rate_limiter=RateLimiter(UNLIMITED)
+    )
+    client.host = exchange.url
+    scanner = MarketScanner(MarketData(client), config)
+    counts = []
+    try:
+        for _ in range(4):
+            before = sum(exchange.requests.values())
+            scanner.scan()
+            counts.append(sum(exchange.requests.values()) - before)
+    finally:
+        exchange.stop()
+    print(
+        "%6d markets | list kept %4.0fs | requests per scan: first %d, then %s"
+        % (
+            markets,
+            config.market_list_ttl_secs,
+            counts[0],
+            ", ".join(str(c) for c in counts[1:]),
+        )
+    )
+
+
+if __name__ == "__main__":
+    sizes = [int(sys.argv[1])] if len(sys.argv) > 1 else [1000, 10000]
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    now = datetime.now(timezone.utc)
+    for n in sizes:
+        recs = market_recs(n, now)
+        assert per_market(recs, time()) == with_frame(recs, time())
+        timings = {}
+        for name, scan in (("per market", per_market), ("frame", with_frame)):
+            start = perf_counter()
+            for _ in range(iterations):
+                scan(recs, time())
+            timings[name] = (perf_counter() - start) / iterations * 1e3
+        print(
+            "%6d markets | per market %8.1fms | frame %7.1fms"
+            % (n, timings["per market"], timings["frame"])
+        )
+    for n in sizes:
+        for ttl in (0.0, CONFIG.market_list_ttl_secs):
+            rescan_requests(n, replace(CONFIG, market_list_ttl_secs=ttl))
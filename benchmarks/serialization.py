@@ -0,0 +1,141 @@
+"""
+Compares the cost of posting a requote's worth of orders with the previous
+path, which built bodies with dataclasses.asdict and json.dumps and turned
+responses into a DataFrame, against slotted orders, the serialization module
+and typed result records. The current path uses orjson when it is installed.
+
+Usage: poetry run python -m benchmarks.serialization [orders] [iterations]
+"""
+
+import json
+import sys
+import tracemalloc
+from dataclasses import asdict, dataclass
+from time import perf_counter
+from typing import Any, Callable, Dict, List
+
+import pandas as pd
+
+from market_maker.classes.order import Order
+from market_maker.classes.order_state import OrderState
+from market_maker.utils import serialization
+
+# Orders per batch request, as in MakerClient.post_orders.
+BATCH_SIZE = 19
+
+
+@dataclass
+class DataclassOrder:
+    """Order as it was before it was slotted."""
+
+    count: int
+    expiration_unix_ts: int
+    market_id: str
+    price: int
+    side: str
+    sell_position_capped: bool = False
+
+
+def order_fields(n: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "count": 10 + i % 7,
+            "expiration_unix_ts": 0,
+            "market_id": "3f2d1c8e-%04d-4b7a-9e21-5c6d7e8f9a0b" % (i // 10),
+            "price": 20 + i % 40,
+            "side": "yes" if i % 2 == 0 else "no",
+        }
+        for i in range(n)
+    ]
+
+
+def responses(n: int) -> List[bytes]:
+    """The bodies the exchange returns for each batch of posted orders."""
+    recs = [
+        dict(
+            f,
+            order_id="order-%06d" % i,
+            is_yes=f["side"] == "yes",
+            remaining_count=f["count"],
+            status="resting",
+        )
+        for i, f in enumerate(order_fields(n))
+    ]
+    return [
+        json.dumps({"orders": recs[i : i + BATCH_SIZE]}).encode()
+        for i in range(0, n, BATCH_SIZE)
+    ]
+
+
+def previous_path(fields: List[Dict[str, Any]], bodies: List[bytes]) -> Any:
+    orders = [DataclassOrder(**f) for f in fields]
+    recs: list = []
+    order_state = OrderState()
+    for i, body in zip(range(0, len(orders), BATCH_SIZE), bodies):
+        json.dumps({"orders": [asdict(o) for o in orders[i : i + BATCH_SIZE]]})
+        dictr = json.loads(body)
+        order_state.add(dictr["orders"])
+        recs += dictr["orders"]
+    return pd.json_normalize(recs)
+
+
+def current_path(fields: List[Dict[str, Any]], bodies: List[bytes]) -> Any:
+    orders = [Order(**f) for f in fields]
+    posted: list = []
+    order_state = OrderState()
+    for i, body in zip(range(0, len(orders), BATCH_SIZE), bodies):
+        serialization.dumps(
+            {"orders": [o.to_dict() for o in orders[i : i + BATCH_SIZE]]}
+        )
+        posted += order_state.add(serialization.loads(body)["orders"])
+    return posted
+
+
+def measure(
+    path: Callable[[List[Dict[str, Any]], List[bytes]], Any],
+    fields: List[Dict[str, Any]],
+    bodies: List[bytes],
+    iterations: int,
+) -> Dict[str, float]:
+    path(fields, bodies)
+    start = perf_counter()
+    for _ in range(iterations):
+        path(fields, bodies)
+    elapsed = perf_counter() - start
+
+    tracemalloc.start()
+    path(fields, bodies)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"us": elapsed / iterations * 1e6, "peak_kb": peak / 1024}
+
+
+def order_size(order: Any) -> int:
+    """Bytes held by an order object, including its __dict__ if it has one."""
+    size = sys.getsizeof(order)
+    if hasattr(order, "__dict__"):
+        size += sys.getsizeof(order.__dict__)
+    return size
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    fields = order_fields(n)
+    bodies = responses(n)
+    print(
+        "%d orders in batches of %d, JSON backend: %s"
+        % (n, BATCH_SIZE, serialization.BACKEND)
+    )
+    for name, path in (("previous", previous_path), ("current", current_path)):
+        result = measure(path, fields, bodies, iterations)
+        print(
+            "%-9s %9.1fus per requote  %6.2fus per order  peak allocated %7.1fKiB"
+            % (name, result["us"], result["us"] / n, result["peak_kb"])
+        )
+    print(
+        "order object: dataclass %d bytes, slotted %d bytes"
+        % (order_size(DataclassOrder(**fields[0])), order_size(Order(**fields[0])))
+    )
@@ -0,0 +1,93 @@
+"""
+Compares per-call latency of one-shot `requests` calls against the pooled
+keep-alive Transport used by KalshiClient.
+
+Usage: poetry run python -m benchmarks.transport [calls] [handshake_ms]
+
+The mock server sleeps for `handshake_ms` whenever it accepts a new connection
+to stand in for the TCP and TLS handshakes a real exchange connection pays.
+"""
+
+import statistics
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, sleep
+from typing import Callable, List, Tuple
+
+import requests
+
+from market_maker.classes.transport import Transport, TransportConfig
+
+BODY = b'{"market": {"status": "active", "volume": 10, "yes_bid": 40}}'
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    handshake_secs = 0.0
+
+    def get_request(self) -> Tuple:
+        request = super().get_request()
+        sleep(self.handshake_secs)
+        return request
+
+
+def time_calls(call: Callable[[], object], n: int) -> List[float]:
+    samples = []
+    for _ in range(n):
+        start = perf_counter()
+        call()
+        samples.append((perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name: str, samples: List[float]) -> None:
+    samples = sorted(samples)
+    print(
+        "%-12s mean %7.3fms  p50 %7.3fms  p99 %7.3fms"
+        % (
+            name,
+            statistics.mean(samples),
+            samples[len(samples) // 2],
+            samples[int(len(samples) * 0.99) - 1],
+        )
+    )
+
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    handshake_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+
+    server = MockServer(("127.0.0.1", 0), MockHandler)
+    server.handshake_secs = handshake_ms / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:%d/v1/markets/abc" % server.server_address[1]
+
+    transport = Transport(TransportConfig())
+
+    print("%d calls, %.1fms simulated handshake" % (calls, handshake_ms))
+    one_shot = time_calls(lambda: requests.get(url), calls)
+    pooled = time_calls(lambda: transport.request("GET", url), calls)
+    report("one-shot", one_shot)
+    report("pooled", pooled)
+    print(
+        "saved per call: %.3fms" % (statistics.mean(one_shot) - statistics.mean(pooled))
+    )
+
+    transport.close()
+    server.shutdown()
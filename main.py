@@ -2,16 +2,53 @@ import sys
 from pathlib import Path
 
 from market_maker.classes.market_maker import MarketMaker
+from market_maker.classes.runner import Runner
+from market_maker.utils.strategy_config import DEFAULT_CONFIG_PATH, load_strategies
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    flags = {arg for arg in sys.argv[1:] if arg.startswith("--")}
+    config_paths = [
+        flag.split("=", 1)[1] for flag in flags if flag.startswith("--config=")
+    ]
+
+    if len(args) < 1:
         print("Please enter an operation.")
 
-    operation = sys.argv[1]
-    profile = "default" if len(sys.argv) == 2 else sys.argv[2]
+    operation = args[0]
+    profile = "default" if len(args) == 1 else args[1]
 
     auth = Path("./credentials.yaml")
     if not auth.is_file():
         print("Please create an authentication file as specified in the README.")
 
-    MarketMaker(operation, profile)
+    if operation == "run":
+        # Every named profile is run in this process, sharing market data.
+        profiles = args[1:] if len(args) > 1 else ["default"]
+        config_path = config_paths[0] if len(config_paths) > 0 else DEFAULT_CONFIG_PATH
+        strategies = load_strategies(config_path)
+        missing = [profile for profile in profiles if profile not in strategies]
+        if len(missing) > 0:
+            print("No strategy found with this name:", ", ".join(missing))
+            sys.exit(1)
+        Runner(
+            {profile: strategies[profile] for profile in profiles},
+            use_async="--async" in flags,
+            use_stream="--stream" in flags,
+            record="--record" in flags,
+            metrics="--metrics" in flags,
+            config_path=config_path,
+            reload="--reload" in flags,
+        ).run()
+        sys.exit(0)
+
+    MarketMaker(
+        operation,
+        profile,
+        use_async="--async" in flags,
+        use_stream="--stream" in flags,
+        record="--record" in flags,
+        metrics="--metrics" in flags,
+        config_path=config_paths[0] if len(config_paths) > 0 else None,
+        reload="--reload" in flags,
+    )
@@ -0,0 +1,68 @@
+import asyncio
+from typing import TYPE_CHECKING, Any, Callable, Iterable, List, Optional, TypeVar
+
+from market_maker.classes.maker_client import MakerClient
+from market_maker.classes.market_snapshot import MarketSnapshot
+from market_maker.classes.order import Order
+from market_maker.classes.order_book import OrderBook
+from market_maker.classes.order_state import RestingOrder
+from market_maker.classes.reconciler import Decrease
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+T = TypeVar("T")
+
+
+class AsyncMakerClient:
+    """Mirrors MakerClient with coroutine methods.
+
+    Each call runs on a worker thread over the wrapped client's pooled
+    transport. At most `max_concurrency` calls are in flight at once, so every
+    coroutine sharing this client also shares one request budget."""
+
+    def __init__(self, client: MakerClient, max_concurrency: int = 8):
+        self.client = client
+        self.budget = asyncio.Semaphore(max_concurrency)
+
+    async def _call(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        async with self.budget:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def get_public_markets(self, active: bool = True) -> "pd.DataFrame":
+        return await self._call(self.client.get_public_markets, active)
+
+    async def get_market(self, market_id: str) -> dict:
+        return await self._call(self.client.get_market, market_id)
+
+    async def get_market_snapshot(self, market_ids: Iterable[str]) -> MarketSnapshot:
+        return await self._call(self.client.get_market_snapshot, market_ids)
+
+    async def get_positions(self) -> "pd.DataFrame":
+        return await self._call(self.client.get_positions)
+
+    async def refresh_positions(self) -> None:
+        await self._call(self.client.refresh_positions)
+
+    async def get_market_orders(self, market_id: str) -> "pd.DataFrame":
+        return await self._call(self.client.get_market_orders, market_id)
+
+    async def reconcile_orders(
+        self, market_id: str, position: Optional[int] = None
+    ) -> None:
+        await self._call(self.client.reconcile_orders, market_id, position)
+
+    async def get_orderbook(self, market_id: str) -> OrderBook:
+        return await self._call(self.client.get_orderbook, market_id)
+
+    async def get_indiv_orderbook(self, market_id: str) -> OrderBook:
+        return await self._call(self.client.get_indiv_orderbook, market_id)
+
+    async def clear_orders(self, order_ids: List[str]) -> List[str]:
+        return await self._call(self.client.clear_orders, order_ids)
+
+    async def decrease_orders(self, decreases: List[Decrease]) -> None:
+        await self._call(self.client.decrease_orders, decreases)
+
+    async def post_orders(self, orders: List[Order]) -> List[RestingOrder]:
+        return await self._call(self.client.post_orders, orders)
@@ -0,0 +1,368 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from datetime import datetime
+from itertools import product
+from typing import Any, Callable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from market_maker.classes.order_book import PRICE_LEVELS, OrderBook
+from market_maker.classes.positions import Position
+from market_maker.classes.profiles import MarketProfile
+from market_maker.classes.quoter import Quoter
+
+
+@dataclass
+class MarketHistory:
+    """Recorded order books and trades for one market.
+
+    Books are (T, 99) arrays laid out like OrderBook, one row per recorded
+    time. Trades are parallel arrays, one entry per trade."""
+
+    # Seconds since the epoch of each book, ascending.
+    times: np.ndarray
+    yes: np.ndarray
+    no: np.ndarray
+    # Contracts traded in the market's lifetime as of each book.
+    volume: np.ndarray
+    # Seconds since the epoch of each trade, ascending.
+    trade_times: np.ndarray
+    # The yes price of each trade in cents and the contracts it traded.
+    trade_prices: np.ndarray
+    trade_counts: np.ndarray
+    # Whether the taker of each trade bought yes, rather than no.
+    trade_taker_yes: np.ndarray
+    # The yes price the market settled at, if it has.
+    settlement: Optional[int] = None
+
+    @classmethod
+    def load(cls, path: str) -> "MarketHistory":
+        with np.load(path) as data:
+            fields = {name: data[name] for name in data.files}
+        settlement = fields.pop("settlement", None)
+        return cls(
+            **fields,
+            settlement=int(settlement) if settlement is not None else None,
+        )
+
+    def save(self, path: str) -> None:
+        arrays = {
+            name: getattr(self, name)
+            for name in (
+                "times",
+                "yes",
+                "no",
+                "volume",
+                "trade_times",
+                "trade_prices",
+                "trade_counts",
+                "trade_taker_yes",
+            )
+        }
+        if self.settlement is not None:
+            arrays["settlement"] = np.asarray(self.settlement)
+        np.savez_compressed(path, **arrays)
+
+    def top_of_book(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The yes bid and yes ask at every recorded time, as MarketSnapshot
+        reports them: 0 and 100 when a side is empty."""
+        return best_bids(self.yes), 100 - best_bids(self.no)
+
+
+def best_bids(levels: np.ndarray) -> np.ndarray:
+    """The highest price with resting quantity in each row, or 0 if empty."""
+    has_depth = levels > 0
+    top = PRICE_LEVELS - np.argmax(has_depth[:, ::-1], axis=1)
+    return np.where(has_depth.any(axis=1), top, 0)
+
+
+@dataclass
+class BacktestConfig:
+    # Seconds between requotes. At 0, every recorded book is requoted, as when
+    # streaming.
+    requote_interval_secs: float = 0.0
+    # Whether our orders at a trade's price fill along with those priced
+    # better. Without it, only orders the trade priced through are filled.
+    fill_at_touch: bool = True
+
+
+@dataclass
+class BacktestResult:
+    profile: MarketProfile
+    # Profit marked at the settlement price, or the final midpoint.
+    pnl_cents: float
+    max_drawdown_cents: float
+    fills: int
+    contracts_filled: int
+    max_exposure_cents: int
+    mean_exposure_cents: float
+    # The fraction of the recorded time we quoted both sides.
+    quote_uptime: float
+
+
+class MatchingEngine:
+    """Fills the resting orders of several simulated accounts, one per
+    backtested profile, against the same recorded trades.
+
+    Each account's orders are assumed to rest at the front of their level: a
+    trade fills them best price first, up to its size. The accounts never
+    trade with each other, so every trade is matched against all of them at
+    once, as arrays with a row per account."""
+
+    def __init__(
+        self,
+        count: int,
+        fill_at_touch: bool = True,
+        on_fill: Optional[Callable[[int, bool, int], None]] = None,
+    ):
+        self.fill_at_touch = fill_at_touch
+        # Called with the account, side and count of every fill.
+        self.on_fill = on_fill
+        # Resting quantity by account, side (yes, then no) and price.
+        self.resting = np.zeros((count, 2, PRICE_LEVELS), dtype=np.int64)
+        # Positions as PositionStore keeps them: contracts held, positive for
+        # yes, and what was paid for them.
+        self.position = np.zeros(count, dtype=np.int64)
+        self.position_cost = np.zeros(count, dtype=np.int64)
+        self.cash_cents = np.zeros(count, dtype=np.int64)
+        self.yes_bought = np.zeros(count, dtype=np.int64)
+        self.no_bought = np.zeros(count, dtype=np.int64)
+        self.fills = np.zeros(count, dtype=np.int64)
+
+    def book(self, row: int) -> OrderBook:
+        return OrderBook(self.resting[row, 0].copy(), self.resting[row, 1].copy())
+
+    def fill(self, counts: np.ndarray, is_yes: bool, price: int) -> None:
+        """Fills `counts` contracts of each account's orders on one side at
+        one price, moving positions exactly as PositionStore.apply_fill."""
+        rows = np.flatnonzero(counts)
+        count = counts[rows]
+        self.resting[rows, 0 if is_yes else 1, price - 1] -= count
+
+        position = self.position[rows]
+        cost = self.position_cost[rows]
+        held = np.abs(position)
+        adds = (position == 0) | ((position > 0) == is_yes)
+        # Buying the other side closes the position first, pro rata.
+        closed = np.minimum(count, held)
+        reduced = np.where(
+            count > closed,
+            (count - closed) * price,
+            cost - cost * closed // np.maximum(held, 1),
+        )
+        self.position_cost[rows] = np.where(adds, cost + count * price, reduced)
+        self.position[rows] = position + (count if is_yes else -count)
+
+        self.cash_cents[rows] -= count * price
+        if is_yes:
+            self.yes_bought[rows] += count
+        else:
+            self.no_bought[rows] += count
+        self.fills[rows] += 1
+        if self.on_fill is not None:
+            for row, filled in zip(rows, count):
+                self.on_fill(int(row), is_yes, int(filled))
+
+    def cross(self, rows: np.ndarray, yes_bid: int, yes_ask: int) -> None:
+        """Fills orders that a requote of `rows` placed at or through the other
+        side of the recorded book, at their own price."""
+        for is_yes, ask in ((True, yes_ask), (False, 100 - yes_bid)):
+            side = self.resting[rows, 0 if is_yes else 1, ask - 1 :]
+            for index in np.flatnonzero(side.any(axis=0)):
+                counts = np.zeros(len(self.resting), dtype=np.int64)
+                counts[rows] = side[:, index]
+                self.fill(counts, is_yes, ask + int(index))
+
+    def trade(self, yes_price: int, count: int, taker_yes: bool) -> None:
+        # A taker buying yes sells to no bids, and the reverse.
+        is_yes = not taker_yes
+        price = yes_price if is_yes else 100 - yes_price
+        lowest = price if self.fill_at_touch else price + 1
+        if lowest > PRICE_LEVELS:
+            return
+        levels = self.resting[:, 0 if is_yes else 1, lowest - 1 :][:, ::-1]
+        ahead = np.cumsum(levels, axis=1) - levels
+        filled = np.minimum(levels, np.maximum(count - ahead, 0))
+        for index in np.flatnonzero(filled.any(axis=0)):
+            self.fill(filled[:, index], is_yes, PRICE_LEVELS - int(index))
+
+
+def run_backtest(
+    profile: MarketProfile,
+    history: MarketHistory,
+    config: Optional[BacktestConfig] = None,
+) -> BacktestResult:
+    """Replays a market's history through the quoting strategy."""
+    return run_backtests([profile], history, config)[0]
+
+
+def run_backtests(
+    profiles: Sequence[MarketProfile],
+    history: MarketHistory,
+    config: Optional[BacktestConfig] = None,
+) -> List[BacktestResult]:
+    """Replays a market's history through the quoting strategy once for each
+    profile, stepping every profile through the history together.
+
+    Each step's fair values are moved profile by profile, as live, but the
+    desired books of every profile requoted are produced in one vectorized
+    pass, and every trade is matched against all of their orders at once."""
+    config = config if config is not None else BacktestConfig()
+    times = history.times
+    steps = len(times)
+    count = len(profiles)
+
+    yes_bids, yes_asks = history.top_of_book()
+    # Trades from one book up to the next fill against the first book's quotes.
+    trade_bounds = np.searchsorted(history.trade_times, times, side="left")
+    start = int(trade_bounds[0])
+    trade_bounds = np.append(trade_bounds[1:], len(history.trade_times))
+    trade_prices = history.trade_prices.tolist()
+    trade_counts = history.trade_counts.tolist()
+    trade_taker_yes = history.trade_taker_yes.tolist()
+
+    # Each profile is quoted as a market of its own, named by its index.
+    market_ids = [str(row) for row in range(count)]
+    clock = [times[0]]
+    quoter = Quoter(clock=lambda: datetime.fromtimestamp(clock[0]))
+    engine = MatchingEngine(
+        count,
+        config.fill_at_touch,
+        on_fill=lambda row, is_yes, filled: quoter.record_fill(
+            market_ids[row], is_yes, filled
+        ),
+    )
+
+    cash = np.zeros((steps, count))
+    yes_bought = np.zeros((steps, count))
+    no_bought = np.zeros((steps, count))
+    exposure = np.zeros((steps, count))
+    quoted = np.zeros((steps, count), dtype=bool)
+
+    last_requote = -np.inf
+    for i in range(steps):
+        clock[0] = times[i]
+        if times[i] - last_requote >= config.requote_interval_secs:
+            last_requote = times[i]
+            market_details = {
+                "yes_bid": int(yes_bids[i]),
+                "yes_ask": int(yes_asks[i]),
+                "volume": int(history.volume[i]),
+            }
+            # Skipped profiles keep their resting orders, as they do live.
+            rows = [
+                row
+                for row in range(count)
+                if quoter.skip_reason(market_ids[row], profiles[row], market_details)
+                is None
+            ]
+            if len(rows) > 0:
+                fair_values = [
+                    quoter.update_fair_value(
+                        market_ids[row], profiles[row], market_details
+                    )
+                    for row in rows
+                ]
+                books = quoter.produce_books(
+                    [profiles[row] for row in rows],
+                    [
+                        Position(
+                            int(engine.position[row]), int(engine.position_cost[row])
+                        )
+                        for row in rows
+                    ],
+                    [engine.book(row) for row in rows],
+                    fair_values,
+                )
+                requoted = np.array(rows)
+                engine.resting[requoted, 0] = [book.yes for book in books]
+                engine.resting[requoted, 1] = [book.no for book in books]
+                engine.cross(requoted, int(yes_bids[i]), int(yes_asks[i]))
+
+        quoted[i] = np.all(engine.resting.any(axis=2), axis=1)
+        for k in range(start, trade_bounds[i]):
+            engine.trade(trade_prices[k], trade_counts[k], trade_taker_yes[k])
+        start = trade_bounds[i]
+
+        cash[i] = engine.cash_cents
+        yes_bought[i] = engine.yes_bought
+        no_bought[i] = engine.no_bought
+        exposure[i] = engine.position_cost
+
+    # Mark every step to its midpoint, and the last to the settlement if known.
+    marks = (yes_bids + yes_asks) / 2
+    if history.settlement is not None:
+        marks[-1] = history.settlement
+    marks = marks[:, None]
+    value = cash + yes_bought * marks + no_bought * (100 - marks)
+
+    durations = np.diff(times, append=times[-1])
+    total_time = times[-1] - times[0]
+    drawdown = np.max(np.maximum.accumulate(value, axis=0) - value, axis=0)
+
+    return [
+        BacktestResult(
+            profile=profile,
+            pnl_cents=float(value[-1, row]),
+            max_drawdown_cents=float(drawdown[row]),
+            fills=int(engine.fills[row]),
+            contracts_filled=int(engine.yes_bought[row] + engine.no_bought[row]),
+            max_exposure_cents=int(exposure[:, row].max()),
+            mean_exposure_cents=float(exposure[:, row].mean()),
+            quote_uptime=(
+                float(durations[quoted[:, row]].sum() / total_time)
+                if total_time > 0
+                else 0.0
+            ),
+        )
+        for row, profile in enumerate(profiles)
+    ]
+
+
+# Each sweep worker process receives the history once, when it starts.
+_worker_history: Optional[MarketHistory] = None
+_worker_config: Optional[BacktestConfig] = None
+
+
+def _init_worker(history: MarketHistory, config: Optional[BacktestConfig]) -> None:
+    global _worker_history, _worker_config
+    _worker_history = history
+    _worker_config = config
+
+
+def _run_worker(profiles: List[MarketProfile]) -> List[BacktestResult]:
+    assert _worker_history is not None
+    return run_backtests(profiles, _worker_history, _worker_config)
+
+
+def sweep_profiles(
+    profile: MarketProfile, grid: Mapping[str, Sequence[Any]]
+) -> List[MarketProfile]:
+    """Every combination of the values in `grid`, applied to `profile`."""
+    return [
+        replace(profile, **dict(zip(grid.keys(), values)))
+        for values in product(*grid.values())
+    ]
+
+
+def sweep(
+    profiles: Sequence[MarketProfile],
+    history: MarketHistory,
+    config: Optional[BacktestConfig] = None,
+    max_workers: Optional[int] = None,
+) -> List[BacktestResult]:
+    """Backtests many profiles against one history in parallel, one process
+    per core, each stepping its share of the profiles together. Results are
+    in the order of `profiles`."""
+    workers = max_workers if max_workers is not None else os.cpu_count() or 1
+    workers = max(1, min(workers, len(profiles)))
+    if workers == 1:
+        return run_backtests(profiles, history, config)
+    shares = [list(profiles[slot::workers]) for slot in range(workers)]
+    with ProcessPoolExecutor(
+        workers, initializer=_init_worker, initargs=(history, config)
+    ) as pool:
+        results = list(pool.map(_run_worker, shares))
+    # Shares were dealt round robin, so their results are collected the same way.
+    return [results[i % workers][i // workers] for i in range(len(profiles))]
@@ -0,0 +1,98 @@
+import os
+from dataclasses import dataclass, field, fields
+from typing import Dict, List, Optional
+
+from market_maker.classes.profiles import MarketProfile, StrategyProfile
+from market_maker.utils.strategy_config import load_strategies
+
+# Settings of a strategy that take effect without restarting.
+RELOADABLE_SETTINGS = {"markets", "risk", "scanner"}
+
+
+@dataclass
+class MarketChanges:
+    """How one list of market profiles differs from another."""
+
+    added: List[MarketProfile] = field(default_factory=list)
+    removed: List[MarketProfile] = field(default_factory=list)
+    changed: List[MarketProfile] = field(default_factory=list)
+
+
+@dataclass
+class StrategyChanges:
+    """How a reloaded strategy differs from the one running."""
+
+    strategy: StrategyProfile
+    markets: MarketChanges
+    # Changed settings that only take effect on a restart.
+    needs_restart: List[str] = field(default_factory=list)
+
+
+def diff_markets(old: List[MarketProfile], new: List[MarketProfile]) -> MarketChanges:
+    """Compares two lists of market profiles, matching markets by ticker."""
+    changes = MarketChanges()
+    old_markets: Dict[str, MarketProfile] = {m.market_ticker: m for m in old}
+    new_markets: Dict[str, MarketProfile] = {m.market_ticker: m for m in new}
+    for ticker, market in new_markets.items():
+        if ticker not in old_markets:
+            changes.added.append(market)
+        elif market != old_markets[ticker]:
+            changes.changed.append(market)
+    changes.removed = [m for t, m in old_markets.items() if t not in new_markets]
+    return changes
+
+
+def diff_strategies(old: StrategyProfile, new: StrategyProfile) -> StrategyChanges:
+    return StrategyChanges(
+        new,
+        diff_markets(old.markets, new.markets),
+        [
+            f.name
+            for f in fields(StrategyProfile)
+            if f.name not in RELOADABLE_SETTINGS
+            and getattr(old, f.name) != getattr(new, f.name)
+        ],
+    )
+
+
+class ConfigWatcher:
+    """Reloads a profile from its config file whenever the file is modified.
+
+    Checking costs one stat of the file, so it can be done every cycle. A file
+    that fails to load is reported and the running strategy is kept."""
+
+    def __init__(self, path: str, profile: str, strategy: StrategyProfile):
+        self.path = path
+        self.profile = profile
+        self.strategy = strategy
+        self.modified = self.modified_ns()
+
+    def modified_ns(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def poll(self) -> Optional[StrategyChanges]:
+        """The changes to the profile since the last poll, if its file was
+        modified and still loads."""
+        modified = self.modified_ns()
+        if modified is None or modified == self.modified:
+            return None
+        self.modified = modified
+
+        try:
+            strategies = load_strategies(self.path)
+        except Exception as e:
+            print("Failed to reload", self.path)
+            print(str(e))
+            return None
+        if self.profile not in strategies:
+            print(
+                "Failed to reload", self.path, "(no strategy named %s)" % self.profile
+            )
+            return None
+
+        changes = diff_strategies(self.strategy, strategies[self.profile])
+        self.strategy = changes.strategy
+        return changes
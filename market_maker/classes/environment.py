@@ -4,3 +4,5 @@ from enum import Enum
 class Environment(Enum):
     DEMO = 1
     PROD = 2
+    # An in-process mock exchange, see mock_exchange.py.
+    LOCAL = 3
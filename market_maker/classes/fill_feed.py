@@ -0,0 +1,98 @@
+from dataclasses import dataclass
+from time import time
+from typing import TYPE_CHECKING, Container, List, Optional
+
+from market_maker.classes.maker_client import MakerClient
+from market_maker.classes.recorder import FILL
+
+if TYPE_CHECKING:
+    # The quoter depends on the profiles, which depend on FillsConfig.
+    from market_maker.classes.quoter import Quoter
+
+
+@dataclass
+class FillsConfig:
+    # File the fill cursor and each market's fair value are saved to after
+    # every poll, so that a restart resumes them, or None to start afresh on
+    # every run. Not used for Environment.LOCAL, whose fills end with the mock
+    # exchange.
+    state_path: Optional[str] = ".maker_state.json"
+    # Saved state older than this is ignored, since its fair values are stale.
+    max_state_age_secs: float = 60 * 60
+    # Fills requested per page.
+    page_size: int = 100
+
+
+class FillFeed:
+    """Our fills since the last poll.
+
+    Each poll pages through the fill list from a cursor, so it fetches only
+    fills that are new, and applies those in our markets to the positions,
+    the resting orders and the quoter's fair values. Positions only move by
+    fills between snapshots, so settlements and trades made outside the
+    script do not move fair values."""
+
+    def __init__(
+        self,
+        client: MakerClient,
+        quoter: "Quoter",
+        market_ids: Container[str],
+        config: Optional[FillsConfig] = None,
+        cursor: Optional[str] = None,
+    ):
+        self.client = client
+        self.quoter = quoter
+        self.market_ids = market_ids
+        self.config = config if config is not None else FillsConfig()
+        self.cursor = cursor
+        # Without a cursor, fills from before the feed started are skipped.
+        self.started_ts = int(time())
+
+    def fetch(self) -> List[dict]:
+        """Every fill since the last fetch, in any market. The cursor only
+        advances once all of them are fetched."""
+        fills, cursor = self.client.get_fills(
+            self.cursor, self.started_ts, self.config.page_size
+        )
+        self.cursor = cursor or self.cursor
+        return fills
+
+    def poll(self, apply_positions: bool = True) -> List[dict]:
+        """Applies the fills since the last poll in our markets, and returns
+        them. Without `apply_positions`, positions are left to a snapshot."""
+        fills = [fill for fill in self.fetch() if fill["market_id"] in self.market_ids]
+        for fill in fills:
+            self.apply(fill, apply_positions)
+        self.client.metrics.inc("fills_total", len(fills))
+        return fills
+
+    def apply(self, fill: dict, apply_positions: bool) -> None:
+        client = self.client
+        market_id = fill["market_id"]
+        if client.recorder is not None:
+            client.recorder.record_action(
+                FILL,
+                market_id,
+                fill["order_id"],
+                fill["is_yes"],
+                fill["price"],
+                fill["count"],
+            )
+        if apply_positions:
+            client.position_store.apply_fill(
+                market_id, fill["is_yes"], fill["count"], fill["price"]
+            )
+        client.order_state.apply_fill(
+            market_id,
+            fill["order_id"],
+            fill["count"],
+            client.position_store.get(market_id).position,
+        )
+        self.quoter.record_fill(market_id, fill["is_yes"], fill["count"])
+
+    def catch_up(self) -> None:
+        """Applies the fills made since the cursor to fair values, then replaces
+        positions with a snapshot, which already includes them. Called while
+        we have no resting orders, so that nothing fills in between."""
+        self.poll(apply_positions=False)
+        self.client.refresh_positions()
@@ -1,17 +1,70 @@
-import json
+import threading
+from dataclasses import dataclass
 from datetime import datetime as dt
 from datetime import timedelta
+from time import perf_counter, sleep
 from typing import Any, Callable, Dict, Optional
 
-import requests
-
 from market_maker.classes.environment import Environment
+from market_maker.classes.metrics import NULL_METRICS, Metrics
+from market_maker.classes.rate_limiter import RateLimiter
+from market_maker.classes.transport import Response, Transport, TransportError
+from market_maker.utils.serialization import dumps
+from market_maker.utils.session_cache import load_session, save_session
 
 hosts: Dict[Environment, str] = {
     Environment.DEMO: "https://demo-api.kalshi.co",
     Environment.PROD: "https://trading-api.kalshi.com",
+    Environment.LOCAL: "http://127.0.0.1:8910",
+}
+
+# Push feeds of order book changes and our fills.
+feed_hosts: Dict[Environment, str] = {
+    Environment.DEMO: "wss://demo-api.kalshi.co/v1/ws",
+    Environment.PROD: "wss://trading-api.kalshi.com/v1/ws",
+    Environment.LOCAL: "ws://127.0.0.1:8911/v1/ws",
 }
 
+# Path segments following these hold ids, which are dropped from the endpoint
+# names requests are measured under.
+ID_SEGMENTS = {"users", "markets", "orders", "markets_by_ticker"}
+
+# Seconds between attempts to renew a session after a failed login.
+LOGIN_RETRY_SECS = 30.0
+
+
+@dataclass
+class SessionConfig:
+    # File that session tokens are kept in between runs, readable only by its
+    # owner, or None to log in on every start. Not used for Environment.LOCAL,
+    # whose sessions end with the mock exchange.
+    cache_path: Optional[str] = ".session.json"
+    # How long a session is used before logging in again.
+    lifetime_secs: float = 5 * 60 * 60
+    # How long before the end of its lifetime a session is renewed in the
+    # background, or None to renew it only once a request finds it expired.
+    refresh_margin_secs: Optional[float] = 10 * 60
+
+    def __post_init__(self) -> None:
+        # A margin as long as the lifetime would renew the session as soon as
+        # it was issued, logging in back to back.
+        if self.refresh_margin_secs is not None and not (
+            0 <= self.refresh_margin_secs < self.lifetime_secs
+        ):
+            raise ValueError(
+                "refresh_margin_secs (%s) should be at least 0 and less than "
+                "lifetime_secs (%s)" % (self.refresh_margin_secs, self.lifetime_secs)
+            )
+
+
+def endpoint_name(path: str) -> str:
+    """A path with its ids replaced, e.g. /v1/users/{id}/orders."""
+    segments = path.split("/")
+    return "/".join(
+        "{id}" if i > 0 and segments[i - 1] in ID_SEGMENTS else segment
+        for i, segment in enumerate(segments)
+    )
+
 
 class HttpError(Exception):
     """Represents an HTTP error with reason and status code."""
@@ -27,13 +80,7 @@ class HttpError(Exception):
 
 def authenticate_call(call: Any) -> Callable:
     def authenticated(self: "KalshiClient", *args: Any, **kwargs: Any) -> Any:
-        time = dt.now()
-        if (
-            self.last_login is None
-            or time - self.last_login > self.reauthenticate_duration
-        ):
-            self.login()
-            self.last_login = time
+        self.ensure_session()
         return call(self, *args, **kwargs)
 
     return authenticated
@@ -43,10 +90,21 @@ class KalshiClient:
     """A simple client that allows utils to call authenticated Kalshi API endpoints."""
 
     def __init__(
-        self, env: Environment, email: str, password: str, use_advanced_api: bool
+        self,
+        env: Environment,
+        email: str,
+        password: str,
+        use_advanced_api: bool,
+        transport: Optional[Transport] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        metrics: Optional[Metrics] = None,
+        session: Optional[SessionConfig] = None,
     ):
         self.env = env
         self.host = hosts[self.env]
+        self.transport = transport if transport is not None else Transport()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.metrics = metrics if metrics is not None else NULL_METRICS
 
         self.email = email
         self.password = password
@@ -54,26 +112,36 @@ class KalshiClient:
         self.token = ""
         self.user_id = ""
         self.last_login: Optional[dt] = None
+        # Serializes logins when the client is shared across threads.
+        self.login_lock = threading.Lock()
 
-        self.reauthenticate_duration = timedelta(hours=5)
+        self.session = session if session is not None else SessionConfig()
+        self.session_cache_path = (
+            self.session.cache_path if env != Environment.LOCAL else None
+        )
+        self.session_refresher: Optional[threading.Thread] = None
+        self.reauthenticate_duration = timedelta(seconds=self.session.lifetime_secs)
         self.use_advanced_api = use_advanced_api
 
         self.markets_url = "/v1/markets"
 
-    def raise_if_bad_response(self, response: requests.Response) -> None:
+    def raise_if_bad_response(self, response: Response) -> None:
         if not response.ok:
-            raise HttpError(response.reason, response.status_code)
+            raise HttpError(response.reason, response.status)
 
     def get_user_url(self) -> str:
+        # The user id is only known once there is a session.
+        self.ensure_session()
         return "/v1/users/" + self.user_id
 
     def get_market_url(self, market_id: str) -> str:
         return "/v1/markets/" + market_id
 
     def login(self) -> None:
-        login_json = json.dumps({"email": self.email, "password": self.password})
-        response = requests.post(
-            self.host + "/v1/log_in",
+        login_json = dumps({"email": self.email, "password": self.password})
+        response = self.paced_request(
+            "POST",
+            "/v1/log_in",
             data=login_json,
             headers={
                 "Content-Type": "application/json",
@@ -85,6 +153,90 @@ class KalshiClient:
         result = response.json()
         self.token = result["token"]
         self.user_id = result["user_id"]
+        self.last_login = dt.now()
+        self.metrics.inc("kalshi_logins_total")
+
+        if self.session_cache_path is not None:
+            try:
+                save_session(
+                    self.session_cache_path,
+                    self.env,
+                    self.email,
+                    self.token,
+                    self.user_id,
+                    self.last_login.timestamp(),
+                )
+            except OSError as e:
+                print("Failed to cache the session")
+                print(str(e))
+
+    def session_expired(self) -> bool:
+        return (
+            self.last_login is None
+            or dt.now() - self.last_login > self.reauthenticate_duration
+        )
+
+    def ensure_session(self) -> None:
+        """Logs in when there is no live session. Once started, the background
+        refresher renews sessions before they expire, so requests only wait
+        on a login when the client starts without a cached session."""
+        if not self.session_expired():
+            return
+        with self.login_lock:
+            if self.last_login is None:
+                self.load_cached_session()
+            if self.session_expired():
+                self.login()
+        self.start_session_refresher()
+
+    def load_cached_session(self) -> None:
+        if self.session_cache_path is None:
+            return
+        session = load_session(self.session_cache_path, self.env, self.email)
+        if session is None:
+            return
+        self.token = session["token"]
+        self.user_id = session["user_id"]
+        self.last_login = dt.fromtimestamp(session["issued_at"])
+
+    def start_session_refresher(self) -> None:
+        if (
+            self.session.refresh_margin_secs is None
+            or self.session_refresher is not None
+        ):
+            return
+        self.session_refresher = threading.Thread(
+            target=self.refresh_sessions, daemon=True
+        )
+        self.session_refresher.start()
+
+    def refresh_sessions(self) -> None:
+        """Logs in again shortly before each session expires, off the path of
+        any request."""
+        margin = timedelta(seconds=self.session.refresh_margin_secs or 0)
+        while True:
+            last_login = self.last_login if self.last_login is not None else dt.now()
+            due = last_login + self.reauthenticate_duration - margin
+            wait = (due - dt.now()).total_seconds()
+            if wait > 0:
+                sleep(wait)
+                continue
+            try:
+                with self.login_lock:
+                    self.login()
+            except Exception as e:
+                # Any failure is retried, since the thread renews sessions
+                # for the life of the client.
+                print("Failed to renew the session")
+                print(repr(e))
+                sleep(LOGIN_RETRY_SECS)
+
+    def renew_session(self, stale_token: str) -> None:
+        """Logs in again after a request was refused with `stale_token`.
+        Requests that were refused with the same token log in only once."""
+        with self.login_lock:
+            if self.token == stale_token:
+                self.login()
 
     def request_headers(self) -> Dict[str, str]:
         return {
@@ -93,27 +245,99 @@ class KalshiClient:
         }
 
     @authenticate_call
-    def get(self, path: str, params: Dict[str, Any] = {}) -> Any:
-        """GETs from an authenticated Kalshi HTTP endpoint.
+    def authenticated_headers(self) -> Dict[str, str]:
+        """Headers for authenticating a connection made outside this client."""
+        return self.request_headers()
 
-        Returns the response body. Raises an HttpError on non-2XX results."""
-        response = requests.get(
-            self.host + path, headers=self.request_headers(), params=params
+    def paced_request(
+        self,
+        method: str,
+        path: str,
+        headers: Dict[str, str],
+        params: Optional[Dict[str, Any]] = None,
+        data: Optional[bytes] = None,
+    ) -> Response:
+        """Sends a request within the client's rate limits.
+
+        Requests that are rate limited by the exchange are retried after the
+        limiter's backoff, up to the configured number of retries."""
+        metrics = self.metrics
+        endpoint = endpoint_name(path)
+        for _ in range(self.rate_limiter.config.max_retries + 1):
+            waited = self.rate_limiter.acquire(method)
+            metrics.observe("kalshi_rate_limit_wait_seconds", waited, method=method)
+
+            start = perf_counter()
+            try:
+                response = self.transport.request(
+                    method, self.host + path, headers=headers, params=params, data=data
+                )
+            except TransportError:
+                metrics.inc(
+                    "kalshi_request_errors_total",
+                    method=method,
+                    endpoint=endpoint,
+                    status="transport",
+                )
+                raise
+            metrics.observe(
+                "kalshi_request_seconds",
+                perf_counter() - start,
+                method=method,
+                endpoint=endpoint,
+            )
+            if not response.ok:
+                metrics.inc(
+                    "kalshi_request_errors_total",
+                    method=method,
+                    endpoint=endpoint,
+                    status=str(response.status),
+                )
+
+            backoff = self.rate_limiter.on_response(
+                method, response.status, response.headers
+            )
+            if backoff is None:
+                break
+        return response
+
+    def send(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        data: Optional[bytes] = None,
+    ) -> Any:
+        """Sends an authenticated request and returns the response body.
+
+        A 401 means the session ended early, so the client logs in again and
+        retries once. Raises an HttpError on non-2XX results."""
+        token = self.token
+        response = self.paced_request(
+            method, path, headers=self.request_headers(), params=params, data=data
         )
+        if response.status == 401:
+            self.renew_session(token)
+            response = self.paced_request(
+                method, path, headers=self.request_headers(), params=params, data=data
+            )
         self.raise_if_bad_response(response)
         return response.json()
 
+    @authenticate_call
+    def get(self, path: str, params: Dict[str, Any] = {}) -> Any:
+        """GETs from an authenticated Kalshi HTTP endpoint.
+
+        Returns the response body. Raises an HttpError on non-2XX results."""
+        return self.send("GET", path, params=params)
+
     @authenticate_call
     def post(self, path: str, body: Dict[str, Any]) -> Any:
         """POSTs to an authenticated Kalshi HTTP endpoint.
 
         Returns the response body. Raises an HttpError on non-2XX results.
         """
-        response = requests.post(
-            self.host + path, data=json.dumps(body), headers=self.request_headers()
-        )
-        self.raise_if_bad_response(response)
-        return response.json()
+        return self.send("POST", path, data=dumps(body))
 
     @authenticate_call
     def delete(self, path: str, body: Dict[str, Any]) -> Any:
@@ -121,8 +345,4 @@ class KalshiClient:
 
         Returns the response body. Raises an HttpError on non-2XX results.
         """
-        response = requests.delete(
-            self.host + path, data=json.dumps(body), headers=self.request_headers()
-        )
-        self.raise_if_bad_response(response)
-        return response.json()
+        return self.send("DELETE", path, data=dumps(body))
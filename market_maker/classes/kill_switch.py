@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from time import monotonic
+from typing import Iterable, List, Optional, Set
+
+from market_maker.classes.kalshi_client import HttpError
+from market_maker.classes.maker_client import MakerClient
+from market_maker.classes.transport import TransportError
+
+# Order ids per batch cancel request.
+BATCH_SIZE = 19
+
+
+@dataclass
+class FlattenReport:
+    # Resting orders found by the first sweep.
+    found: int
+    cancelled: int
+    # Resting orders still found by the last sweep.
+    remaining: int
+    sweeps: int
+    seconds: float
+
+    @property
+    def flat(self) -> bool:
+        return self.remaining == 0
+
+
+class KillSwitch:
+    """Cancels every resting order as fast as the rate limit allows.
+
+    Each sweep fetches all of our resting orders with one paged request rather
+    than one per market, and cancels them in batches sent in parallel. Every
+    request still passes through the client's rate limiter, so the batches go
+    out as fast as the write budget refills. Sweeps repeat until one finds no
+    orders, which verifies that we are flat."""
+
+    def __init__(self, client: MakerClient, max_concurrency: int = 8):
+        self.client = client
+        self.max_concurrency = max_concurrency
+
+    def resting_orders(self, market_ids: Optional[Set[str]]) -> List[dict]:
+        return [
+            rec
+            for rec in self.client.get_resting_orders()
+            if market_ids is None or rec["market_id"] in market_ids
+        ]
+
+    def cancel(self, order_ids: List[str]) -> int:
+        """Cancels orders in parallel batches. Returns how many were cancelled;
+        failed batches are left for the next sweep."""
+        size = BATCH_SIZE if self.client.use_advanced_api else 1
+        batches = [order_ids[i : i + size] for i in range(0, len(order_ids), size)]
+        cancelled = 0
+        with ThreadPoolExecutor(self.max_concurrency) as executor:
+            futures = [executor.submit(self.client.clear_orders, b) for b in batches]
+            for batch, future in zip(batches, futures):
+                try:
+                    future.result()
+                    cancelled += len(batch)
+                except (HttpError, TransportError) as e:
+                    print("Failed to cancel", len(batch), "orders")
+                    print(str(e))
+        return cancelled
+
+    def flatten(
+        self, market_ids: Optional[Iterable[str]] = None, max_sweeps: int = 5
+    ) -> FlattenReport:
+        """Cancels our resting orders in some markets, or in every market, and
+        reports how long it took to find none left."""
+        markets = set(market_ids) if market_ids is not None else None
+        started = monotonic()
+
+        recs = self.resting_orders(markets)
+        found = len(recs)
+        # Load the orders into the order state, so that cancels are recorded
+        # against their markets.
+        order_state = self.client.order_state
+        order_state.seed({rec["market_id"] for rec in recs}, recs)
+        cancelled = 0
+        sweeps = 1
+        while len(recs) > 0 and sweeps <= max_sweeps:
+            cancelled += self.cancel([rec["order_id"] for rec in recs])
+            recs = self.resting_orders(markets)
+            sweeps += 1
+
+        swept = markets if markets is not None else set(order_state.orders)
+        order_state.seed(swept | {rec["market_id"] for rec in recs}, recs)
+        report = FlattenReport(
+            found, cancelled, len(recs), sweeps, monotonic() - started
+        )
+        self.client.metrics.observe("time_to_flat_seconds", report.seconds)
+        if report.flat:
+            print(
+                "Flat in %.2fs: cancelled %d orders in %d sweeps"
+                % (report.seconds, report.cancelled, report.sweeps)
+            )
+        else:
+            print(
+                "NOT FLAT after %.2fs: %d orders still resting"
+                % (report.seconds, report.remaining)
+            )
+        return report
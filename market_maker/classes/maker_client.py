@@ -1,24 +1,87 @@
-from dataclasses import asdict
-from time import sleep
-from typing import List, Tuple
-
-import numpy as np
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from time import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Set, Tuple
 
 from market_maker.classes.environment import Environment
-from market_maker.classes.kalshi_client import HttpError, KalshiClient
+from market_maker.classes.kalshi_client import HttpError, KalshiClient, SessionConfig
+from market_maker.classes.market_snapshot import MarketSnapshot
+from market_maker.classes.metrics import Metrics
 from market_maker.classes.order import Order
+from market_maker.classes.order_book import OrderBook
+from market_maker.classes.order_state import OrderState, RestingOrder
+from market_maker.classes.positions import PositionStore
+from market_maker.classes.rate_limiter import RateLimiter
+from market_maker.classes.reconciler import Decrease
+from market_maker.classes.recorder import CANCEL, DECREASE, POST, Recorder
+from market_maker.classes.risk_ledger import RiskLedger, RiskLimitError, RiskLimits
+from market_maker.classes.transport import Transport
+from market_maker.utils.market_index import load_market_ids, save_market_ids
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Tickers looked up at once when resolving markets.
+LOOKUP_CONCURRENCY = 8
+
+
+@dataclass
+class MarketIndexConfig:
+    # File that the market ids of tickers are kept in between runs, or None to
+    # resolve every ticker on each start. Not used for Environment.LOCAL, whose
+    # markets end with the mock exchange.
+    cache_path: Optional[str] = ".markets.json"
+    # How long a resolved ticker is trusted before it is looked up again.
+    ttl_secs: float = 24 * 60 * 60
+    # Above this many tickers missing from the cache, the full market list is
+    # fetched instead of looking each one up.
+    max_lookups: int = 20
 
 
 class MakerClient(KalshiClient):
     def __init__(
-        self, env: Environment, email: str, password: str, use_advanced_api: bool
+        self,
+        env: Environment,
+        email: str,
+        password: str,
+        use_advanced_api: bool,
+        transport: Optional[Transport] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        metrics: Optional[Metrics] = None,
+        session: Optional[SessionConfig] = None,
+        risk_limits: Optional[RiskLimits] = None,
     ):
-        super().__init__(env, email, password, use_advanced_api)
+        super().__init__(
+            env,
+            email,
+            password,
+            use_advanced_api,
+            transport,
+            rate_limiter,
+            metrics,
+            session,
+        )
+        self.risk = RiskLedger(risk_limits)
+        self.order_state = OrderState(ledger=self.risk)
+        self.position_store = PositionStore(self.risk)
+        self.recorder: Optional[Recorder] = None
 
-    def get_public_markets(self, active: bool = True) -> pd.DataFrame:
-        dictr = self.get(self.markets_url)
-        recs = dictr["markets"]
+    def get_markets(self) -> List[dict]:
+        """Fetches every market, following the list's cursor if it is paged."""
+        recs: List[dict] = []
+        params: Dict[str, Any] = {}
+        while True:
+            dictr = self.get(self.markets_url, params=params)
+            recs += dictr["markets"]
+            cursor = dictr.get("cursor")
+            if not cursor:
+                return recs
+            params = {"cursor": cursor}
+
+    def get_public_markets(self, active: bool = True) -> "pd.DataFrame":
+        import pandas as pd
+
+        recs = self.get_markets()
         df = pd.json_normalize(recs)
 
         if active:
@@ -29,63 +92,186 @@ class MakerClient(KalshiClient):
         dictr = self.get(self.get_market_url(market_id))
         return dictr["market"]
 
-    def get_positions(self) -> pd.DataFrame:
+    def get_market_by_ticker(self, ticker: str) -> Optional[dict]:
+        """The market listed under a ticker, or None if there is none."""
+        try:
+            dictr = self.get("/v1/markets_by_ticker/" + ticker)
+        except HttpError as e:
+            if e.status != 404:
+                raise e
+            return None
+        return dictr["market"]
+
+    def resolve_markets(
+        self, tickers: Iterable[str], config: Optional[MarketIndexConfig] = None
+    ) -> Dict[str, str]:
+        """The ids of the active markets listed under some tickers.
+
+        Tickers resolved within the cache's TTL are not looked up again; their
+        markets may have closed since, which the caller finds out from the
+        market details. The rest are looked up one by one in parallel, or with
+        the full market list when there are many of them."""
+        config = config if config is not None else MarketIndexConfig()
+        cache_path = config.cache_path if self.env != Environment.LOCAL else None
+        tickers = list(dict.fromkeys(tickers))
+        now = time()
+
+        market_ids = (
+            load_market_ids(cache_path, self.env, tickers, now, config.ttl_secs)
+            if cache_path is not None
+            else {}
+        )
+        missing = [ticker for ticker in tickers if ticker not in market_ids]
+        if len(missing) > config.max_lookups:
+            listed = {rec["ticker_name"]: rec for rec in self.get_markets()}
+            recs = [listed.get(ticker) for ticker in missing]
+        elif len(missing) > 0:
+            with ThreadPoolExecutor(min(LOOKUP_CONCURRENCY, len(missing))) as pool:
+                recs = list(pool.map(self.get_market_by_ticker, missing))
+        else:
+            recs = []
+
+        resolved = {
+            rec["ticker_name"]: rec["id"]
+            for rec in recs
+            if rec is not None and rec["status"] == "active"
+        }
+        if cache_path is not None and len(resolved) > 0:
+            try:
+                save_market_ids(cache_path, self.env, resolved, now)
+            except OSError as e:
+                print("Failed to cache market ids")
+                print(str(e))
+        market_ids.update(resolved)
+        return market_ids
+
+    def get_market_snapshot(
+        self, market_ids: Iterable[str], markets: Optional[List[dict]] = None
+    ) -> MarketSnapshot:
+        """Fetches the details of several markets with the paged market list,
+        or takes them from `markets`, a copy of the list fetched already.
+
+        Markets missing from the list are fetched individually."""
+        market_ids = set(market_ids)
+        markets = markets if markets is not None else self.get_markets()
+        snapshot = MarketSnapshot(rec for rec in markets if rec["id"] in market_ids)
+        for market_id in market_ids:
+            if market_id not in snapshot:
+                snapshot.add(self.get_market(market_id))
+        self.risk.set_events(
+            {
+                market_id: rec["event_ticker"]
+                for market_id, rec in snapshot.markets.items()
+                if rec.get("event_ticker")
+            }
+        )
+        if self.recorder is not None:
+            self.recorder.record_markets(snapshot.markets.values())
+        return snapshot
+
+    def get_position_records(self) -> List[dict]:
         dictr = self.get(self.get_user_url() + "/positions")
+        return dictr["market_positions"]
+
+    def get_positions(self) -> "pd.DataFrame":
+        import pandas as pd
 
-        recs = dictr["market_positions"]
+        recs = self.get_position_records()
         df = pd.json_normalize(recs)
         return df
 
-    def get_market_orders(self, market_id: str) -> pd.DataFrame:
+    def refresh_positions(self) -> None:
+        """Replaces the local position store with our positions on the exchange."""
+        recs = self.get_position_records()
+        self.position_store.refresh(recs)
+        if self.recorder is not None:
+            self.recorder.record_positions(recs)
+
+    def get_resting_orders(self, market_id: Optional[str] = None) -> List[dict]:
+        """Fetches our resting orders in one market, or in every market,
+        following the list's cursor if it is paged."""
         orders_url = self.get_user_url() + "/orders"
-        dictr = self.get(
-            orders_url, params={"market_id": market_id, "status": "resting"}
-        )
+        params = {"status": "resting"}
+        if market_id is not None:
+            params["market_id"] = market_id
+        recs: List[dict] = []
+        while True:
+            dictr = self.get(orders_url, params=params)
+            recs += dictr["orders"]
+            cursor = dictr.get("cursor")
+            if not cursor:
+                return recs
+            params = dict(params, cursor=cursor)
+
+    def get_fills(
+        self, cursor: Optional[str], min_ts: int = 0, limit: int = 100
+    ) -> Tuple[List[dict], str]:
+        """Fetches our fills after a cursor, or from `min_ts` without one,
+        oldest first. Returns them with the cursor to fetch newer fills from.
 
-        recs = dictr["orders"]
+        Pages follow the returned cursor, or the time of the page's last fill
+        when there is none. Paging stops once a page brings nothing new."""
+        fills_url = self.get_user_url() + "/fills"
+        recs: List[dict] = []
+        seen: Set[str] = set()
+        while True:
+            params: Dict[str, Any] = {"limit": limit}
+            if cursor:
+                params["cursor"] = cursor
+            else:
+                params["min_ts"] = min_ts
+            dictr = self.get(fills_url, params=params)
+            # Paging by time fetches the fills at the boundary again.
+            page = [fill for fill in dictr["fills"] if fill["trade_id"] not in seen]
+            recs += page
+            seen.update(fill["trade_id"] for fill in page)
+            next_cursor = dictr.get("cursor")
+            if len(dictr["fills"]) < limit or len(page) == 0:
+                return recs, next_cursor or cursor or ""
+            if next_cursor:
+                if next_cursor == cursor:
+                    return recs, next_cursor
+                cursor = next_cursor
+            else:
+                cursor = None
+                min_ts = max(min_ts, page[-1]["ts"])
+
+    def get_market_orders(self, market_id: str) -> "pd.DataFrame":
+        import pandas as pd
+
+        recs = self.get_resting_orders(market_id)
         df = pd.json_normalize(recs)
         return df
 
-    def get_orderbook(self, market_id: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    def reconcile_orders(self, market_id: str, position: Optional[int] = None) -> None:
+        """Refreshes the local order state of a market from the exchange."""
+        self.order_state.replace(
+            market_id, self.get_resting_orders(market_id), position
+        )
+
+    def fetch_orderbook(self, market_id: str) -> OrderBook:
         base_url = self.get_market_url(market_id)
         order_book_url = base_url + "/order_book"
         dictr = self.get(order_book_url)
 
-        yesData = dictr["order_book"]["yes"]
-        noData = dictr["order_book"]["no"]
-
-        yesDf = pd.DataFrame(yesData, columns=["p", "q"])
-        yesDf = yesDf.sort_values("p", ascending=False).reset_index(drop=True)
-
-        noDf = pd.DataFrame(noData, columns=["p", "q"])
-        noDf = noDf.sort_values("p", ascending=False).reset_index(drop=True)
-
-        return yesDf.set_index("p").reindex(
-            np.arange(1, 100, 1), fill_value=0
-        ), noDf.set_index("p").reindex(np.arange(1, 100, 1), fill_value=0)
-
-    def get_indiv_orderbook(self, market_id: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
-        orders = self.get_market_orders(market_id=market_id)
-
-        if len(orders):
-            pseudo_book = (
-                orders.groupby(["price", "is_yes"])
-                .sum()[["remaining_count"]]
-                .reset_index()
-                .rename(columns={"remaining_count": "q", "price": "p"})
-            )
-            noDf = pseudo_book.query("is_yes==False")[["p", "q"]].set_index("p")
-            yesDf = pseudo_book.query("is_yes==True")[["p", "q"]].set_index("p")
-            return yesDf.reindex(np.arange(1, 100, 1), fill_value=0), noDf.reindex(
-                np.arange(1, 100, 1), fill_value=0
-            )
+        return OrderBook.from_levels(
+            dictr["order_book"]["yes"], dictr["order_book"]["no"]
+        )
 
-        noDf = pd.DataFrame(0, index=np.arange(1, 100, 1), columns=["q"])
-        yesDf = pd.DataFrame(0, index=np.arange(1, 100, 1), columns=["q"])
+    def get_orderbook(self, market_id: str) -> OrderBook:
+        """Fetches a market's order book, recording it if recording."""
+        book = self.fetch_orderbook(market_id)
+        if self.recorder is not None:
+            self.recorder.record_book(market_id, book)
+        return book
 
-        return yesDf, noDf
+    def get_indiv_orderbook(self, market_id: str) -> OrderBook:
+        recs = self.get_resting_orders(market_id)
+        return OrderBook.from_orders(RestingOrder.from_dict(rec) for rec in recs)
 
-    def clear_orders(self, order_ids: List[str]) -> pd.DataFrame:
+    def clear_orders(self, order_ids: List[str]) -> List[str]:
+        """Cancels orders and returns the ids of those cancelled, including
+        orders that were already gone."""
         if self.use_advanced_api and len(order_ids) > 0:
             batched_url = self.get_user_url() + "/batch_orders"
             n = min(19, len(order_ids))
@@ -95,7 +281,9 @@ class MakerClient(KalshiClient):
             for group_orders in grouped_orders_list:
                 post_dict = {"ids": group_orders}
                 self.delete(path=batched_url, body=post_dict)
-                sleep(0.3)
+                self.metrics.inc("orders_cancelled_total", len(group_orders))
+                self.record_cancels(group_orders)
+                self.order_state.remove(group_orders)
         elif len(order_ids) > 0:
             order_url_base = self.get_user_url() + "/orders/"
             for order_id in order_ids:
@@ -104,25 +292,80 @@ class MakerClient(KalshiClient):
                 except HttpError as e:
                     if e.status != 404:
                         raise e
-                sleep(0.3)
+                self.metrics.inc("orders_cancelled_total")
+                self.record_cancels([order_id])
+                self.order_state.remove([order_id])
+        return order_ids
+
+    def record_cancels(self, order_ids: List[str]) -> None:
+        if self.recorder is None:
+            return
+        for order_id in order_ids:
+            market_id = self.order_state.order_markets.get(order_id, "")
+            self.recorder.record_action(CANCEL, market_id, order_id)
+
+    def decrease_orders(self, decreases: List[Decrease]) -> None:
+        """Reduces the size of resting orders without losing their queue
+        position."""
+        order_url_base = self.get_user_url() + "/orders/"
+        for decrease in decreases:
+            dictr = self.post(
+                path=order_url_base + decrease.order_id + "/decrease",
+                body={"reduce_by": decrease.reduce_by},
+            )
+            self.order_state.add([dictr["order"]])
+            self.metrics.inc("orders_decreased_total")
+            if self.recorder is not None:
+                self.recorder.record_action(
+                    DECREASE,
+                    dictr["order"]["market_id"],
+                    decrease.order_id,
+                    count=decrease.reduce_by,
+                )
+
+    def post_orders(self, orders: List[Order]) -> List[RestingOrder]:
+        """Posts orders and returns them as the exchange accepted them. Orders
+        that executed in full come back with no remaining count.
 
-    def post_orders(self, orders: List[Order]) -> pd.DataFrame:
-        recs: list = []
-        if self.use_advanced_api:
+        Raises RiskLimitError, posting nothing, if the orders would take our
+        exposure past a limit of the risk ledger."""
+        costs: Dict[str, int] = {}
+        for order in orders:
+            costs[order.market_id] = (
+                costs.get(order.market_id, 0) + order.price * order.count
+            )
+        try:
+            self.risk.reserve(costs)
+        except RiskLimitError as e:
+            self.metrics.inc("risk_rejections_total", scope=e.scope)
+            raise
+        try:
+            posted = self.send_orders(orders)
+        finally:
+            self.risk.release(costs)
+
+        self.metrics.inc("orders_posted_total", len(posted))
+        if self.recorder is not None:
+            for o in posted:
+                self.recorder.record_action(
+                    POST, o.market_id, o.order_id, o.is_yes, o.price, o.remaining_count
+                )
+        return posted
+
+    def send_orders(self, orders: List[Order]) -> List[RestingOrder]:
+        posted: List[RestingOrder] = []
+        if self.use_advanced_api and len(orders) > 0:
             batched_url = self.get_user_url() + "/batch_orders"
             n = min(19, len(orders))
 
             grouped_orders_list = [orders[i : i + n] for i in range(0, len(orders), n)]
             for group_orders in grouped_orders_list:
-                orders_body = {"orders": [asdict(o) for o in group_orders]}
+                orders_body = {"orders": [o.to_dict() for o in group_orders]}
                 dictr = self.post(path=batched_url, body=orders_body)
-                recs += dictr["orders"]
+                posted += self.order_state.add(dictr["orders"])
         else:
             order_url_base = self.get_user_url() + "/orders"
             for order in orders:
-                order_body = asdict(order)
-                dictr = self.post(path=order_url_base, body=order_body)
-                recs.append(dictr["order"])
-
-        df = pd.json_normalize(recs)
-        return df
+                dictr = self.post(path=order_url_base, body=order.to_dict())
+                posted += self.order_state.add([dictr["order"]])
+        return posted
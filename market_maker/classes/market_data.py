@@ -0,0 +1,45 @@
+import threading
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+
+from market_maker.classes.maker_client import MakerClient
+from market_maker.classes.order_book import OrderBook
+
+
+class MarketData:
+    """The public market list and order books of one environment, shared by
+    every maker that trades it.
+
+    Each is fetched at most once per `max_age_secs` and served to every caller
+    in between, so makers running side by side in one process do not repeat
+    each other's requests. With no maximum age, every call fetches afresh.
+    Requests are made with `client`, and count against its rate budget. The
+    records served are shared by every caller, so they are never changed."""
+
+    def __init__(self, client: MakerClient, max_age_secs: float = 0.0):
+        self.client = client
+        self.max_age_secs = max_age_secs
+        self.market_list: Optional[List[dict]] = None
+        self.fetched_at = 0.0
+        self.books: Dict[str, Tuple[OrderBook, float]] = {}
+        # Held while the market list is fetched, so that concurrent callers
+        # wait for one fetch rather than each making their own.
+        self.lock = threading.Lock()
+
+    def markets(self, max_age_secs: Optional[float] = None) -> List[dict]:
+        """Every market, as the paged market list returns them. A caller that
+        can use an older list passes its own `max_age_secs`."""
+        max_age = self.max_age_secs if max_age_secs is None else max_age_secs
+        with self.lock:
+            if self.market_list is None or monotonic() - self.fetched_at >= max_age:
+                self.market_list = self.client.get_markets()
+                self.fetched_at = monotonic()
+            return self.market_list
+
+    def orderbook(self, market_id: str) -> OrderBook:
+        cached = self.books.get(market_id)
+        if cached is not None and monotonic() - cached[1] < self.max_age_secs:
+            return cached[0]
+        book = self.client.fetch_orderbook(market_id)
+        self.books[market_id] = (book, monotonic())
+        return book
@@ -0,0 +1,211 @@
+import json
+import threading
+from time import monotonic, sleep
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from market_maker.classes.kalshi_client import feed_hosts
+from market_maker.classes.maker_client import MakerClient
+from market_maker.classes.market_snapshot import MarketSnapshot
+from market_maker.classes.order_book import OrderBook
+from market_maker.classes.recorder import FILL
+from market_maker.classes.websocket import WebSocket, WebSocketClosed
+
+RECONNECT_BACKOFF_SECS = [0.5, 1, 2, 5, 10]
+# The feed is pinged after this long without a message, and reconnected if it
+# stays silent for as long again.
+PING_INTERVAL_SECS = 30.0
+
+
+class MarketFeed:
+    """Keeps local order books current from the exchange's push feed.
+
+    Runs on a background thread. Each market whose top of book moves, or in
+    which one of our orders fills, is reported by `wait_for_changes` so that
+    only those markets are requoted.
+
+    Messages are JSON objects with a `type` and a `msg`:
+      orderbook_snapshot: {market_id, yes: [[price, quantity]], no: [...]}
+      orderbook_delta: {market_id, side, price, delta}
+      fill: {market_id, order_id, is_yes, count, price}
+    """
+
+    def __init__(
+        self,
+        client: MakerClient,
+        market_ids: Iterable[str],
+        url: Optional[str] = None,
+    ):
+        self.client = client
+        self.url = url if url is not None else feed_hosts[client.env]
+        self.market_ids = set(market_ids)
+
+        self.books: Dict[str, OrderBook] = {}
+        self.tops: Dict[str, Tuple[int, int]] = {}
+        self.changed: Set[str] = set()
+        # Fills not yet taken by `take_fills`: market, side and count.
+        self.fills: List[Tuple[str, bool, int]] = []
+        self.condition = threading.Condition()
+
+        self.ws: Optional[WebSocket] = None
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped = True
+        if self.ws is not None:
+            self.ws.close()
+
+    def subscribe(self, market_ids: Iterable[str]) -> None:
+        """Follows more markets while running. Their books arrive as snapshots,
+        and a reconnect subscribes to every followed market again."""
+        added = set(market_ids) - self.market_ids
+        if len(added) == 0:
+            return
+        # Replaced rather than updated, as the feed thread iterates over it.
+        self.market_ids = self.market_ids | added
+        ws = self.ws
+        if ws is not None:
+            try:
+                ws.send_text(self.subscribe_command(added))
+            except OSError as e:
+                print("Market feed disconnected:", str(e))
+
+    def subscribe_command(self, market_ids: Iterable[str]) -> str:
+        return json.dumps(
+            {
+                "id": 1,
+                "cmd": "subscribe",
+                "params": {
+                    "channels": ["orderbook_delta", "fill"],
+                    "market_ids": sorted(market_ids),
+                },
+            }
+        )
+
+    def run(self) -> None:
+        attempt = 0
+        while not self.stopped:
+            try:
+                self.ws = WebSocket.connect(
+                    self.url,
+                    headers=self.client.authenticated_headers(),
+                    timeout=10,
+                    ping_interval=PING_INTERVAL_SECS,
+                )
+                self.ws.send_text(self.subscribe_command(self.market_ids))
+                attempt = 0
+                while True:
+                    self.handle(json.loads(self.ws.recv_text()))
+            except (OSError, WebSocketClosed, ValueError) as e:
+                if self.stopped:
+                    return
+                print("Market feed disconnected:", str(e))
+            except Exception as e:
+                # A failed login or an unexpected message must not end the
+                # feed, or the books it keeps would stop moving.
+                if self.stopped:
+                    return
+                print("Market feed failed:", repr(e))
+            ws, self.ws = self.ws, None
+            if ws is not None:
+                ws.close()
+
+            # Books may have moved while disconnected, so requote everything.
+            with self.condition:
+                self.books.clear()
+                self.tops.clear()
+                self.changed |= self.market_ids
+                self.condition.notify_all()
+            sleep(RECONNECT_BACKOFF_SECS[min(attempt, len(RECONNECT_BACKOFF_SECS) - 1)])
+            attempt += 1
+
+    def handle(self, message: dict) -> None:
+        kind = message.get("type")
+        msg = message.get("msg", {})
+        market_id = msg.get("market_id")
+        if market_id not in self.market_ids:
+            return
+
+        recorder = self.client.recorder
+        if kind == "orderbook_snapshot":
+            book = OrderBook.from_levels(msg.get("yes") or [], msg.get("no") or [])
+            with self.condition:
+                self.books[market_id] = book
+                self.update_top(market_id)
+            if recorder is not None:
+                recorder.record_book(market_id, book)
+        elif kind == "orderbook_delta" and market_id in self.books:
+            with self.condition:
+                book = self.books[market_id]
+                book.side(msg["side"] == "yes")[msg["price"] - 1] += msg["delta"]
+                self.update_top(market_id)
+            if recorder is not None:
+                recorder.record_book(market_id, book)
+        elif kind == "fill":
+            if recorder is not None:
+                recorder.record_action(
+                    FILL,
+                    market_id,
+                    msg["order_id"],
+                    msg["is_yes"],
+                    msg["price"],
+                    msg["count"],
+                )
+            self.client.position_store.apply_fill(
+                market_id, msg["is_yes"], msg["count"], msg["price"]
+            )
+            self.client.order_state.apply_fill(
+                market_id,
+                msg["order_id"],
+                msg["count"],
+                self.client.position_store.get(market_id).position,
+            )
+            with self.condition:
+                self.fills.append((market_id, msg["is_yes"], msg["count"]))
+                self.changed.add(market_id)
+                self.condition.notify_all()
+
+    def update_top(self, market_id: str) -> None:
+        """Flags a market as changed if its top of book moved. Must be called
+        while holding the condition."""
+        book = self.books[market_id]
+        top = (book.best_bid(True), book.best_ask(True))
+        if self.tops.get(market_id) != top:
+            self.tops[market_id] = top
+            self.changed.add(market_id)
+            self.condition.notify_all()
+
+    def wait_for_changes(self, timeout: float) -> Set[str]:
+        """Blocks until a market changes or `timeout` elapses, then returns and
+        resets the markets that changed."""
+        deadline = monotonic() + timeout
+        with self.condition:
+            while not self.changed:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            changed = self.changed
+            self.changed = set()
+            return changed
+
+    def take_fills(self) -> List[Tuple[str, bool, int]]:
+        """Returns and resets the fills received since the last call, so that
+        the thread making markets can apply them to its fair values."""
+        with self.condition:
+            fills = self.fills
+            self.fills = []
+            return fills
+
+    def update_snapshot(self, snapshot: MarketSnapshot) -> None:
+        """Overwrites the top of book in a snapshot with the feed's. The
+        snapshot's records are replaced rather than changed, since they may be
+        shared with other profiles through their market data."""
+        with self.condition:
+            for market_id, (yes_bid, yes_ask) in self.tops.items():
+                market = snapshot.get(market_id)
+                if market is not None:
+                    snapshot.add(dict(market, yes_bid=yes_bid, yes_ask=yes_ask))
@@ -1,306 +1,1083 @@
+import asyncio
+from dataclasses import replace
 from datetime import datetime
-from time import sleep
-from typing import Dict, List, Set, Tuple
-
-import pandas as pd
+from time import monotonic, sleep, time
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Union
 
+from market_maker.classes.async_maker_client import AsyncMakerClient
+from market_maker.classes.config_watcher import (
+    ConfigWatcher,
+    MarketChanges,
+    diff_markets,
+)
+from market_maker.classes.environment import Environment
+from market_maker.classes.fill_feed import FillFeed
+from market_maker.classes.kalshi_client import HttpError
+from market_maker.classes.kill_switch import KillSwitch
 from market_maker.classes.maker_client import MakerClient
+from market_maker.classes.market_data import MarketData
+from market_maker.classes.market_feed import MarketFeed
+from market_maker.classes.market_scanner import MarketScanner
+from market_maker.classes.market_snapshot import MarketSnapshot
+from market_maker.classes.metrics import create_metrics
+from market_maker.classes.mock_exchange import MockExchange
+from market_maker.classes.mock_feed import LOCAL_FEED_PORT, MockFeedServer
 from market_maker.classes.order import Order
-from market_maker.classes.profiles import MarketProfile
-from market_maker.config.custom import get_strategies
+from market_maker.classes.order_book import OrderBook
+from market_maker.classes.profiles import MarketProfile, StrategyProfile
+from market_maker.classes.quoter import Quoter
+from market_maker.classes.quoting import PendingQuote
+from market_maker.classes.rate_limiter import RateLimiter
+from market_maker.classes.reconciler import ActionPlan, Reconciler
+from market_maker.classes.recorder import Recorder
+from market_maker.classes.risk_ledger import RiskLimitError
+from market_maker.classes.scheduler import MarketOutcome, MarketScheduler
+from market_maker.classes.sharding import WorkerContext
+from market_maker.classes.transport import Transport, TransportError
 from market_maker.utils.credentials import get_credentials
+from market_maker.utils.strategy_config import DEFAULT_CONFIG_PATH, load_strategies
+from market_maker.utils.strategy_state import load_state, save_state
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# When streaming, positions and market details are refreshed on this interval
+# and every market is requoted, in case the feed missed an update.
+STREAM_REFRESH_SECS = 60
+# When polling, positions are replaced with the exchange's on this interval,
+# so that a missed fill does not leave them wrong for good.
+POSITIONS_REFRESH_SECS = 60
+# Candidates printed by the scan operation.
+SCAN_REPORT_ROWS = 20
+
 
-# Increasing the polling frequency could lead to
-# rate limiting.
-POLLING_FREQUENCY_SECS = 15
-MARKET_TIMEOUT_SECS = 1
+def expiration_ts(market: MarketProfile) -> int:
+    """When a market's orders expire, or 0 if they rest until cancelled."""
+    return (
+        int(datetime.timestamp(market.clear_time))
+        if market.clear_time is not None
+        else 0
+    )
 
 
 class MarketMaker:
-    def __init__(self, operation: str, profile: str):
+    def __init__(
+        self,
+        operation: str,
+        profile: str,
+        use_async: bool = False,
+        use_stream: bool = False,
+        record: bool = False,
+        strategy: Optional[StrategyProfile] = None,
+        exchange: Optional[MockExchange] = None,
+        metrics: bool = False,
+        worker: Optional[WorkerContext] = None,
+        config_path: Optional[str] = None,
+        reload: bool = False,
+        client: Optional[MakerClient] = None,
+        market_data: Optional[MarketData] = None,
+    ):
         self.profile = profile
+        config_path = config_path if config_path is not None else DEFAULT_CONFIG_PATH
 
         print("Running Strategy:", profile)
-        strategies = get_strategies()
-
-        if profile not in strategies:
-            print("No strategy found with this name.")
-            return
+        if strategy is None:
+            # custom.py is written by each user, so it is only needed when no
+            # strategy is passed in.
+            strategies = load_strategies(config_path)
+            if profile not in strategies:
+                print("No strategy found with this name.")
+                return
+            strategy = strategies[profile]
 
-        self.strategy = strategies[profile]
+        self.strategy = strategy
         print(self.strategy)
         print()
 
+        if operation == "make" and worker is None and strategy.supervisor.workers > 1:
+            # The supervisor runs a MarketMaker in each of its workers.
+            from market_maker.classes.supervisor import Supervisor
+
+            if reload:
+                print("Reloading the config is not supported with worker processes.")
+            if strategy.scanner.interval_secs is not None:
+                print("Scanning markets is not supported with worker processes.")
+            Supervisor(profile, strategy, use_async, use_stream, record, metrics).run()
+            return
+        self.worker = worker
+        self.watcher = (
+            ConfigWatcher(config_path, profile, strategy)
+            if reload and operation == "make" and worker is None
+            else None
+        )
+
+        # Unless one is passed in, the local environment is served by a mock
+        # exchange started in this process, listing every market in the strategy.
+        self.exchange = exchange
+        self.owned_exchange: Optional[MockExchange] = None
+        self.feed_server: Optional[MockFeedServer] = None
+        if (
+            self.strategy.env == Environment.LOCAL
+            and exchange is None
+            and (worker is None or worker.host is None)
+        ):
+            self.exchange = self.owned_exchange = MockExchange(
+                self.strategy.local_exchange
+            ).start()
+            for market in self.strategy.markets:
+                self.owned_exchange.add_market(market.market_ticker)
+            if use_stream:
+                self.feed_server = MockFeedServer(LOCAL_FEED_PORT).start()
+
         self.expiration_ts = {
-            market.market_ticker: int(datetime.timestamp(market.clear_time))
-            if market.clear_time is not None
-            else 0
+            market.market_ticker: expiration_ts(market)
             for market in self.strategy.markets
         }
 
-        self.credentials = get_credentials(self.strategy.env)
-        self.client = MakerClient(
-            self.strategy.env,
-            self.credentials.email,
-            self.credentials.password,
-            self.credentials.advanced_api,
+        # A client passed in belongs to an account other makers in this
+        # process trade as well, along with its metrics and recorder.
+        self.owns_client = client is None
+        if client is not None:
+            self.client = client
+            self.metrics = client.metrics
+        else:
+            self.metrics = create_metrics(
+                replace(self.strategy.metrics, enabled=True)
+                if metrics
+                else self.strategy.metrics
+            )
+            self.credentials = get_credentials(self.strategy.env, self.strategy.account)
+            self.client = MakerClient(
+                self.strategy.env,
+                self.credentials.email,
+                self.credentials.password,
+                self.credentials.advanced_api,
+                Transport(self.strategy.transport),
+                (
+                    worker.rate_limiter
+                    if worker is not None
+                    else RateLimiter(self.strategy.rate_limit)
+                ),
+                self.metrics,
+                self.strategy.session,
+                self.strategy.risk,
+            )
+            if record:
+                self.client.recorder = Recorder(self.strategy.recorder).start()
+        if self.exchange is not None:
+            self.client.host = self.exchange.url
+        elif worker is not None and worker.host is not None:
+            self.client.host = worker.host
+        self.market_data = (
+            market_data if market_data is not None else MarketData(self.client)
         )
 
-        # Produce a list of markets to monitor.
-        self.all_active_markets = self.client.get_public_markets()
-        self.last_positions: Dict[str, int] = {}
-        self.fair_values: Dict[str, int] = {}
-        self.last_snipes: Dict[str, datetime] = {}
+        if operation == "kill":
+            # Flattening every market needs no market list, so skip fetching it.
+            try:
+                self.kill()
+            finally:
+                self.close()
+            return
+
+        self.scanner = MarketScanner(self.market_data, self.strategy.scanner)
+        # The markets the scanner selected, by ticker.
+        self.scanned: Dict[str, MarketProfile] = {}
+        self.last_scan = float("-inf")
+        if operation == "scan":
+            try:
+                self.scan_markets()
+            finally:
+                self.close()
+            return
+
+        # Resolve the markets to monitor from their tickers.
+        market_ids = self.client.resolve_markets(
+            (market.market_ticker for market in self.strategy.markets),
+            self.strategy.market_index,
+        )
+        self.quoter = Quoter()
+        self.reconciler = Reconciler()
 
         self.active_market_ids: Set[str] = set()
+        # Events whose exposure has been reported, to zero those that clear.
+        self.reported_events: Set[str] = set()
         self.market_ids_to_profiles: Dict[str, MarketProfile] = {}
         for market in self.strategy.markets:
-            row = self.all_active_markets[
-                self.all_active_markets["ticker_name"] == market.market_ticker
-            ]
-            if len(row) == 1:
-                market_id = row.iloc[0]["id"]
+            if market.market_ticker in market_ids:
+                market_id = market_ids[market.market_ticker]
                 self.active_market_ids.add(market_id)
                 self.market_ids_to_profiles[market_id] = market
 
-        if operation == "make":
-            self.make()
-        elif operation == "clear":
+        self.state_path = (
+            self.strategy.fills.state_path
+            if self.strategy.env != Environment.LOCAL
+            else None
+        )
+        self.fill_feed = FillFeed(
+            self.client,
+            self.quoter,
+            self.market_ids_to_profiles,
+            self.strategy.fills,
+            self.restore_state(),
+        )
+        self.positions_refreshed = float("-inf")
+
+        try:
+            if operation == "make" and use_stream:
+                self.make_streaming()
+            elif operation == "make" and use_async:
+                asyncio.run(self.make_async())
+            elif operation == "make":
+                self.make()
+            elif operation == "clear":
+                self.cleanup()
+        except SystemExit:
+            # A worker stopped by its supervisor leaves no orders resting.
+            if self.worker is not None:
+                self.clear_on_exit()
+            raise
+        except Exception:
+            # A profile run beside others on a shared client fails alone,
+            # while its process carries on, so it leaves no orders resting
+            # either.
+            if not self.owns_client:
+                self.clear_on_exit()
+            raise
+        finally:
+            self.close()
+
+    def clear_on_exit(self) -> None:
+        """
+        Cancels our orders as we stop, reporting rather than raising a failure.
+        """
+        try:
             self.cleanup()
+        except (HttpError, TransportError) as e:
+            print("Failed to clear our orders")
+            print(str(e))
 
-    def make(self) -> None:
+    def close(self) -> None:
         """
-        Maintain resting orders per specifications.
+        Flushes the recorder and stops any local servers this maker started.
         """
-        self.cleanup()
+        if self.owns_client and self.client.recorder is not None:
+            self.client.recorder.close()
+        if self.owned_exchange is not None:
+            self.owned_exchange.stop()
+        if self.feed_server is not None:
+            self.feed_server.shutdown()
+            self.feed_server.server_close()
 
-        while True:
-            print("Managing active markets:", self.active_market_ids)
-            positions = self.client.get_positions()
-            for market_id in self.active_market_ids:
-                self.manage_orders(market_id, positions)
-                sleep(MARKET_TIMEOUT_SECS)
-            sleep(POLLING_FREQUENCY_SECS)
+    def restore_state(self) -> Optional[str]:
+        """
+        Resumes the fair values the last run of this profile saved, if it saved
+        them recently. Returns the fill cursor they are current to.
+        """
+        if self.state_path is None:
+            return None
+        state = load_state(
+            self.state_path,
+            self.strategy.env,
+            self.profile,
+            time(),
+            self.strategy.fills.max_state_age_secs,
+        )
+        if state is None:
+            return None
+        for market_id, market in state["markets"].items():
+            if market_id in self.market_ids_to_profiles:
+                self.quoter.fair_values[market_id] = market["fair_value"]
+                self.quoter.unabsorbed[market_id] = market["unabsorbed"]
+        print("Resuming fair values of %d markets" % len(self.quoter.fair_values))
+        return state.get("cursor")
 
-    def cleanup(self) -> None:
+    def save_state(self) -> None:
+        """
+        Saves the fill cursor with the fair values that include every fill up
+        to it.
+        """
+        if self.state_path is None:
+            return
+        quoter = self.quoter
+        state = {
+            "saved_at": time(),
+            "cursor": self.fill_feed.cursor,
+            "markets": {
+                market_id: {
+                    "fair_value": fair_value,
+                    "unabsorbed": quoter.unabsorbed[market_id],
+                }
+                for market_id, fair_value in quoter.fair_values.items()
+            },
+        }
+        try:
+            save_state(self.state_path, self.strategy.env, self.profile, state)
+        except OSError as e:
+            print("Failed to save the strategy state")
+            print(str(e))
+
+    def start_making(self) -> None:
+        """
+        Clears our resting orders, then brings fair values and positions up to
+        date with what filled while the script was not running.
+        """
+        self.cleanup()
+        self.fill_feed.catch_up()
+        self.positions_refreshed = monotonic()
+        self.save_state()
+
+    def make(self) -> None:
         """
-        Remove any existing resting orders.
+        Maintain resting orders per specifications.
         """
+        self.start_making()
+
+        scheduler = MarketScheduler(self.strategy.scheduler)
         for market_id in self.active_market_ids:
-            orders = self.client.get_market_orders(market_id=market_id)
-            if len(orders) == 0:
+            scheduler.add(market_id)
+
+        # Requests are paced by the client's rate limiter, so markets are
+        # visited as soon as they are due and the budget allows.
+        snapshot_taken = float("-inf")
+        while True:
+            self.reload_config(scheduler)
+            self.rescan(scheduler)
+            now = monotonic()
+            next_due = scheduler.next_due()
+            if next_due is None or next_due > now:
+                sleep(
+                    next_due - now
+                    if next_due is not None
+                    else self.strategy.scheduler.base_interval_secs
+                )
                 continue
-            print("Clearing", len(orders), "orders from", market_id)
-            order_ids = list(orders["order_id"])
 
-            self.client.clear_orders(order_ids)
-            sleep(MARKET_TIMEOUT_SECS)
+            lag = scheduler.lag(now)
+            due = scheduler.pop_due(now)
+            print("Managing %d due markets, lag %.2fs:" % (len(due), lag), due)
+            if now - snapshot_taken > self.strategy.scheduler.refresh_interval_secs:
+                try:
+                    snapshot = self.refresh()
+                except (HttpError, TransportError) as e:
+                    print("Failed to refresh markets")
+                    print(str(e))
+                    self.postpone(scheduler, due)
+                    continue
+                snapshot_taken = now
+            self.requote(scheduler, due, snapshot)
+            self.observe_cycle(now, due, lag, scheduler.queue_depth())
 
-    def manage_orders(self, market_id: str, positions: pd.DataFrame) -> None:
-        profile = self.market_ids_to_profiles[market_id]
+    def reload_config(self, scheduler: Optional[MarketScheduler] = None) -> List[str]:
+        """
+        Applies the changes to the strategy's config file since the last check,
+        when reloading is on.
 
-        market_details = self.client.get_market(market_id)
-        orders = self.client.get_market_orders(market_id=market_id)
-        order_ids: List[str] = list(orders["order_id"]) if len(orders) > 0 else []
+        Returns the added and updated markets, which are scheduled to be
+        requoted right away.
+        """
+        if self.watcher is None:
+            return []
+        changes = self.watcher.poll()
+        if changes is None:
+            return []
+        print("Reloading Strategy:", self.profile)
+        strategy = changes.strategy
+        needs_restart = changes.needs_restart
+        if self.owns_client:
+            self.client.risk.limits = strategy.risk
+        elif strategy.risk != self.strategy.risk:
+            # The risk limits of a shared client apply to the whole account.
+            needs_restart = needs_restart + ["risk"]
+        if len(needs_restart) > 0:
+            print("Restart to apply changes to:", ", ".join(needs_restart))
+        self.strategy = replace(
+            self.strategy,
+            markets=strategy.markets,
+            risk=strategy.risk if self.owns_client else self.strategy.risk,
+            scanner=strategy.scanner,
+        )
+        self.scanner.config = strategy.scanner
 
-        current_time = datetime.now()
-        if profile.clear_time is not None and current_time > profile.clear_time:
-            print("Clearing:", profile.market_ticker, "(passed clear time)")
-            self.client.clear_orders(order_ids)
-            self.active_market_ids.remove(market_id)
-            return
-        elif market_details["status"] != "active":
-            print("Stopping:", profile.market_ticker, "(closed)")
-            self.active_market_ids.remove(market_id)
-            return
+        # A scanned market now listed in the config is updated rather than
+        # added again.
+        markets = changes.markets
+        for market in list(markets.added):
+            if self.scanned.pop(market.market_ticker, None) is not None:
+                markets.added.remove(market)
+                markets.changed.append(market)
+        return self.apply_market_changes(markets, scheduler)
 
-        # Skip a market that was recently sniped.
+    def rescan(self, scheduler: Optional[MarketScheduler] = None) -> List[str]:
+        """
+        Scans the market list for markets to make once the scanner's interval
+        has passed, when scanning is on, and makes those it selects in place
+        of the markets it selected before. Markets listed in the profile are
+        never selected.
+
+        Returns the added and updated markets, which are scheduled to be
+        requoted right away.
+        """
+        config = self.strategy.scanner
         if (
-            market_id in self.last_snipes
-            and profile.snipe_timeout_seconds is not None
-            and (datetime.now() - self.last_snipes[market_id]).total_seconds()
-            < profile.snipe_timeout_seconds
+            self.worker is not None
+            or config.interval_secs is None
+            or len(config.templates) == 0
+            or monotonic() - self.last_scan < config.interval_secs
         ):
-            return
+            return []
+        self.last_scan = monotonic()
+        try:
+            with self.metrics.time("scan_seconds"):
+                candidates = self.scanner.scan(current=self.scanned)
+        except (HttpError, TransportError) as e:
+            print("Failed to scan markets")
+            print(str(e))
+            return []
+
+        selected = self.select_scanned(candidates)
+        print("Scanned markets: %d candidates" % len(candidates))
+        changes = diff_markets(list(self.scanned.values()), selected)
+        self.scanned = {market.market_ticker: market for market in selected}
+        return self.apply_market_changes(changes, scheduler)
 
-        # If the market has never been traded on, skip it.
-        if market_details["volume"] == 0:
+    def scan_markets(self) -> None:
+        """
+        Scans the market list once and prints the best candidates with their
+        features, and the markets that would be made.
+        """
+        if len(self.strategy.scanner.templates) == 0:
+            print("No scanner templates in this strategy.")
             return
+        candidates = self.scanner.scan()
+        columns = ["ticker_name", "volume", "spread", "hours_to_close", "score"]
+        if "depth" in candidates:
+            columns.insert(-1, "depth")
+        print("%d candidates" % len(candidates))
+        print(candidates[columns].head(SCAN_REPORT_ROWS).to_string(index=False))
+        selected = self.select_scanned(candidates)
+        print("Would make:", [market.market_ticker for market in selected])
 
-        spread_size = market_details["yes_ask"] - market_details["yes_bid"]
-        spread_midpoint = market_details["yes_bid"] + spread_size / 2
+    def select_scanned(self, candidates: "pd.DataFrame") -> List[MarketProfile]:
+        """
+        The scanner's selection from candidates not listed in the profile.
+        """
+        listed = {market.market_ticker for market in self.strategy.markets}
+        return self.scanner.select(
+            candidates[~candidates.ticker_name.isin(listed)], self.scanned
+        )
 
-        # If the spread is currently too large, skip the market.
-        if profile.max_spread is not None and spread_size > profile.max_spread:
-            return
+    def apply_market_changes(
+        self, changes: MarketChanges, scheduler: Optional[MarketScheduler]
+    ) -> List[str]:
+        """
+        Adds, removes and updates markets in place, so that markets whose
+        settings did not change keep their orders. Returns the added and
+        updated markets.
+        """
+        market_ids = {
+            market.market_ticker: market_id
+            for market_id, market in self.market_ids_to_profiles.items()
+        }
+        for market in changes.removed:
+            market_id = market_ids.get(market.market_ticker)
+            if market_id is not None:
+                print("Removing:", market.market_ticker)
+                self.remove_market(market_id)
+                if scheduler is not None:
+                    scheduler.remove(market_id)
 
-        # Reset fair value in response to a snipe.
-        if (
-            market_id in self.fair_values
-            and abs(self.fair_values[market_id] - spread_midpoint) > spread_size / 2
-        ):
-            self.fair_values.pop(market_id)
-            self.last_positions.pop(market_id)
-            self.last_snipes[market_id] = datetime.now()
+        requote: List[str] = []
+        for market in changes.changed:
+            self.expiration_ts[market.market_ticker] = expiration_ts(market)
+            market_id = market_ids.get(market.market_ticker)
+            if market_id is not None:
+                print("Updating:", market.market_ticker)
+                self.market_ids_to_profiles[market_id] = market
+                if market_id in self.active_market_ids:
+                    requote.append(market_id)
+        if len(changes.added) > 0:
+            requote += self.add_markets(changes.added)
+
+        if scheduler is not None:
+            for market_id in requote:
+                scheduler.add(market_id)
+        return requote
+
+    def add_markets(self, markets: List[MarketProfile]) -> List[str]:
+        """
+        Starts making markets while running, after clearing any orders already
+        resting in them. Returns the ids of those that are active.
+        """
+        if self.owned_exchange is not None:
+            listed = {
+                market["ticker_name"]
+                for market in list(self.owned_exchange.markets.values())
+            }
+            for market in markets:
+                if market.market_ticker not in listed:
+                    self.owned_exchange.add_market(market.market_ticker)
+        try:
+            market_ids = self.client.resolve_markets(
+                (market.market_ticker for market in markets),
+                self.strategy.market_index,
+            )
+        except (HttpError, TransportError) as e:
+            print("Failed to add markets")
+            print(str(e))
+            return []
+
+        added: List[str] = []
+        for market in markets:
+            self.expiration_ts[market.market_ticker] = expiration_ts(market)
+            if market.market_ticker not in market_ids:
+                print("Not adding:", market.market_ticker, "(no active market)")
+                continue
+            print("Adding:", market.market_ticker)
+            market_id = market_ids[market.market_ticker]
+            self.market_ids_to_profiles[market_id] = market
+            self.active_market_ids.add(market_id)
+            added.append(market_id)
+        if len(added) > 0:
+            KillSwitch(self.client, self.strategy.transport.pool_maxsize).flatten(added)
+        return added
+
+    def remove_market(self, market_id: str) -> None:
+        """
+        Stops making a market while running and cancels its orders.
+        """
+        try:
+            self.client.clear_orders(
+                self.client.order_state.market_order_ids(market_id)
+            )
+        except (HttpError, TransportError) as e:
+            print("Failed to clear", market_id)
+            print(str(e))
+        self.active_market_ids.discard(market_id)
+        self.market_ids_to_profiles.pop(market_id, None)
+        self.quoter.fair_values.pop(market_id, None)
+        self.quoter.unabsorbed.pop(market_id, None)
 
-        position = positions[positions["market_id"] == market_id]
-        position_count = position.iloc[0]["position"] if len(position) > 0 else 0
+    def refresh(self) -> MarketSnapshot:
+        """
+        Applies our new fills and returns the details of every active market.
+        """
+        with self.metrics.time("refresh_seconds"):
+            self.poll_fills()
+            return self.snapshot()
 
-        if market_id not in self.fair_values:
-            self.fair_values[market_id] = spread_midpoint
-            self.last_positions[market_id] = position_count
+    def poll_fills(self) -> None:
+        """
+        Applies our new fills to fair values, orders and positions. Every
+        POSITIONS_REFRESH_SECS, positions are replaced with the exchange's
+        first, and the fills are then applied to everything but positions,
+        since the exchange's already include them.
+        """
+        full = monotonic() - self.positions_refreshed > POSITIONS_REFRESH_SECS
+        if full:
+            self.client.refresh_positions()
+            self.positions_refreshed = monotonic()
+        self.fill_feed.poll(apply_positions=not full)
+        self.save_state()
 
-        changed_position = position_count - self.last_positions[market_id]
-        fair_value_change = -int(changed_position / profile.price_stickyness)
-        self.fair_values[market_id] += fair_value_change
-        self.last_positions[market_id] += fair_value_change * profile.price_stickyness
+    def snapshot(self) -> MarketSnapshot:
+        """
+        The details of every active market, from the shared market list.
+        """
+        return self.client.get_market_snapshot(
+            self.active_market_ids, self.market_data.markets()
+        )
 
-        desired_yes_book, desired_no_book = self.produce_book(
-            profile, position, orders, int(self.fair_values[market_id])
+    def observe_cycle(
+        self, started: float, market_ids: List[str], lag: float, queue_depth: int
+    ) -> None:
+        """
+        Records the duration of a pass over the due markets, with the lag it
+        started at and the markets that came due while it ran.
+        """
+        seconds = monotonic() - started
+        self.metrics.observe("cycle_seconds", seconds)
+        self.metrics.set("scheduler_lag_seconds", lag)
+        self.metrics.set("scheduler_queue_depth", queue_depth)
+        self.metrics.set("active_markets", len(self.active_market_ids))
+        self.metrics.log(
+            "cycle",
+            markets=len(market_ids),
+            lag=lag,
+            queue_depth=queue_depth,
+            seconds=seconds,
         )
-        current_yes_book, current_no_book = self.client.get_indiv_orderbook(market_id)
-
-        consistent_yes: Set[int] = set()
-        consistent_no: Set[int] = set()
-
-        orders_to_cancel: List[str] = []
-        for price in current_yes_book.index:
-            current_resting = current_yes_book.loc[price]["q"]
-            if current_resting > 0:
-                if (
-                    price not in desired_yes_book
-                    or current_resting != desired_yes_book[price]
-                ):
-                    orders_to_cancel += list(
-                        orders[orders["price"] == price]["order_id"]
-                    )
-                else:
-                    consistent_yes.add(price)
-
-        for price in current_no_book.index:
-            current_resting = current_no_book.loc[price]["q"]
-            if current_resting > 0:
-                if (
-                    price not in desired_no_book
-                    or current_resting != desired_no_book[price]
-                ):
-                    orders_to_cancel += list(
-                        orders[orders["price"] == price]["order_id"]
+        self.observe_risk()
+        if self.worker is not None:
+            self.worker.ledger.set(self.worker.slot, self.exposure_cents())
+
+    def observe_risk(self) -> None:
+        """
+        Reports the risk ledger's exposure in total and by event.
+        """
+        summary = self.client.risk.summary()
+        self.metrics.set("exposure_cents", summary["total"])
+        for event in self.reported_events - summary["events"].keys():
+            self.metrics.set("event_exposure_cents", 0, event=event)
+        for event, cents in summary["events"].items():
+            self.metrics.set("event_exposure_cents", cents, event=event)
+        self.reported_events = set(summary["events"])
+
+    def exposure_cents(self) -> int:
+        """
+        What our positions and resting orders in our markets cost, if every
+        order were filled.
+        """
+        return self.client.risk.markets_cents(self.market_ids_to_profiles)
+
+    def reserve_exposure(self, quote: PendingQuote, posts: List[Order]) -> bool:
+        """
+        Reserves the cost of new orders against the supervisor's global
+        exposure limit, when running as one of its workers.
+
+        Returns whether the orders may be posted.
+        """
+        if self.worker is None or len(posts) == 0:
+            return True
+        cost = sum(order.price * order.count for order in posts)
+        if self.worker.ledger.reserve(self.worker.slot, cost):
+            return True
+        print("Not posting in", quote.profile.market_ticker, "(global exposure limit)")
+        return False
+
+    def postpone(self, scheduler: MarketScheduler, market_ids: List[str]) -> None:
+        """
+        Retries markets that could not be visited after the minimum interval.
+        """
+        retry_at = monotonic() + self.strategy.scheduler.min_interval_secs
+        for market_id in market_ids:
+            scheduler.schedule(market_id, retry_at)
+
+    def requote(
+        self,
+        scheduler: MarketScheduler,
+        market_ids: List[str],
+        snapshot: MarketSnapshot,
+    ) -> None:
+        """
+        Manages the orders of each market and schedules its next visit.
+        """
+        self.record_books(market_ids)
+        outcomes = self.manage_markets(market_ids, snapshot)
+        for market_id in market_ids:
+            self.reschedule(scheduler, market_id, outcomes[market_id], snapshot)
+
+    def make_streaming(self) -> None:
+        """
+        Maintain resting orders per specifications, requoting a market only
+        when the market feed reports that its top of book or our position in
+        it changed.
+        """
+        self.start_making()
+
+        feed = MarketFeed(self.client, self.active_market_ids)
+        feed.start()
+
+        changed: Set[str] = set()
+        # Markets missing from the snapshot are fetched one by one, so an empty
+        # one stands in until the first refresh succeeds.
+        snapshot = MarketSnapshot([])
+        last_refresh = 0.0
+        while True:
+            if monotonic() - last_refresh > STREAM_REFRESH_SECS:
+                try:
+                    self.client.refresh_positions()
+                    # The feed applies fills as they arrive, so the cursor only
+                    # needs to move past them.
+                    self.fill_feed.fetch()
+                    self.save_state()
+                    snapshot = self.snapshot()
+                except (HttpError, TransportError) as e:
+                    # Keep the previous snapshot and retry after the minimum
+                    # interval.
+                    print("Failed to refresh markets")
+                    print(str(e))
+                    last_refresh = (
+                        monotonic()
+                        - STREAM_REFRESH_SECS
+                        + self.strategy.scheduler.min_interval_secs
                     )
                 else:
-                    consistent_no.add(price)
+                    changed |= self.active_market_ids
+                    last_refresh = monotonic()
 
-        self.client.clear_orders(orders_to_cancel)
+            started = monotonic()
+            reloaded = self.reload_config() + self.rescan()
+            feed.subscribe(reloaded)
+            changed.update(reloaded)
+            for market_id, is_yes, count in feed.take_fills():
+                self.quoter.record_fill(market_id, is_yes, count)
+            feed.update_snapshot(snapshot)
+            requoted = sorted(changed & self.active_market_ids)
+            self.manage_markets(requoted, snapshot)
+            self.observe_cycle(started, requoted, 0.0, 0)
 
-        new_orders: List[Order] = []
-        for price, count in desired_yes_book.items():
-            if price in consistent_yes:
-                continue
-            else:
-                new_orders.append(
-                    Order(
-                        count=count,
-                        expiration_unix_ts=self.expiration_ts[profile.market_ticker],
-                        market_id=market_id,
-                        price=price,
-                        side="yes",
-                    )
+            changed = feed.wait_for_changes(
+                timeout=last_refresh + STREAM_REFRESH_SECS - monotonic()
+            )
+
+    async def make_async(self) -> None:
+        """
+        Maintain resting orders per specifications, managing every due market
+        concurrently within the client's shared request budget.
+        """
+        self.start_making()
+
+        client = AsyncMakerClient(
+            self.client, max_concurrency=self.strategy.transport.pool_maxsize
+        )
+        scheduler = MarketScheduler(self.strategy.scheduler)
+        for market_id in self.active_market_ids:
+            scheduler.add(market_id)
+
+        snapshot_taken = float("-inf")
+        while True:
+            await asyncio.to_thread(self.reload_config, scheduler)
+            await asyncio.to_thread(self.rescan, scheduler)
+            now = monotonic()
+            next_due = scheduler.next_due()
+            if next_due is None or next_due > now:
+                await asyncio.sleep(
+                    next_due - now
+                    if next_due is not None
+                    else self.strategy.scheduler.base_interval_secs
                 )
-        for price, count in desired_no_book.items():
-            if price in consistent_no:
                 continue
-            else:
-                new_orders.append(
-                    Order(
-                        count=count,
-                        expiration_unix_ts=self.expiration_ts[profile.market_ticker],
-                        market_id=market_id,
-                        price=price,
-                        side="no",
+
+            lag = scheduler.lag(now)
+            due = scheduler.pop_due(now)
+            print("Managing %d due markets, lag %.2fs:" % (len(due), lag), due)
+            if now - snapshot_taken > self.strategy.scheduler.refresh_interval_secs:
+                try:
+                    _, snapshot = await asyncio.gather(
+                        asyncio.to_thread(self.poll_fills),
+                        asyncio.to_thread(self.snapshot),
                     )
-                )
+                except (HttpError, TransportError) as e:
+                    print("Failed to refresh markets")
+                    print(str(e))
+                    self.postpone(scheduler, due)
+                    continue
+                snapshot_taken = now
+            outcomes = await self.manage_markets_async(client, due, snapshot)
+            for market_id in due:
+                self.reschedule(scheduler, market_id, outcomes[market_id], snapshot)
+            self.observe_cycle(now, due, lag, scheduler.queue_depth())
 
-        try:
-            self.client.post_orders(new_orders)
-        except Exception as e:
-            print("Failed to place orders in", profile.market_ticker)
-            print(str(e))
+    def record_books(self, market_ids: List[str]) -> None:
+        """
+        Fetches the books of markets so that the recorder captures them.
+        """
+        recorder = self.client.recorder
+        if recorder is None or not recorder.config.record_books:
+            return
+        for market_id in market_ids:
+            try:
+                recorder.record_book(market_id, self.market_data.orderbook(market_id))
+            except (HttpError, TransportError) as e:
+                print("Failed to record the book of", market_id)
+                print(str(e))
 
-    def produce_book(
+    async def record_books_async(
+        self, client: AsyncMakerClient, market_ids: List[str]
+    ) -> None:
+        recorder = self.client.recorder
+        if recorder is None or not recorder.config.record_books:
+            return
+        results = await asyncio.gather(
+            *(
+                asyncio.to_thread(self.market_data.orderbook, market_id)
+                for market_id in market_ids
+            ),
+            return_exceptions=True,
+        )
+        for market_id, result in zip(market_ids, results):
+            if isinstance(result, (HttpError, TransportError)):
+                print("Failed to record the book of", market_id)
+                print(str(result))
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                recorder.record_book(market_id, result)
+
+    def reschedule(
         self,
-        profile: MarketProfile,
-        position: pd.DataFrame,
-        orders: pd.DataFrame,
-        fair_value: int,
-    ) -> Tuple[Dict[int, int], Dict[int, int]]:
-        exposure_cents = 0 if len(position) == 0 else position.iloc[0]["position_cost"]
-        holds_yes = len(position) > 0 and position.iloc[0]["position"] > 0
-
-        yes_order_exposure = 0
-        no_order_exposure = 0
-        if len(orders) > 0:
-            yes_orders = orders[orders["is_yes"]]
-            yes_order_exposure = (
-                yes_orders["price"] * yes_orders["remaining_count"]
-            ).sum()
-            no_orders = orders[orders["is_yes"] == False]
-            no_order_exposure = (
-                no_orders["price"] * no_orders["remaining_count"]
-            ).sum()
-
-        desired_yes_book: Dict[int, int] = {}
-        desired_no_book: Dict[int, int] = {}
-
-        # Handle yes side
-        cumulative_yes_exposure = exposure_cents if holds_yes else -exposure_cents
-        cumulative_yes_exposure += yes_order_exposure
-        yes_orders_per_level = int(
-            profile.instant_liquidity_cents / profile.depth / fair_value
+        scheduler: MarketScheduler,
+        market_id: str,
+        outcome: MarketOutcome,
+        snapshot: MarketSnapshot,
+    ) -> None:
+        market_details = snapshot.get(market_id)
+        mid = (
+            (market_details["yes_bid"] + market_details["yes_ask"]) / 2
+            if market_details is not None
+            else None
+        )
+
+        resume_at = None
+        snipe_remaining = self.quoter.snipe_remaining_secs(
+            market_id, self.market_ids_to_profiles[market_id]
         )
-        topOfYes = int(fair_value - (profile.spread - 1) / 2)
-        for i in range(profile.depth):
-            price = topOfYes - i
-            if (
-                price < 1
-                or (profile.max_yes_price is not None and price > profile.max_yes_price)
-                or (profile.min_yes_price is not None and price < profile.min_yes_price)
-            ):
-                break
-            order_price_cents = price * yes_orders_per_level
-            if (
-                order_price_cents + cumulative_yes_exposure
-            ) > profile.max_exposure_cents:
-                break
-            desired_yes_book[price] = yes_orders_per_level
-
-        # Handle no side
-        no_fair_value = 100 - fair_value
-        cumulative_no_exposure = -exposure_cents if holds_yes else exposure_cents
-        cumulative_no_exposure += no_order_exposure
-        no_orders_per_level = int(
-            profile.instant_liquidity_cents / profile.depth / no_fair_value
+        if snipe_remaining is not None:
+            resume_at = monotonic() + snipe_remaining
+
+        self.metrics.inc("market_visits_total", outcome=outcome.name.lower())
+        scheduler.record(
+            market_id,
+            outcome,
+            mid=mid,
+            position=self.client.position_store.get(market_id).position,
+            resume_at=resume_at,
         )
-        topOfNo = int(no_fair_value - (profile.spread - 1) / 2)
-        for i in range(profile.depth):
-            price = topOfNo - i
-            yes_price = 100 - price
-            if (
-                price < 1
-                or (
-                    profile.max_yes_price is not None
-                    and yes_price > profile.max_yes_price
-                )
-                or (
-                    profile.min_yes_price is not None
-                    and yes_price < profile.min_yes_price
+
+    def cleanup(self) -> None:
+        """
+        Remove any existing resting orders from our markets.
+        """
+        KillSwitch(self.client, self.strategy.transport.pool_maxsize).flatten(
+            self.active_market_ids
+        )
+
+    def kill(self) -> None:
+        """
+        Cancel every one of our resting orders in every market, not only the
+        profile's markets, and check that none are left.
+        """
+        KillSwitch(self.client, self.strategy.transport.pool_maxsize).flatten()
+
+    def manage_markets(
+        self, market_ids: List[str], snapshot: MarketSnapshot
+    ) -> Dict[str, MarketOutcome]:
+        """
+        Manages the orders of several markets, producing the desired books of
+        every market being quoted together.
+        """
+        outcomes: Dict[str, MarketOutcome] = {}
+        quotes: List[PendingQuote] = []
+        for market_id in market_ids:
+            try:
+                prepared = self.prepare_quote(market_id, snapshot)
+            except (HttpError, TransportError) as e:
+                self.fail_market(market_id, e)
+                prepared = MarketOutcome.QUOTED
+            if isinstance(prepared, MarketOutcome):
+                outcomes[market_id] = prepared
+            else:
+                quotes.append(prepared)
+
+        for quote, plan in zip(quotes, self.plan_quotes(quotes)):
+            try:
+                self.place_quote(quote, plan)
+            except (HttpError, TransportError) as e:
+                self.fail_market(quote.market_id, e)
+            outcomes[quote.market_id] = MarketOutcome.QUOTED
+        return outcomes
+
+    async def manage_markets_async(
+        self,
+        client: AsyncMakerClient,
+        market_ids: List[str],
+        snapshot: MarketSnapshot,
+    ) -> Dict[str, MarketOutcome]:
+        """
+        The same as manage_markets, but awaits every request on the async
+        client so that the markets are managed concurrently.
+        """
+        outcomes: Dict[str, MarketOutcome] = {}
+        quotes: List[PendingQuote] = []
+        prepared = await asyncio.gather(
+            *(
+                self.prepare_quote_async(client, market_id, snapshot)
+                for market_id in market_ids
+            ),
+            return_exceptions=True,
+        )
+        for market_id, result in zip(market_ids, prepared):
+            if isinstance(result, (HttpError, TransportError)):
+                self.fail_market(market_id, result)
+                outcomes[market_id] = MarketOutcome.QUOTED
+            elif isinstance(result, BaseException):
+                raise result
+            elif isinstance(result, MarketOutcome):
+                outcomes[market_id] = result
+            else:
+                quotes.append(result)
+
+        placed = await asyncio.gather(
+            *(
+                self.place_quote_async(client, quote, plan)
+                for quote, plan in zip(quotes, self.plan_quotes(quotes))
+            ),
+            return_exceptions=True,
+        )
+        for quote, error in zip(quotes, placed):
+            if isinstance(error, (HttpError, TransportError)):
+                self.fail_market(quote.market_id, error)
+            elif isinstance(error, BaseException):
+                raise error
+            outcomes[quote.market_id] = MarketOutcome.QUOTED
+        return outcomes
+
+    def fail_market(self, market_id: str, error: Exception) -> None:
+        self.client.order_state.mark_stale(market_id)
+        print("Failed to manage", market_id)
+        print(str(error))
+
+    def prepare_quote(
+        self, market_id: str, snapshot: MarketSnapshot
+    ) -> Union[MarketOutcome, PendingQuote]:
+        """
+        Decides whether to quote a market and, if so, gathers what its desired
+        book is produced from.
+        """
+        profile = self.market_ids_to_profiles[market_id]
+        order_state = self.client.order_state
+
+        metrics = self.metrics
+        market_details = snapshot.get(market_id)
+        if market_details is None:
+            with metrics.time("manage_phase_seconds", phase="fetch"):
+                market_details = self.client.get_market(market_id)
+
+        if self.retire_market(market_id, market_details):
+            if self.passed_clear_time(profile):
+                self.client.clear_orders(order_state.market_order_ids(market_id))
+            return MarketOutcome.RETIRED
+
+        skip_reason = self.quoter.skip_reason(market_id, profile, market_details)
+        if skip_reason is not None:
+            return skip_reason
+
+        position = self.client.position_store.get(market_id)
+        fair_value = self.quoter.update_fair_value(market_id, profile, market_details)
+
+        if order_state.needs_reconcile(market_id, position.position):
+            with metrics.time("manage_phase_seconds", phase="fetch"):
+                self.client.reconcile_orders(market_id, position.position)
+        orders = order_state.market_orders(market_id)
+        return PendingQuote(market_id, profile, position, orders, fair_value)
+
+    async def prepare_quote_async(
+        self,
+        client: AsyncMakerClient,
+        market_id: str,
+        snapshot: MarketSnapshot,
+    ) -> Union[MarketOutcome, PendingQuote]:
+        profile = self.market_ids_to_profiles[market_id]
+        order_state = self.client.order_state
+
+        metrics = self.metrics
+        market_details = snapshot.get(market_id)
+        if market_details is None:
+            with metrics.time("manage_phase_seconds", phase="fetch"):
+                market_details = await client.get_market(market_id)
+
+        if self.retire_market(market_id, market_details):
+            if self.passed_clear_time(profile):
+                await client.clear_orders(order_state.market_order_ids(market_id))
+            return MarketOutcome.RETIRED
+
+        skip_reason = self.quoter.skip_reason(market_id, profile, market_details)
+        if skip_reason is not None:
+            return skip_reason
+
+        position = self.client.position_store.get(market_id)
+        fair_value = self.quoter.update_fair_value(market_id, profile, market_details)
+
+        if order_state.needs_reconcile(market_id, position.position):
+            with metrics.time("manage_phase_seconds", phase="fetch"):
+                await client.reconcile_orders(market_id, position.position)
+        orders = order_state.market_orders(market_id)
+        return PendingQuote(market_id, profile, position, orders, fair_value)
+
+    def place_quote(self, quote: PendingQuote, plan: ActionPlan) -> None:
+        """
+        Sends the cancels, decreases and posts that move a market's resting
+        orders to its desired book.
+        """
+        with self.metrics.time("manage_phase_seconds", phase="cancel"):
+            self.client.clear_orders(plan.cancels)
+            self.client.decrease_orders(plan.decreases)
+        if not self.reserve_exposure(quote, plan.posts):
+            return
+        try:
+            with self.metrics.time("manage_phase_seconds", phase="post"):
+                self.client.post_orders(plan.posts)
+        except RiskLimitError as e:
+            print("Not posting in", quote.profile.market_ticker, "(%s)" % e)
+        except Exception as e:
+            self.client.order_state.mark_stale(quote.market_id)
+            print("Failed to place orders in", quote.profile.market_ticker)
+            print(str(e))
+
+    async def place_quote_async(
+        self, client: AsyncMakerClient, quote: PendingQuote, plan: ActionPlan
+    ) -> None:
+        with self.metrics.time("manage_phase_seconds", phase="cancel"):
+            await client.clear_orders(plan.cancels)
+            await client.decrease_orders(plan.decreases)
+        if not self.reserve_exposure(quote, plan.posts):
+            return
+        try:
+            with self.metrics.time("manage_phase_seconds", phase="post"):
+                await client.post_orders(plan.posts)
+        except RiskLimitError as e:
+            print("Not posting in", quote.profile.market_ticker, "(%s)" % e)
+        except Exception as e:
+            self.client.order_state.mark_stale(quote.market_id)
+            print("Failed to place orders in", quote.profile.market_ticker)
+            print(str(e))
+
+    def passed_clear_time(self, profile: MarketProfile) -> bool:
+        return profile.clear_time is not None and datetime.now() > profile.clear_time
+
+    def retire_market(self, market_id: str, market_details: dict) -> bool:
+        """
+        Stop managing a market that has passed its clear time or closed.
+
+        Returns whether the market was retired.
+        """
+        profile = self.market_ids_to_profiles[market_id]
+
+        if self.passed_clear_time(profile):
+            print("Clearing:", profile.market_ticker, "(passed clear time)")
+        elif market_details["status"] != "active":
+            print("Stopping:", profile.market_ticker, "(closed)")
+        else:
+            return False
+
+        self.active_market_ids.discard(market_id)
+        if self.worker is not None:
+            self.worker.retired.put(profile.market_ticker)
+        return True
+
+    def plan_quotes(self, quotes: List[PendingQuote]) -> List[ActionPlan]:
+        """
+        Plan the actions that move the resting orders of each market to its
+        desired book, producing every desired book in one pass.
+        """
+        with self.metrics.time("manage_phase_seconds", phase="produce_book"):
+            desired_books = self.quoter.produce_books(
+                [quote.profile for quote in quotes],
+                [quote.position for quote in quotes],
+                [OrderBook.from_orders(quote.orders) for quote in quotes],
+                [quote.fair_value for quote in quotes],
+            )
+
+        plans = []
+        for quote, desired_book in zip(quotes, desired_books):
+            with self.metrics.time("manage_phase_seconds", phase="diff"):
+                plans.append(
+                    self.reconciler.plan(
+                        quote.market_id,
+                        desired_book,
+                        quote.orders,
+                        self.expiration_ts[quote.profile.market_ticker],
+                    )
                 )
-            ):
-                break
-            order_price_cents = price * no_orders_per_level
-            if (
-                order_price_cents + cumulative_no_exposure
-            ) > profile.max_exposure_cents:
-                break
-            desired_no_book[price] = no_orders_per_level
-
-        return desired_yes_book, desired_no_book
+        return plans
@@ -0,0 +1,191 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from time import time
+from typing import TYPE_CHECKING, Collection, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from market_maker.classes.maker_client import LOOKUP_CONCURRENCY
+from market_maker.classes.market_data import MarketData
+from market_maker.classes.order_book import PRICE_LEVELS, OrderBook
+from market_maker.classes.profiles import MarketProfile, ScannerConfig
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Fields of the market list that features are computed from.
+MARKET_COLUMNS = [
+    "id",
+    "ticker_name",
+    "status",
+    "yes_bid",
+    "yes_ask",
+    "volume",
+    "close_date",
+]
+
+
+def market_features(
+    recs: Iterable[dict], now: float, prefixes: Iterable[str]
+) -> "pd.DataFrame":
+    """The spread, hours to close, template and score of every market, computed
+    column-wise over the whole list.
+
+    A market's template is the longest of `prefixes` its ticker starts with,
+    or missing if none. Its score is its volume times its spread, the edge
+    available to a maker."""
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records(list(recs), columns=MARKET_COLUMNS)
+    frame["spread"] = frame.yes_ask - frame.yes_bid
+    close = pd.to_datetime(frame.close_date, utc=True, errors="coerce")
+    frame["hours_to_close"] = (
+        close - pd.Timestamp(now, unit="s", tz="UTC")
+    ).dt.total_seconds() / 3600
+    frame["template"] = None
+    for prefix in sorted(prefixes, key=len):
+        matches = frame.ticker_name.str.startswith(prefix, na=False)
+        frame.loc[matches, "template"] = prefix
+    frame["score"] = frame.volume * frame.spread
+    return frame
+
+
+def book_depths(books: List[OrderBook], levels: int) -> np.ndarray:
+    """The contracts resting within `levels` cents of the best bid on the
+    thinner side of each book, computed over every book at once."""
+    if len(books) == 0:
+        return np.zeros(0, dtype=np.int64)
+    depths = []
+    prices = np.arange(PRICE_LEVELS)
+    for is_yes in (True, False):
+        sides = np.stack([book.side(is_yes) for book in books])
+        # Index of the highest level with quantity, or -1 if the side is empty.
+        best = np.where(
+            sides.any(axis=1),
+            PRICE_LEVELS - 1 - np.argmax(sides[:, ::-1] > 0, axis=1),
+            -1,
+        )
+        near = prices > (best - levels)[:, None]
+        depths.append((sides * near).sum(axis=1))
+    return np.minimum(*depths)
+
+
+class MarketScanner:
+    """Picks the markets to make from the whole market list.
+
+    Each scan reads the market list, paging through it again only once it is
+    older than `market_list_ttl_secs`, computes every market's features in one
+    pass and filters them by the config's rules. When a minimum depth
+    is set, the order books of the best candidates are fetched as well, a
+    limited number per scan. A book's depth is reused by later scans until it
+    ages out or the market's top of book moves, so a rescan costs the market
+    list, if it is due, plus the few books that changed."""
+
+    def __init__(self, market_data: MarketData, config: ScannerConfig):
+        self.market_data = market_data
+        self.config = config
+        # The depth of each fetched book, with the top of book it was fetched
+        # at and when.
+        self.depths: Dict[str, Tuple[int, int, int, float]] = {}
+
+    def scan(
+        self, now: Optional[float] = None, current: Collection[str] = ()
+    ) -> "pd.DataFrame":
+        """Every market that passes the filters, with its features, best score
+        first. `current` are the tickers being made now, whose books are kept
+        fresh so that they are not dropped for a missing depth."""
+        now = now if now is not None else time()
+        config = self.config
+        frame = market_features(
+            self.market_data.markets(config.market_list_ttl_secs),
+            now,
+            config.templates,
+        )
+        passes = (
+            (frame.status == "active")
+            & frame.template.notna()
+            & (frame.volume >= config.min_volume)
+            & (frame.spread >= config.min_spread)
+            & (
+                frame.hours_to_close.isna()
+                | (frame.hours_to_close >= config.min_hours_to_close)
+            )
+        )
+        if config.max_spread is not None:
+            passes &= frame.spread <= config.max_spread
+        if config.max_hours_to_close is not None:
+            passes &= frame.hours_to_close.isna() | (
+                frame.hours_to_close <= config.max_hours_to_close
+            )
+        candidates = frame[passes].sort_values("score", ascending=False)
+        if config.min_depth <= 0:
+            return candidates
+
+        candidates = candidates.assign(
+            depth=self.fetch_depths(candidates, now, current)
+        )
+        return candidates[candidates.depth >= config.min_depth]
+
+    def fetch_depths(
+        self, candidates: "pd.DataFrame", now: float, current: Collection[str]
+    ) -> "pd.Series":
+        """The book depth of each candidate, fetching the books of the best
+        ranked ones whose depth is missing or stale. Candidates left without a
+        fresh depth get NaN.
+
+        Books are only fetched for current markets and for candidates ranked
+        above the point where enough others already have the depth needed to
+        fill every place, so steady rescans fetch few or none."""
+        import pandas as pd
+
+        config = self.config
+        cached = pd.DataFrame.from_dict(
+            self.depths,
+            orient="index",
+            columns=["depth", "depth_yes_bid", "depth_yes_ask", "fetched_at"],
+        )
+        merged = candidates.join(cached, on="id")
+        fresh = (
+            (now - merged.fetched_at < config.depth_ttl_secs)
+            & (merged.depth_yes_bid == merged.yes_bid)
+            & (merged.depth_yes_ask == merged.yes_ask)
+        )
+        deep = fresh & (merged.depth >= config.min_depth)
+        made = merged.ticker_name.isin(current)
+        needed = (deep.cumsum() - deep < config.max_markets) | made
+        stale = merged[~fresh & needed].head(config.max_book_fetches)
+
+        market_ids = list(stale.id)
+        with ThreadPoolExecutor(LOOKUP_CONCURRENCY) as pool:
+            books = list(pool.map(self.market_data.orderbook, market_ids))
+        depths = book_depths(books, config.depth_levels)
+
+        # Markets that are no longer candidates are forgotten.
+        self.depths = {
+            market_id: self.depths[market_id] for market_id in merged.id[fresh]
+        }
+        for market_id, depth, yes_bid, yes_ask in zip(
+            market_ids, depths, stale.yes_bid, stale.yes_ask
+        ):
+            self.depths[market_id] = (int(depth), int(yes_bid), int(yes_ask), now)
+        return merged.id.map(
+            {market_id: entry[0] for market_id, entry in self.depths.items()}
+        )
+
+    def select(
+        self, candidates: "pd.DataFrame", current: Collection[str]
+    ) -> List[MarketProfile]:
+        """Profiles for the markets to make, given the tickers made now.
+
+        Current markets that are still candidates are kept, and the rest of
+        the places go to the best scoring candidates."""
+        import pandas as pd
+
+        kept = candidates.ticker_name.isin(current)
+        ranked = pd.concat([candidates[kept], candidates[~kept]]).head(
+            self.config.max_markets
+        )
+        return [
+            replace(self.config.templates[template], market_ticker=ticker)
+            for ticker, template in zip(ranked.ticker_name, ranked.template)
+        ]
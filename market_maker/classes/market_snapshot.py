@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+
+class MarketSnapshot:
+    """The details of a set of markets at one point in time, keyed by market id.
+
+    Built from the paged market list once per cycle, so reading the status,
+    volume and top of book of every tracked market costs a fixed number of
+    requests no matter how many markets are tracked."""
+
+    def __init__(self, recs: Iterable[dict], taken: Optional[datetime] = None):
+        self.markets: Dict[str, dict] = {rec["id"]: rec for rec in recs}
+        self.taken = taken if taken is not None else datetime.now()
+
+    def get(self, market_id: str) -> Optional[dict]:
+        return self.markets.get(market_id)
+
+    def add(self, rec: dict) -> None:
+        self.markets[rec["id"]] = rec
+
+    def __contains__(self, market_id: object) -> bool:
+        return market_id in self.markets
+
+    def __len__(self) -> int:
+        return len(self.markets)
@@ -0,0 +1,323 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import IO, Any, Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds, in seconds, of the buckets every histogram counts into.
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+@dataclass
+class MetricsConfig:
+    # Whether to collect metrics at all. `--metrics` turns this on.
+    enabled: bool = False
+    # Port of the Prometheus text endpoint on localhost, or None for none.
+    port: Optional[int] = 9108
+    # File that structured JSON logs are appended to, "-" for stdout, or None.
+    log_path: Optional[str] = None
+    # Seconds between summaries of every metric in the structured log.
+    log_interval_secs: float = 60.0
+
+
+class Counter:
+    __slots__ = ("value", "lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self.lock:
+            self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count", "lock")
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        # The last count is for values above every bound.
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """The upper bound of the bucket holding the q-th quantile."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Timer:
+    """Observes the seconds spent inside a `with` block."""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> "NullTimer":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def label_key(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % pair for pair in pairs)
+
+
+class Metrics:
+    """Counters, gauges and latency histograms, keyed by name and labels.
+
+    Exported in the Prometheus text format over HTTP and summarized in a
+    structured JSON log. When metrics are disabled, NullMetrics stands in with
+    the same methods doing nothing."""
+
+    enabled = True
+
+    def __init__(self, config: Optional[MetricsConfig] = None):
+        self.config = config if config is not None else MetricsConfig(enabled=True)
+        self.counters: Dict[Tuple[str, Labels], Counter] = {}
+        self.gauges: Dict[Tuple[str, Labels], Gauge] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.lock = threading.Lock()
+        self.log_file: Optional[IO[str]] = None
+        self.log_lock = threading.Lock()
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    def counter(self, name: str, **labels: str) -> Counter:
+        key = (name, label_key(labels))
+        counter = self.counters.get(key)
+        if counter is None:
+            with self.lock:
+                counter = self.counters.setdefault(key, Counter())
+        return counter
+
+    def gauge(self, name: str, **labels: str) -> Gauge:
+        key = (name, label_key(labels))
+        gauge = self.gauges.get(key)
+        if gauge is None:
+            with self.lock:
+                gauge = self.gauges.setdefault(key, Gauge())
+        return gauge
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        key = (name, label_key(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+        return histogram
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        self.counter(name, **labels).inc(amount)
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        self.gauge(name, **labels).set(value)
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        self.histogram(name, **labels).observe(value)
+
+    def time(self, name: str, **labels: str) -> Any:
+        return Timer(self.histogram(name, **labels))
+
+    def start(self) -> "Metrics":
+        """Serves the Prometheus endpoint and starts the structured log, as
+        configured."""
+        if self.config.port is not None:
+            self.serve(self.config.port)
+        if self.config.log_path is not None:
+            self.log_file = (
+                open(self.config.log_path, "a", buffering=1)
+                if self.config.log_path != "-"
+                else None
+            )
+            threading.Thread(target=self.log_summaries, daemon=True).start()
+        return self
+
+    def serve(self, port: int) -> None:
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                content = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted(self.histograms.items())
+
+        lines: List[str] = []
+        typed = set()
+        for kind, metrics in (("counter", counters), ("gauge", gauges)):
+            for (name, labels), metric in metrics:
+                if name not in typed:
+                    typed.add(name)
+                    lines.append("# TYPE %s %s" % (name, kind))
+                lines.append("%s%s %r" % (name, format_labels(labels), metric.value))
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append("# TYPE %s histogram" % name)
+            with histogram.lock:
+                counts = list(histogram.counts)
+                total, count = histogram.sum, histogram.count
+            cumulative = 0
+            for bound, bucket in zip(list(histogram.bounds) + ["+Inf"], counts):
+                cumulative += bucket
+                lines.append(
+                    "%s_bucket%s %d"
+                    % (name, format_labels(labels, (("le", str(bound)),)), cumulative)
+                )
+            lines.append("%s_sum%s %r" % (name, format_labels(labels), total))
+            lines.append("%s_count%s %d" % (name, format_labels(labels), count))
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Any]:
+        """The current value of every counter and gauge, and the count, mean
+        and quantiles of every histogram."""
+        with self.lock:
+            counters = list(self.counters.items())
+            gauges = list(self.gauges.items())
+            histograms = list(self.histograms.items())
+        values: Dict[str, Any] = {}
+        for (name, labels), metric in counters + gauges:
+            values[name + format_labels(labels)] = metric.value
+        for (name, labels), histogram in histograms:
+            values[name + format_labels(labels)] = {
+                "count": histogram.count,
+                "mean": histogram.sum / histogram.count if histogram.count else 0.0,
+                "p50": histogram.quantile(0.5),
+                "p99": histogram.quantile(0.99),
+            }
+        return values
+
+    def log(self, event: str, **fields: Any) -> None:
+        """Writes one structured log line, if a log is configured."""
+        if self.config.log_path is None:
+            return
+        line = json.dumps(dict(time=time.time(), event=event, **fields))
+        with self.log_lock:
+            if self.log_file is not None:
+                self.log_file.write(line + "\n")
+            else:
+                print(line)
+
+    def log_summaries(self) -> None:
+        while True:
+            time.sleep(self.config.log_interval_secs)
+            self.log("metrics", metrics=self.summary())
+
+
+class NullMetrics(Metrics):
+    """Metrics that are never collected, so that instrumented code costs no
+    more than a method call when metrics are disabled."""
+
+    enabled = False
+
+    def __init__(self) -> None:
+        super().__init__(MetricsConfig(enabled=False, port=None))
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        pass
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        pass
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        pass
+
+    def time(self, name: str, **labels: str) -> Any:
+        return NULL_TIMER
+
+    def log(self, event: str, **fields: Any) -> None:
+        pass
+
+    def start(self) -> "Metrics":
+        return self
+
+
+NULL_METRICS = NullMetrics()
+
+
+def create_metrics(config: MetricsConfig) -> Metrics:
+    return Metrics(config).start() if config.enabled else NULL_METRICS
@@ -0,0 +1,392 @@
+import json
+import random
+import re
+import threading
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep, time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from market_maker.classes.positions import PositionStore
+from market_maker.classes.rate_limiter import TokenBucket
+
+# The port hosts[Environment.LOCAL] points at.
+LOCAL_PORT = 8910
+
+
+@dataclass
+class MockExchangeConfig:
+    # Seconds added before every response, to stand in for network latency.
+    latency_secs: float = 0.0
+    # Requests per second allowed before answering 429, or None for no limit.
+    reads_per_sec: Optional[float] = None
+    writes_per_sec: Optional[float] = None
+    # The fraction of requests answered with a 500 instead of being handled.
+    error_rate: float = 0.0
+    # Markets, orders or fills per page of the market, order and fill lists.
+    page_size: int = 100
+
+
+class MockExchangeHandler(BaseHTTPRequestHandler):
+    server: "MockExchange"
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def respond(self, status: int, body: dict, headers: Dict[str, str] = {}) -> None:
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def handle_method(self, method: str) -> None:
+        parsed = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        params = {name: values[0] for name, values in parse_qs(parsed.query).items()}
+        status, result, headers = self.server.dispatch(
+            method, parsed.path, params, body, self.headers.get("Authorization", "")
+        )
+        self.respond(status, result, headers)
+
+    def do_GET(self) -> None:
+        self.handle_method("GET")
+
+    def do_POST(self) -> None:
+        self.handle_method("POST")
+
+    def do_DELETE(self) -> None:
+        self.handle_method("DELETE")
+
+
+Route = Callable[..., Tuple[int, dict]]
+
+
+class MockExchange(ThreadingHTTPServer):
+    """An in-process stand-in for the exchange's REST API.
+
+    Serves the endpoints MakerClient uses from in-memory markets, orders and
+    positions, with configurable latency, rate limits and injected errors.
+    Markets are added with `add_market`, moved with `move` and our orders are
+    filled with `fill`. Every request is counted in `requests`."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        config: Optional[MockExchangeConfig] = None,
+        port: int = LOCAL_PORT,
+    ):
+        super().__init__(("127.0.0.1", port), MockExchangeHandler)
+        self.config = config if config is not None else MockExchangeConfig()
+        self.markets: Dict[str, dict] = {}
+        self.orders: Dict[str, dict] = {}
+        self.positions = PositionStore()
+        self.fills: List[dict] = []
+        self.requests: Counter = Counter()
+        self.failures: List[int] = []
+        self.sessions: Set[str] = set()
+        self.lock = threading.Lock()
+        self.random = random.Random(0)
+
+        self.reads = (
+            TokenBucket(
+                self.config.reads_per_sec, max(1, int(self.config.reads_per_sec))
+            )
+            if self.config.reads_per_sec is not None
+            else None
+        )
+        self.writes = (
+            TokenBucket(
+                self.config.writes_per_sec, max(1, int(self.config.writes_per_sec))
+            )
+            if self.config.writes_per_sec is not None
+            else None
+        )
+
+        self.routes: List[Tuple[str, "re.Pattern[str]", Route]] = [
+            ("POST", re.compile(r"/v1/log_in$"), self.log_in),
+            ("GET", re.compile(r"/v1/markets$"), self.list_markets),
+            ("GET", re.compile(r"/v1/markets/([^/]+)$"), self.get_market),
+            ("GET", re.compile(r"/v1/markets_by_ticker/([^/]+)$"), self.get_ticker),
+            ("GET", re.compile(r"/v1/markets/([^/]+)/order_book$"), self.order_book),
+            ("GET", re.compile(r"/v1/users/[^/]+/orders$"), self.list_orders),
+            ("POST", re.compile(r"/v1/users/[^/]+/orders$"), self.post_order),
+            ("POST", re.compile(r"/v1/users/[^/]+/batch_orders$"), self.post_batch),
+            ("DELETE", re.compile(r"/v1/users/[^/]+/batch_orders$"), self.cancel_batch),
+            ("DELETE", re.compile(r"/v1/users/[^/]+/orders/([^/]+)$"), self.cancel),
+            (
+                "POST",
+                re.compile(r"/v1/users/[^/]+/orders/([^/]+)/decrease$"),
+                self.decrease,
+            ),
+            ("GET", re.compile(r"/v1/users/[^/]+/positions$"), self.list_positions),
+            ("GET", re.compile(r"/v1/users/[^/]+/fills$"), self.list_fills),
+        ]
+
+    @property
+    def url(self) -> str:
+        return "http://127.0.0.1:%d" % self.server_address[1]
+
+    def start(self) -> "MockExchange":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def add_market(
+        self,
+        ticker: str,
+        yes_bid: int = 40,
+        yes_ask: int = 46,
+        volume: int = 100,
+        market_id: Optional[str] = None,
+        event_ticker: Optional[str] = None,
+        close_date: Optional[str] = None,
+    ) -> str:
+        market_id = market_id if market_id is not None else str(uuid.uuid4())
+        with self.lock:
+            self.markets[market_id] = {
+                "id": market_id,
+                "ticker_name": ticker,
+                "event_ticker": event_ticker if event_ticker is not None else ticker,
+                "close_date": close_date,
+                "status": "active",
+                "yes_bid": yes_bid,
+                "yes_ask": yes_ask,
+                "volume": volume,
+            }
+        return market_id
+
+    def move(self, market_id: str, yes_bid: int, yes_ask: int) -> None:
+        with self.lock:
+            self.markets[market_id].update(yes_bid=yes_bid, yes_ask=yes_ask)
+
+    def fill(self, order_id: str, count: int) -> None:
+        """Fills up to `count` contracts of one of our resting orders."""
+        with self.lock:
+            order = self.orders[order_id]
+            count = min(count, order["remaining_count"])
+            order["remaining_count"] -= count
+            if order["remaining_count"] == 0:
+                order["status"] = "executed"
+            self.markets[order["market_id"]]["volume"] += count
+            self.fills.append(
+                {
+                    "trade_id": str(uuid.uuid4()),
+                    "market_id": order["market_id"],
+                    "order_id": order_id,
+                    "is_yes": order["is_yes"],
+                    "count": count,
+                    "price": order["price"],
+                    "ts": int(time()),
+                }
+            )
+        self.positions.apply_fill(
+            order["market_id"], order["is_yes"], count, order["price"]
+        )
+
+    def expire_sessions(self) -> None:
+        """Ends every session, so that requests are refused until the client
+        logs in again."""
+        with self.lock:
+            self.sessions.clear()
+
+    def fail_next(self, count: int = 1, status: int = 500) -> None:
+        """Answers the next `count` requests with `status`."""
+        with self.lock:
+            self.failures += [status] * count
+
+    def dispatch(
+        self,
+        method: str,
+        path: str,
+        params: Dict[str, str],
+        body: dict,
+        authorization: str = "",
+    ) -> Tuple[int, dict, Dict[str, str]]:
+        if self.config.latency_secs > 0:
+            sleep(self.config.latency_secs)
+
+        with self.lock:
+            self.requests[method, path] += 1
+            failure = self.failures.pop(0) if self.failures else None
+            if failure is None and self.random.random() < self.config.error_rate:
+                failure = 500
+        if failure is not None:
+            return failure, {"error": "injected"}, {}
+        if path != "/v1/log_in" and authorization.split(" ")[-1] not in self.sessions:
+            return 401, {"error": "unauthorized"}, {}
+
+        bucket = self.reads if method == "GET" else self.writes
+        if bucket is not None:
+            wait = bucket.try_acquire()
+            if wait > 0:
+                return 429, {"error": "rate limited"}, {"Retry-After": "%.3f" % wait}
+
+        for route_method, pattern, route in self.routes:
+            match = pattern.match(path)
+            if route_method == method and match is not None:
+                with self.lock:
+                    status, result = route(*match.groups(), params=params, body=body)
+                return status, result, {}
+        return 404, {"error": "not found"}, {}
+
+    def log_in(self, params: Dict[str, str], body: dict) -> Tuple[int, dict]:
+        token = uuid.uuid4().hex
+        self.sessions.add(token)
+        return 200, {"token": token, "user_id": "local"}
+
+    def list_markets(self, params: Dict[str, str], body: dict) -> Tuple[int, dict]:
+        markets = list(self.markets.values())
+        start = int(params.get("cursor") or 0)
+        end = start + self.config.page_size
+        return 200, {
+            "markets": [dict(m) for m in markets[start:end]],
+            "cursor": str(end) if end < len(markets) else "",
+        }
+
+    def get_market(
+        self, market_id: str, params: Dict[str, str], body: dict
+    ) -> Tuple[int, dict]:
+        if market_id not in self.markets:
+            return 404, {"error": "market not found"}
+        return 200, {"market": dict(self.markets[market_id])}
+
+    def get_ticker(
+        self, ticker: str, params: Dict[str, str], body: dict
+    ) -> Tuple[int, dict]:
+        for market in self.markets.values():
+            if market["ticker_name"] == ticker:
+                return 200, {"market": dict(market)}
+        return 404, {"error": "market not found"}
+
+    def order_book(
+        self, market_id: str, params: Dict[str, str], body: dict
+    ) -> Tuple[int, dict]:
+        """Ten levels of 100 contracts behind the top of book on each side,
+        plus our own resting orders."""
+        if market_id not in self.markets:
+            return 404, {"error": "market not found"}
+        market = self.markets[market_id]
+        levels: Dict[bool, Counter] = {True: Counter(), False: Counter()}
+        for is_yes, top in (
+            (True, market["yes_bid"]),
+            (False, 100 - market["yes_ask"]),
+        ):
+            for price in range(max(1, top - 9), top + 1):
+                levels[is_yes][price] += 100
+        for order in self.orders.values():
+            if order["market_id"] == market_id and order["status"] == "resting":
+                levels[order["is_yes"]][order["price"]] += order["remaining_count"]
+        return 200, {
+            "order_book": {
+                "yes": sorted([p, q] for p, q in levels[True].items()),
+                "no": sorted([p, q] for p, q in levels[False].items()),
+            }
+        }
+
+    def list_orders(self, params: Dict[str, str], body: dict) -> Tuple[int, dict]:
+        orders = [
+            order
+            for order in self.orders.values()
+            if ("status" not in params or order["status"] == params["status"])
+            and ("market_id" not in params or order["market_id"] == params["market_id"])
+        ]
+        start = int(params.get("cursor") or 0)
+        end = start + self.config.page_size
+        return 200, {
+            "orders": [dict(order) for order in orders[start:end]],
+            "cursor": str(end) if end < len(orders) else "",
+        }
+
+    def list_fills(self, params: Dict[str, str], body: dict) -> Tuple[int, dict]:
+        """Fills oldest first, from the position in `cursor` or else from the
+        first at or after `min_ts`. The returned cursor resumes after the last
+        fill in the page, so polling with it returns only newer fills."""
+        if params.get("cursor"):
+            start = int(params["cursor"])
+        else:
+            min_ts = int(params.get("min_ts") or 0)
+            start = next(
+                (i for i, fill in enumerate(self.fills) if fill["ts"] >= min_ts),
+                len(self.fills),
+            )
+        end = start + min(int(params.get("limit") or 100), self.config.page_size)
+        fills = self.fills[start:end]
+        return 200, {"fills": fills, "cursor": str(start + len(fills))}
+
+    def create_order(self, order: dict) -> dict:
+        order_id = str(uuid.uuid4())
+        self.orders[order_id] = {
+            "order_id": order_id,
+            "market_id": order["market_id"],
+            "price": order["price"],
+            "is_yes": order["side"] == "yes",
+            "place_count": order["count"],
+            "remaining_count": order["count"],
+            "expiration_unix_ts": order["expiration_unix_ts"],
+            "status": "resting",
+            "created_time": datetime.now(timezone.utc).isoformat(),
+        }
+        return dict(self.orders[order_id])
+
+    def post_order(self, params: Dict[str, str], body: dict) -> Tuple[int, dict]:
+        if body.get("market_id") not in self.markets:
+            return 400, {"error": "market not found"}
+        return 201, {"order": self.create_order(body)}
+
+    def post_batch(self, params: Dict[str, str], body: dict) -> Tuple[int, dict]:
+        if any(order.get("market_id") not in self.markets for order in body["orders"]):
+            return 400, {"error": "market not found"}
+        return 201, {"orders": [self.create_order(order) for order in body["orders"]]}
+
+    def cancel_batch(self, params: Dict[str, str], body: dict) -> Tuple[int, dict]:
+        for order_id in body["ids"]:
+            if order_id in self.orders:
+                self.orders[order_id]["status"] = "canceled"
+        return 200, {}
+
+    def cancel(
+        self, order_id: str, params: Dict[str, str], body: dict
+    ) -> Tuple[int, dict]:
+        if order_id not in self.orders:
+            return 404, {"error": "order not found"}
+        self.orders[order_id]["status"] = "canceled"
+        return 200, {"order": dict(self.orders[order_id])}
+
+    def decrease(
+        self, order_id: str, params: Dict[str, str], body: dict
+    ) -> Tuple[int, dict]:
+        if order_id not in self.orders:
+            return 404, {"error": "order not found"}
+        order = self.orders[order_id]
+        order["remaining_count"] = max(0, order["remaining_count"] - body["reduce_by"])
+        if order["remaining_count"] == 0:
+            order["status"] = "canceled"
+        return 200, {"order": dict(order)}
+
+    def list_positions(self, params: Dict[str, str], body: dict) -> Tuple[int, dict]:
+        with self.positions.lock:
+            positions = [
+                {
+                    "market_id": market_id,
+                    "position": position.position,
+                    "position_cost": position.position_cost,
+                }
+                for market_id, position in self.positions.positions.items()
+            ]
+        return 200, {"market_positions": positions}
@@ -0,0 +1,159 @@
+import json
+import socket
+import threading
+from socketserver import BaseRequestHandler, ThreadingTCPServer
+from typing import Dict, List, Sequence, Set, Tuple
+
+from market_maker.classes.websocket import (
+    OP_CLOSE,
+    OP_PING,
+    OP_PONG,
+    OP_TEXT,
+    WebSocketClosed,
+    accept_key,
+    encode_frame,
+    read_frame,
+)
+
+# The port feed_hosts[Environment.LOCAL] points at.
+LOCAL_FEED_PORT = 8911
+
+
+class FeedConnection:
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.market_ids: Set[str] = set()
+        self.lock = threading.Lock()
+
+    def send(self, message: str) -> None:
+        with self.lock:
+            self.sock.sendall(encode_frame(OP_TEXT, message.encode(), mask=False))
+
+
+class MockFeedHandler(BaseRequestHandler):
+    server: "MockFeedServer"
+
+    def handle(self) -> None:
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        request = bytearray()
+        while not request.endswith(b"\r\n\r\n"):
+            chunk = sock.recv(1)
+            if not chunk:
+                return
+            request += chunk
+        lines = request[:-4].decode("latin-1").split("\r\n")
+        fields = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+        sock.sendall(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                "Sec-WebSocket-Accept: %s\r\n\r\n"
+                % accept_key(fields.get("Sec-WebSocket-Key", ""))
+            ).encode()
+        )
+
+        connection = FeedConnection(sock)
+        self.server.add(connection)
+        try:
+            while True:
+                _, opcode, payload = read_frame(sock)
+                if opcode == OP_CLOSE:
+                    return
+                if opcode == OP_PING:
+                    with connection.lock:
+                        sock.sendall(encode_frame(OP_PONG, payload, mask=False))
+                elif opcode == OP_TEXT:
+                    command = json.loads(payload)
+                    if command.get("cmd") == "subscribe":
+                        connection.market_ids |= set(command["params"]["market_ids"])
+                        self.server.on_subscribe(connection)
+        except (OSError, WebSocketClosed):
+            return
+        finally:
+            self.server.remove(connection)
+
+
+class MockFeedServer(ThreadingTCPServer):
+    """A local stand-in for the exchange's push feed.
+
+    Publishes the same messages MarketFeed consumes to every connection
+    subscribed to the message's market. Books published with `set_book` are
+    replayed as snapshots to new subscribers."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int = 0):
+        super().__init__(("127.0.0.1", port), MockFeedHandler)
+        self.connections: List[FeedConnection] = []
+        self.books: Dict[str, Tuple[list, list]] = {}
+        self.lock = threading.Lock()
+        self.subscribed = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return "ws://127.0.0.1:%d/v1/ws" % self.server_address[1]
+
+    def start(self) -> "MockFeedServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def add(self, connection: FeedConnection) -> None:
+        with self.lock:
+            self.connections.append(connection)
+
+    def remove(self, connection: FeedConnection) -> None:
+        with self.lock:
+            if connection in self.connections:
+                self.connections.remove(connection)
+
+    def on_subscribe(self, connection: FeedConnection) -> None:
+        with self.lock:
+            books = list(self.books.items())
+        for market_id, (yes, no) in books:
+            if market_id in connection.market_ids:
+                connection.send(
+                    self._message("orderbook_snapshot", market_id, yes=yes, no=no)
+                )
+        self.subscribed.set()
+
+    def _message(self, kind: str, market_id: str, **msg: object) -> str:
+        return json.dumps({"type": kind, "msg": dict(market_id=market_id, **msg)})
+
+    def publish(self, kind: str, market_id: str, **msg: object) -> None:
+        message = self._message(kind, market_id, **msg)
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            if market_id in connection.market_ids:
+                try:
+                    connection.send(message)
+                except OSError:
+                    self.remove(connection)
+
+    def set_book(
+        self,
+        market_id: str,
+        yes: Sequence[Tuple[int, int]],
+        no: Sequence[Tuple[int, int]],
+    ) -> None:
+        with self.lock:
+            self.books[market_id] = (list(yes), list(no))
+        self.publish("orderbook_snapshot", market_id, yes=list(yes), no=list(no))
+
+    def publish_delta(self, market_id: str, side: str, price: int, delta: int) -> None:
+        self.publish("orderbook_delta", market_id, side=side, price=price, delta=delta)
+
+    def publish_fill(
+        self, market_id: str, order_id: str, is_yes: bool, count: int, price: int
+    ) -> None:
+        self.publish(
+            "fill",
+            market_id,
+            order_id=order_id,
+            is_yes=is_yes,
+            count=count,
+            price=price,
+        )
@@ -1,11 +1,54 @@
-from dataclasses import dataclass
+from typing import Any, Dict
 
 
-@dataclass
 class Order:
-    count: int
-    expiration_unix_ts: int
-    market_id: str
-    price: int
-    side: str
-    sell_position_capped: bool = False
+    """An order to post.
+
+    Orders are created for every level of every requote, so they hold their
+    fields in slots rather than a per-instance __dict__ and build their request
+    body directly instead of through `dataclasses.asdict`."""
+
+    __slots__ = (
+        "count",
+        "expiration_unix_ts",
+        "market_id",
+        "price",
+        "side",
+        "sell_position_capped",
+    )
+
+    def __init__(
+        self,
+        count: int,
+        expiration_unix_ts: int,
+        market_id: str,
+        price: int,
+        side: str,
+        sell_position_capped: bool = False,
+    ):
+        self.count = count
+        self.expiration_unix_ts = expiration_unix_ts
+        self.market_id = market_id
+        self.price = price
+        self.side = side
+        self.sell_position_capped = sell_position_capped
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "expiration_unix_ts": self.expiration_unix_ts,
+            "market_id": self.market_id,
+            "price": self.price,
+            "side": self.side,
+            "sell_position_capped": self.sell_position_capped,
+        }
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Order):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return "Order(%s)" % ", ".join(
+            "%s=%r" % (name, value) for name, value in self.to_dict().items()
+        )
@@ -0,0 +1,98 @@
+from typing import TYPE_CHECKING, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from market_maker.classes.order_state import RestingOrder
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Contracts trade at whole-cent prices from 1 to 99.
+PRICE_LEVELS = 99
+PRICES = np.arange(1, PRICE_LEVELS + 1)
+
+
+class OrderBook:
+    """Resting quantity at every price level of a market, for both sides.
+
+    `yes[i]` and `no[i]` hold the number of contracts resting at a price of
+    `i + 1` cents on that side."""
+
+    __slots__ = ("yes", "no")
+
+    def __init__(
+        self, yes: Optional[np.ndarray] = None, no: Optional[np.ndarray] = None
+    ):
+        self.yes = yes if yes is not None else np.zeros(PRICE_LEVELS, dtype=np.int64)
+        self.no = no if no is not None else np.zeros(PRICE_LEVELS, dtype=np.int64)
+
+    @classmethod
+    def from_levels(
+        cls, yes: Sequence[Sequence[int]], no: Sequence[Sequence[int]]
+    ) -> "OrderBook":
+        """Builds a book from `[price, quantity]` pairs, as the API returns them."""
+        book = cls()
+        for side, levels in ((book.yes, yes), (book.no, no)):
+            if len(levels) > 0:
+                levels_array = np.asarray(levels, dtype=np.int64)
+                np.add.at(side, levels_array[:, 0] - 1, levels_array[:, 1])
+        return book
+
+    @classmethod
+    def from_orders(cls, orders: Iterable[RestingOrder]) -> "OrderBook":
+        """Aggregates individual resting orders into a book."""
+        book = cls()
+        for order in orders:
+            side = book.yes if order.is_yes else book.no
+            side[order.price - 1] += order.remaining_count
+        return book
+
+    def side(self, is_yes: bool) -> np.ndarray:
+        return self.yes if is_yes else self.no
+
+    def depth(self, is_yes: bool, price: int) -> int:
+        return int(self.side(is_yes)[price - 1])
+
+    def best_bid(self, is_yes: bool) -> int:
+        """The highest price with resting quantity on a side, or 0 if empty."""
+        levels = np.flatnonzero(self.side(is_yes))
+        return int(levels[-1]) + 1 if len(levels) > 0 else 0
+
+    def best_ask(self, is_yes: bool) -> int:
+        """The lowest price at which a side can be bought from the other side's
+        resting orders, or 100 if the other side is empty."""
+        return 100 - self.best_bid(not is_yes)
+
+    def prices(self, is_yes: bool) -> np.ndarray:
+        """The prices with resting quantity on a side, in ascending order."""
+        return np.flatnonzero(self.side(is_yes)) + 1
+
+    def exposure_cents(self, is_yes: bool) -> int:
+        """The cost of every resting contract on a side if all were filled."""
+        return int(self.side(is_yes) @ PRICES)
+
+    def diff(self, other: "OrderBook") -> "OrderBook":
+        """The quantity this book holds beyond `other` at each level."""
+        return OrderBook(self.yes - other.yes, self.no - other.no)
+
+    def to_frames(self) -> Tuple["pd.DataFrame", "pd.DataFrame"]:
+        """Exports the book as yes and no DataFrames indexed by price."""
+        import pandas as pd
+
+        return (
+            pd.DataFrame({"q": self.yes}, index=PRICES),
+            pd.DataFrame({"q": self.no}, index=PRICES),
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, OrderBook):
+            return NotImplemented
+        return bool(np.array_equal(self.yes, other.yes)) and bool(
+            np.array_equal(self.no, other.no)
+        )
+
+    def __repr__(self) -> str:
+        return "OrderBook(yes=%s, no=%s)" % (
+            dict(zip(self.prices(True).tolist(), self.yes[self.yes > 0].tolist())),
+            dict(zip(self.prices(False).tolist(), self.no[self.no > 0].tolist())),
+        )
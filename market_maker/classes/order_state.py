@@ -0,0 +1,177 @@
+import threading
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+from market_maker.classes.risk_ledger import RiskLedger
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+@dataclass
+class RestingOrder:
+    order_id: str
+    market_id: str
+    price: int
+    is_yes: bool
+    remaining_count: int
+
+    @classmethod
+    def from_dict(cls, rec: dict) -> "RestingOrder":
+        return cls(
+            order_id=rec["order_id"],
+            market_id=rec["market_id"],
+            price=rec["price"],
+            is_yes=rec["is_yes"],
+            remaining_count=rec["remaining_count"],
+        )
+
+    @property
+    def cost(self) -> int:
+        """What the rest of the order costs if it fills, in cents."""
+        return self.price * self.remaining_count
+
+
+class OrderState:
+    """A local copy of our resting orders, keyed by market.
+
+    The state is seeded from the exchange once and then kept current from the
+    responses to our own posts and cancels. Fills are not visible to it, so a
+    market is reconciled against the exchange when our position in it changes,
+    when a request to it fails, or after `reconcile_interval` regardless.
+
+    Every change to a market's orders moves its exposure in `ledger`."""
+
+    def __init__(
+        self,
+        reconcile_interval: timedelta = timedelta(seconds=60),
+        ledger: Optional[RiskLedger] = None,
+    ):
+        self.reconcile_interval = reconcile_interval
+        self.ledger = ledger if ledger is not None else RiskLedger()
+        self.orders: Dict[str, Dict[str, RestingOrder]] = {}
+        self.order_markets: Dict[str, str] = {}
+        self.last_reconciled: Dict[str, datetime] = {}
+        self.reconciled_positions: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def replace(
+        self, market_id: str, recs: Iterable[dict], position: Optional[int] = None
+    ) -> None:
+        """Overwrites a market's orders with a fresh snapshot from the exchange.
+
+        Orders are kept oldest first by their creation time, whatever order
+        the exchange lists them in."""
+        orders = [
+            RestingOrder.from_dict(rec)
+            for rec in sorted(recs, key=lambda rec: rec.get("created_time") or "")
+        ]
+        with self.lock:
+            previous = self.orders.get(market_id, {})
+            for order_id in previous:
+                self.order_markets.pop(order_id, None)
+            self.ledger.add_resting(
+                market_id,
+                sum(o.cost for o in orders) - sum(o.cost for o in previous.values()),
+            )
+            self.orders[market_id] = {o.order_id: o for o in orders}
+            for order in orders:
+                self.order_markets[order.order_id] = market_id
+            self.last_reconciled[market_id] = datetime.now()
+            if position is not None:
+                self.reconciled_positions[market_id] = position
+
+    def seed(self, market_ids: Iterable[str], recs: Iterable[dict]) -> None:
+        """Overwrites several markets' orders from one snapshot of all orders."""
+        by_market: Dict[str, List[dict]] = {market_id: [] for market_id in market_ids}
+        for rec in recs:
+            if rec["market_id"] in by_market:
+                by_market[rec["market_id"]].append(rec)
+        for market_id, market_recs in by_market.items():
+            self.replace(market_id, market_recs)
+
+    def add(self, recs: Iterable[dict]) -> List[RestingOrder]:
+        """Records orders returned from a post or decrease, and returns them.
+
+        Orders that are no longer resting are dropped from the state."""
+        orders: List[RestingOrder] = []
+        with self.lock:
+            for rec in recs:
+                order = RestingOrder.from_dict(rec)
+                orders.append(order)
+                market_orders = self.orders.setdefault(order.market_id, {})
+                previous = market_orders.get(order.order_id)
+                cents = -previous.cost if previous is not None else 0
+                resting = rec.get("status", "resting") == "resting"
+                if resting and order.remaining_count > 0:
+                    market_orders[order.order_id] = order
+                    self.order_markets[order.order_id] = order.market_id
+                    cents += order.cost
+                elif self.order_markets.pop(order.order_id, None) is not None:
+                    market_orders.pop(order.order_id, None)
+                self.ledger.add_resting(order.market_id, cents)
+        return orders
+
+    def remove(self, order_ids: Iterable[str]) -> None:
+        with self.lock:
+            for order_id in order_ids:
+                market_id = self.order_markets.pop(order_id, None)
+                if market_id is not None:
+                    order = self.orders[market_id].pop(order_id, None)
+                    if order is not None:
+                        self.ledger.add_resting(market_id, -order.cost)
+
+    def apply_fill(
+        self, market_id: str, order_id: str, count: int, position: int
+    ) -> None:
+        """Reduces an order by a fill reported to us directly.
+
+        `position` is our position after the fill. If the filled order is
+        known, the state already accounts for the fill and the new position
+        does not force a reconcile."""
+        with self.lock:
+            order = self.orders.get(market_id, {}).get(order_id)
+            if order is None:
+                return
+            filled = min(count, order.remaining_count)
+            self.ledger.add_resting(market_id, -order.price * filled)
+            order.remaining_count -= filled
+            if order.remaining_count <= 0:
+                self.orders[market_id].pop(order_id)
+                self.order_markets.pop(order_id, None)
+            if market_id in self.reconciled_positions:
+                self.reconciled_positions[market_id] = position
+
+    def mark_stale(self, market_id: str) -> None:
+        with self.lock:
+            self.last_reconciled.pop(market_id, None)
+
+    def needs_reconcile(self, market_id: str, position: int) -> bool:
+        with self.lock:
+            if market_id not in self.last_reconciled:
+                return True
+            if self.reconciled_positions.setdefault(market_id, position) != position:
+                return True
+            age = datetime.now() - self.last_reconciled[market_id]
+            return age > self.reconcile_interval
+
+    def market_orders(self, market_id: str) -> List[RestingOrder]:
+        """A market's resting orders, oldest first."""
+        with self.lock:
+            return list(self.orders.get(market_id, {}).values())
+
+    def market_order_ids(self, market_id: str) -> List[str]:
+        with self.lock:
+            return list(self.orders.get(market_id, {}).keys())
+
+    def frame(self, market_id: str) -> "pd.DataFrame":
+        """A market's resting orders in the same shape as get_market_orders."""
+        return orders_frame(self.market_orders(market_id))
+
+
+def orders_frame(orders: Iterable[RestingOrder]) -> "pd.DataFrame":
+    """Orders as a DataFrame with a row per order, built only when asked for."""
+    import pandas as pd
+
+    return pd.DataFrame([asdict(o) for o in orders])
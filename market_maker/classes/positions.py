@@ -0,0 +1,72 @@
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from market_maker.classes.risk_ledger import RiskLedger
+
+
+@dataclass
+class Position:
+    __slots__ = ("position", "position_cost")
+
+    # Contracts held: positive for yes, negative for no.
+    position: int
+    # What was paid for the contracts currently held, in cents.
+    position_cost: int
+
+
+class PositionStore:
+    """Our position in every market, keyed by market id.
+
+    Positions are replaced wholesale by `refresh` and can be moved by
+    individual fills in between refreshes. Either moves what each position
+    cost in `ledger`."""
+
+    def __init__(self, ledger: Optional[RiskLedger] = None) -> None:
+        self.ledger = ledger if ledger is not None else RiskLedger()
+        self.positions: Dict[str, Position] = {}
+        self.last_refresh: Optional[datetime] = None
+        self.lock = threading.Lock()
+
+    def refresh(self, recs: Iterable[dict]) -> None:
+        positions = {
+            rec["market_id"]: Position(rec["position"], rec["position_cost"])
+            for rec in recs
+        }
+        with self.lock:
+            self.positions = positions
+            self.last_refresh = datetime.now()
+            self.ledger.set_positions(
+                {market_id: p.position_cost for market_id, p in positions.items()}
+            )
+
+    def get(self, market_id: str) -> Position:
+        """The position in a market, which is flat if we have never traded it."""
+        with self.lock:
+            position = self.positions.get(market_id)
+            if position is None:
+                return Position(0, 0)
+            return Position(position.position, position.position_cost)
+
+    def apply_fill(self, market_id: str, is_yes: bool, count: int, price: int) -> None:
+        """Moves a position by a fill of `count` contracts bought at `price`
+        cents on one side.
+
+        Buying the side opposite to a held position closes it first, releasing
+        its cost pro rata. Any remainder opens a new position on the bought
+        side."""
+        change = count if is_yes else -count
+        with self.lock:
+            position = self.positions.setdefault(market_id, Position(0, 0))
+            held = abs(position.position)
+
+            if position.position == 0 or (position.position > 0) == is_yes:
+                position.position_cost += count * price
+            else:
+                closed = min(count, held)
+                position.position_cost -= position.position_cost * closed // held
+                if count > closed:
+                    position.position_cost = (count - closed) * price
+            position.position += change
+            self.ledger.set_position(market_id, position.position_cost)
@@ -1,13 +1,27 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from market_maker.classes.environment import Environment
+from market_maker.classes.fill_feed import FillsConfig
+from market_maker.classes.kalshi_client import SessionConfig
+from market_maker.classes.maker_client import MarketIndexConfig
+from market_maker.classes.metrics import MetricsConfig
+from market_maker.classes.mock_exchange import MockExchangeConfig
+from market_maker.classes.rate_limiter import RateLimitConfig
+from market_maker.classes.recorder import RecorderConfig
+from market_maker.classes.risk_ledger import RiskLimits
+from market_maker.classes.scheduler import SchedulerConfig
+from market_maker.classes.sharding import SupervisorConfig
+from market_maker.classes.transport import TransportConfig
 
 
 class Distribution(Enum):
     LINEAR = 1
+    GEOMETRIC = 2
+    TOP_HEAVY = 3
+    EXPOSURE_SKEWED = 4
 
 
 @dataclass
@@ -26,7 +40,62 @@ class MarketProfile:
     distribution: Distribution
 
 
+@dataclass
+class ScannerConfig:
+    # Seconds between scans of the market list while making, or None to make
+    # only the markets listed in the profile.
+    interval_secs: Optional[float] = None
+    # The profiles scanned markets are made with, by ticker prefix. Only
+    # markets whose ticker starts with one of the prefixes are candidates.
+    # Each is made with the profile of its longest matching prefix, with the
+    # ticker replaced.
+    templates: Dict[str, MarketProfile] = field(default_factory=dict)
+    # The most scanned markets made at once. Markets already made keep their
+    # place while they pass the filters, and free places go to the best scores.
+    max_markets: int = 10
+    # Candidates must have traded at least this many contracts.
+    min_volume: int = 100
+    # Bounds of the yes bid-ask spread in cents. Narrower markets leave no room
+    # to quote inside the spread, and wider ones are rarely traded.
+    min_spread: int = 2
+    max_spread: Optional[int] = 20
+    # Bounds of the hours left until a market closes. Markets without a close
+    # date are not filtered by them.
+    min_hours_to_close: float = 24
+    max_hours_to_close: Optional[float] = None
+    # The fewest contracts that must rest within `depth_levels` cents of the
+    # best bid on each side, or 0 to not fetch order books at all.
+    min_depth: int = 0
+    depth_levels: int = 5
+    # Order books fetched per scan at most, best scores first. Candidates
+    # still waiting for one are considered on later scans.
+    max_book_fetches: int = 20
+    # How long the depth of a fetched book is trusted while its top of book
+    # does not move.
+    depth_ttl_secs: float = 10 * 60
+    # How old a market list a scan may reuse rather than paging through it
+    # again. While making, the list fetched for the active markets' snapshots
+    # is usually younger and is used instead.
+    market_list_ttl_secs: float = 5 * 60
+
+
 @dataclass
 class StrategyProfile:
     env: Environment
     markets: List[MarketProfile]
+    transport: TransportConfig = field(default_factory=TransportConfig)
+    rate_limit: RateLimitConfig = field(default_factory=RateLimitConfig)
+    scheduler: SchedulerConfig = field(default_factory=SchedulerConfig)
+    recorder: RecorderConfig = field(default_factory=RecorderConfig)
+    metrics: MetricsConfig = field(default_factory=MetricsConfig)
+    # Latency, rate limits and errors of the mock exchange, for Environment.LOCAL.
+    local_exchange: MockExchangeConfig = field(default_factory=MockExchangeConfig)
+    supervisor: SupervisorConfig = field(default_factory=SupervisorConfig)
+    session: SessionConfig = field(default_factory=SessionConfig)
+    market_index: MarketIndexConfig = field(default_factory=MarketIndexConfig)
+    fills: FillsConfig = field(default_factory=FillsConfig)
+    risk: RiskLimits = field(default_factory=RiskLimits)
+    scanner: ScannerConfig = field(default_factory=ScannerConfig)
+    # The account under the environment's `accounts` in credentials.yaml to
+    # trade with, or None for the environment's own entry.
+    account: Optional[str] = None
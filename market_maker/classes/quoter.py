@@ -0,0 +1,125 @@
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+from market_maker.classes.order_book import OrderBook
+from market_maker.classes.positions import Position
+from market_maker.classes.profiles import MarketProfile
+from market_maker.classes.quoting import produce_book, produce_books
+from market_maker.classes.scheduler import MarketOutcome
+
+
+class Quoter:
+    """The quoting strategy: when to quote a market, the fair value to quote
+    around and the book to rest there.
+
+    Holds no connection to the exchange, so the same logic drives live markets
+    and backtests. `clock` supplies the current time, which backtests replace
+    with the replayed time."""
+
+    def __init__(self, clock: Callable[[], datetime] = datetime.now):
+        self.clock = clock
+        self.fair_values: Dict[str, int] = {}
+        # Contracts filled since each market's fair value last moved: positive
+        # for yes bought, negative for no bought.
+        self.unabsorbed: Dict[str, int] = {}
+        self.last_snipes: Dict[str, datetime] = {}
+
+    def snipe_remaining_secs(
+        self, market_id: str, profile: MarketProfile
+    ) -> Optional[float]:
+        """
+        The seconds left in a market's snipe timeout, or None if it is not
+        waiting one out.
+        """
+        if profile.snipe_timeout_seconds is None or market_id not in self.last_snipes:
+            return None
+        elapsed = (self.clock() - self.last_snipes[market_id]).total_seconds()
+        remaining = profile.snipe_timeout_seconds - elapsed
+        return remaining if remaining > 0 else None
+
+    def skip_reason(
+        self, market_id: str, profile: MarketProfile, market_details: dict
+    ) -> Optional[MarketOutcome]:
+        """
+        Returns why a market should not be quoted this cycle, if it shouldn't.
+        """
+        # Skip a market that was recently sniped.
+        if self.snipe_remaining_secs(market_id, profile) is not None:
+            return MarketOutcome.SNIPED
+
+        # If the market has never been traded on, skip it.
+        if market_details["volume"] == 0:
+            return MarketOutcome.NO_VOLUME
+
+        # If the spread is currently too large, skip the market.
+        spread_size = market_details["yes_ask"] - market_details["yes_bid"]
+        if profile.max_spread is not None and spread_size > profile.max_spread:
+            return MarketOutcome.WIDE_SPREAD
+
+        return None
+
+    def record_fill(self, market_id: str, is_yes: bool, count: int) -> None:
+        """
+        Notes a fill of our orders, which moves the fair value the next time
+        the market is quoted. Fills before a market has a fair value are
+        already reflected in the midpoint it starts from.
+        """
+        if market_id in self.fair_values:
+            self.unabsorbed[market_id] += count if is_yes else -count
+
+    def update_fair_value(
+        self, market_id: str, profile: MarketProfile, market_details: dict
+    ) -> int:
+        """
+        Move the fair value of a market in response to fills and snipes.
+
+        Returns the fair value to quote around.
+        """
+        spread_size = market_details["yes_ask"] - market_details["yes_bid"]
+        spread_midpoint = market_details["yes_bid"] + spread_size / 2
+
+        # Reset fair value in response to a snipe.
+        if (
+            market_id in self.fair_values
+            and abs(self.fair_values[market_id] - spread_midpoint) > spread_size / 2
+        ):
+            self.fair_values.pop(market_id)
+            self.unabsorbed.pop(market_id)
+            self.last_snipes[market_id] = self.clock()
+
+        if market_id not in self.fair_values:
+            self.fair_values[market_id] = spread_midpoint
+            self.unabsorbed[market_id] = 0
+
+        # Every `price_stickyness` contracts bought on a side move fair value
+        # a cent away from it. The remainder carries over to later fills.
+        fair_value_change = -int(self.unabsorbed[market_id] / profile.price_stickyness)
+        # Keep fair value on the price grid, however far fills have pushed it.
+        self.fair_values[market_id] = min(
+            99, max(1, self.fair_values[market_id] + fair_value_change)
+        )
+        self.unabsorbed[market_id] += fair_value_change * profile.price_stickyness
+
+        return int(self.fair_values[market_id])
+
+    def produce_book(
+        self,
+        profile: MarketProfile,
+        position: Position,
+        current_book: OrderBook,
+        fair_value: int,
+    ) -> OrderBook:
+        return produce_book(profile, position, current_book, fair_value)
+
+    def produce_books(
+        self,
+        profiles: Sequence[MarketProfile],
+        positions: Sequence[Position],
+        current_books: Sequence[OrderBook],
+        fair_values: Sequence[int],
+    ) -> List[OrderBook]:
+        """
+        The books to rest in several markets, vectorized across markets when
+        there are enough of them.
+        """
+        return produce_books(profiles, positions, current_books, fair_values)
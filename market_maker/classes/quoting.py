@@ -0,0 +1,238 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from market_maker.classes.order_book import PRICE_LEVELS, PRICES, OrderBook
+from market_maker.classes.order_state import RestingOrder
+from market_maker.classes.positions import Position
+from market_maker.classes.profiles import Distribution, MarketProfile
+
+# Each level of a GEOMETRIC ladder holds this fraction of the level above it.
+GEOMETRIC_DECAY = 0.7
+
+# Below this many markets, the fixed cost of the array operations outweighs
+# producing each book on its own.
+VECTORIZE_MIN_MARKETS = 16
+
+
+@dataclass
+class PendingQuote:
+    """Everything needed to quote one market, gathered before the books of
+    every market are produced together."""
+
+    market_id: str
+    profile: MarketProfile
+    position: Position
+    orders: List[RestingOrder]
+    fair_value: int
+
+
+def level_shapes(distributions: np.ndarray, depths: np.ndarray) -> np.ndarray:
+    """The size of each level relative to a LINEAR ladder, as an (N, depth)
+    array whose rows average 1 over the levels within each market's depth."""
+    levels = np.arange(depths.max())
+    in_depth = levels[None, :] < depths[:, None]
+    geometric = distributions == Distribution.GEOMETRIC.value
+    top_heavy = distributions == Distribution.TOP_HEAVY.value
+
+    # Flat ladders are left exactly 1 so that their sizes match the original
+    # integer arithmetic.
+    shapes = in_depth.astype(np.float64)
+    if geometric.any() or top_heavy.any():
+        weights = np.where(
+            geometric[:, None],
+            GEOMETRIC_DECAY**levels,
+            np.where(top_heavy[:, None], depths[:, None] - levels[None, :], 1.0),
+        )
+        weights = np.where(in_depth, weights, 0.0)
+        weights *= depths[:, None] / weights.sum(axis=1, keepdims=True)
+        shaped = geometric | top_heavy
+        shapes[shaped] = weights[shaped]
+    return shapes
+
+
+@lru_cache(maxsize=None)
+def ladder_shape(distribution: Distribution, depth: int) -> Tuple[float, ...]:
+    """The level shapes of one ladder, as level_shapes computes them."""
+    shapes = level_shapes(np.array([distribution.value]), np.array([depth]))
+    return tuple(shapes[0].tolist())
+
+
+def produce_side(
+    fair_values: np.ndarray,
+    params: "QuotingParams",
+    shapes: np.ndarray,
+    multipliers: Optional[np.ndarray],
+    exposure: np.ndarray,
+    is_yes: bool,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """The ladder on one side of every market: the price and size of each
+    level, and whether it is placed.
+
+    A ladder stops at the first level outside the price band or whose cost,
+    added to the side's exposure, would exceed the market's limit."""
+    base = params.liquidity / params.depth / fair_values
+    top = np.trunc(fair_values - (params.spread - 1) / 2).astype(np.int64)
+    prices = top[:, None] - np.arange(shapes.shape[1])
+    sized = base[:, None] * shapes
+    if multipliers is not None:
+        sized *= multipliers[:, None]
+    sizes = sized.astype(np.int64)
+
+    yes_prices = prices if is_yes else 100 - prices
+    placed = (
+        (prices >= 1)
+        & (yes_prices <= params.max_yes_price[:, None])
+        & (yes_prices >= params.min_yes_price[:, None])
+        & (shapes > 0)
+        & (prices * sizes + exposure[:, None] <= params.max_exposure[:, None])
+    )
+    return prices, sizes, np.logical_and.accumulate(placed, axis=1)
+
+
+class QuotingParams:
+    """The quoting parameters of several market profiles, as arrays."""
+
+    def __init__(self, profiles: Sequence[MarketProfile]):
+        columns = np.array(
+            [
+                (
+                    p.instant_liquidity_cents,
+                    p.max_exposure_cents,
+                    p.spread,
+                    p.depth,
+                    p.max_yes_price if p.max_yes_price is not None else 100,
+                    p.min_yes_price if p.min_yes_price is not None else 0,
+                    p.distribution.value,
+                )
+                for p in profiles
+            ],
+            dtype=np.int64,
+        ).T
+        (
+            self.liquidity,
+            self.max_exposure,
+            self.spread,
+            self.depth,
+            self.max_yes_price,
+            self.min_yes_price,
+            self.distribution,
+        ) = columns
+
+
+def produce_book(
+    profile: MarketProfile,
+    position: Position,
+    current_book: OrderBook,
+    fair_value: int,
+) -> OrderBook:
+    """The desired book of one market, exactly as produce_books produces it
+    but without the fixed cost of the array operations."""
+    held_yes = (
+        position.position_cost if position.position > 0 else -position.position_cost
+    )
+    max_yes_price = profile.max_yes_price if profile.max_yes_price is not None else 100
+    min_yes_price = profile.min_yes_price if profile.min_yes_price is not None else 0
+    shape = ladder_shape(profile.distribution, profile.depth)
+    skew = 0.0
+    if profile.distribution == Distribution.EXPOSURE_SKEWED:
+        skew = min(1.0, max(-1.0, held_yes / max(profile.max_exposure_cents, 1)))
+
+    desired_book = OrderBook()
+    for is_yes, side_fair_value, exposure, multiplier in (
+        (True, fair_value, held_yes + current_book.exposure_cents(True), 1.0 - skew),
+        (
+            False,
+            100 - fair_value,
+            -held_yes + current_book.exposure_cents(False),
+            1.0 + skew,
+        ),
+    ):
+        base = profile.instant_liquidity_cents / profile.depth / side_fair_value
+        top = int(side_fair_value - (profile.spread - 1) / 2)
+        side = desired_book.side(is_yes)
+        for i, weight in enumerate(shape):
+            price = top - i
+            yes_price = price if is_yes else 100 - price
+            size = int(base * weight * multiplier)
+            if (
+                price < 1
+                or not min_yes_price <= yes_price <= max_yes_price
+                or price * size + exposure > profile.max_exposure_cents
+            ):
+                break
+            side[price - 1] = size
+    return desired_book
+
+
+def produce_books(
+    profiles: Sequence[MarketProfile],
+    positions: Sequence[Position],
+    current_books: Sequence[OrderBook],
+    fair_values: Sequence[int],
+) -> List[OrderBook]:
+    """The desired books of many markets, vectorized once there are enough of
+    them to pay for it."""
+    if len(profiles) < VECTORIZE_MIN_MARKETS:
+        return [
+            produce_book(*quote)
+            for quote in zip(profiles, positions, current_books, fair_values)
+        ]
+    return vectorized_books(profiles, positions, current_books, fair_values)
+
+
+def vectorized_books(
+    profiles: Sequence[MarketProfile],
+    positions: Sequence[Position],
+    current_books: Sequence[OrderBook],
+    fair_values: Sequence[int],
+) -> List[OrderBook]:
+    """The desired books of many markets, computed together in arrays.
+
+    Each side is a ladder of `depth` levels below the fair value, less half
+    the spread, sized by the market's Distribution. Like the original
+    per-market loop, a side's exposure counts our position and every order
+    currently resting on that side."""
+    count = len(profiles)
+    if count == 0:
+        return []
+
+    params = QuotingParams(profiles)
+    fair = np.array(fair_values, dtype=np.float64)
+    held = np.array([(p.position, p.position_cost) for p in positions]).reshape(-1, 2)
+    resting = np.concatenate(
+        [side for book in current_books for side in (book.yes, book.no)]
+    ).reshape(count, 2, PRICE_LEVELS)
+
+    # Position exposure counts against the held side and for the other.
+    held_yes = np.where(held[:, 0] > 0, held[:, 1], -held[:, 1])
+    yes_exposure = held_yes + resting[:, 0] @ PRICES
+    no_exposure = -held_yes + resting[:, 1] @ PRICES
+
+    # EXPOSURE_SKEWED ladders shrink the side that adds to our position and
+    # grow the side that reduces it.
+    yes_multiplier: Optional[np.ndarray] = None
+    no_multiplier: Optional[np.ndarray] = None
+    skewed = params.distribution == Distribution.EXPOSURE_SKEWED.value
+    if skewed.any():
+        skew = np.clip(held_yes / np.maximum(params.max_exposure, 1), -1.0, 1.0)
+        yes_multiplier = np.where(skewed, 1.0 - skew, 1.0)
+        no_multiplier = np.where(skewed, 1.0 + skew, 1.0)
+
+    shapes = level_shapes(params.distribution, params.depth)
+    books = np.zeros((2, count, PRICE_LEVELS), dtype=np.int64)
+    for side, (is_yes, side_fair, multiplier, exposure) in enumerate(
+        (
+            (True, fair, yes_multiplier, yes_exposure),
+            (False, 100 - fair, no_multiplier, no_exposure),
+        )
+    ):
+        prices, sizes, placed = produce_side(
+            side_fair, params, shapes, multiplier, exposure, is_yes
+        )
+        rows, levels = np.nonzero(placed)
+        books[side, rows, prices[rows, levels] - 1] = sizes[rows, levels]
+
+    return [OrderBook(yes, no) for yes, no in zip(books[0], books[1])]
@@ -0,0 +1,166 @@
+import multiprocessing
+import threading
+from dataclasses import dataclass
+from time import monotonic, sleep
+from typing import Any, ContextManager, Mapping, Optional
+
+
+@dataclass
+class RateLimitConfig:
+    # Sustained GET requests per second, and how many may be sent in a burst.
+    reads_per_sec: float = 10.0
+    read_burst: int = 10
+    # Sustained POST/DELETE requests per second, and their burst size.
+    writes_per_sec: float = 5.0
+    write_burst: int = 5
+    # The longest a single rate limited response may pause a budget for.
+    max_backoff_secs: float = 30.0
+    # How many times a rate limited request is retried before raising.
+    max_retries: int = 3
+
+
+class TokenBucket:
+    """A thread-safe token bucket.
+
+    Callers that find the bucket empty reserve a future token and sleep until
+    it is due, so concurrent callers are spaced out rather than stampeding."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = monotonic()
+        self.paused_until = 0.0
+        self.consecutive_limited = 0
+        self.lock: ContextManager[Any] = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        start = max(self.updated, self.paused_until)
+        if now > start:
+            self.tokens = min(self.capacity, self.tokens + (now - start) * self.rate)
+        self.updated = max(now, self.updated)
+
+    def reserve(self) -> float:
+        """Takes a token, returning how many seconds to wait before using it."""
+        with self.lock:
+            now = monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = max(0.0, self.paused_until - now)
+            if self.tokens < 0:
+                wait += -self.tokens / self.rate
+            return wait
+
+    def try_acquire(self) -> float:
+        """Takes a token if one is available, returning 0. Otherwise takes
+        nothing and returns how many seconds until one will be."""
+        with self.lock:
+            now = monotonic()
+            self._refill(now)
+            if self.tokens >= 1 and now >= self.paused_until:
+                self.tokens -= 1
+                return 0.0
+            return max(self.paused_until - now, (1 - self.tokens) / self.rate)
+
+    def acquire(self) -> float:
+        """Blocks until a token is available. Returns the seconds spent waiting."""
+        wait = self.reserve()
+        if wait > 0:
+            sleep(wait)
+        return wait
+
+    def pause(self, secs: float) -> None:
+        """Withholds all tokens for `secs` and halves the refill rate."""
+        with self.lock:
+            now = monotonic()
+            self._refill(now)
+            self.paused_until = max(self.paused_until, now + secs)
+            self.tokens = min(self.tokens, 0.0)
+            self.rate = max(self.max_rate / 10, self.rate / 2)
+
+    def recover(self) -> None:
+        """Steps the refill rate back towards its configured maximum."""
+        if self.rate < self.max_rate:
+            with self.lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class SharedField:
+    """A TokenBucket attribute stored in the bucket's shared memory."""
+
+    def __init__(self, index: int):
+        self.index = index
+
+    def __get__(self, bucket: Any, owner: type) -> Any:
+        return bucket.state[self.index]
+
+    def __set__(self, bucket: Any, value: float) -> None:
+        bucket.state[self.index] = value
+
+
+class SharedTokenBucket(TokenBucket):
+    """A token bucket kept in shared memory, so that every process it is
+    passed to when started draws from, and backs off, the same budget.
+
+    Buckets are timed by monotonic(), which reads one clock across a host."""
+
+    tokens = SharedField(0)
+    updated = SharedField(1)
+    paused_until = SharedField(2)
+    rate = SharedField(3)
+    consecutive_limited = SharedField(4)
+
+    def __init__(self, rate: float, capacity: int):
+        context = multiprocessing.get_context("spawn")
+        self.state = context.RawArray("d", 5)
+        super().__init__(rate, capacity)
+        self.lock = context.Lock()
+
+
+class RateLimiter:
+    """Paces every request a client makes within separate read and write budgets.
+
+    Backs off when the exchange responds with a 429, honoring Retry-After when
+    it is provided and otherwise doubling the pause on consecutive 429s. A
+    shared limiter paces every process it is passed to as one client."""
+
+    def __init__(self, config: Optional[RateLimitConfig] = None, shared: bool = False):
+        self.config = config if config is not None else RateLimitConfig()
+        bucket = SharedTokenBucket if shared else TokenBucket
+        self.reads = bucket(self.config.reads_per_sec, self.config.read_burst)
+        self.writes = bucket(self.config.writes_per_sec, self.config.write_burst)
+
+    def bucket(self, method: str) -> TokenBucket:
+        return self.reads if method == "GET" else self.writes
+
+    def acquire(self, method: str) -> float:
+        return self.bucket(method).acquire()
+
+    def backoff_secs(self, bucket: TokenBucket, headers: Mapping[str, str]) -> float:
+        retry_after = headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.config.max_backoff_secs)
+            except ValueError:
+                pass
+        return min(
+            0.5 * 2 ** (bucket.consecutive_limited - 1), self.config.max_backoff_secs
+        )
+
+    def on_response(
+        self, method: str, status: int, headers: Mapping[str, str]
+    ) -> Optional[float]:
+        """Adapts the budget to a response.
+
+        Returns the pause applied if the request was rate limited, else None."""
+        bucket = self.bucket(method)
+        if status != 429:
+            bucket.consecutive_limited = 0
+            bucket.recover()
+            return None
+
+        bucket.consecutive_limited += 1
+        backoff = self.backoff_secs(bucket, headers)
+        bucket.pause(backoff)
+        return backoff
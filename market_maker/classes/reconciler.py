@@ -0,0 +1,100 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from market_maker.classes.order import Order
+from market_maker.classes.order_book import OrderBook
+from market_maker.classes.order_state import RestingOrder
+
+
+@dataclass
+class Decrease:
+    order_id: str
+    reduce_by: int
+
+
+@dataclass
+class ActionPlan:
+    """The requests that move our resting orders to a desired book."""
+
+    cancels: List[str] = field(default_factory=list)
+    decreases: List[Decrease] = field(default_factory=list)
+    posts: List[Order] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not (self.cancels or self.decreases or self.posts)
+
+
+class Reconciler:
+    """Plans the smallest set of actions that turns our resting orders into a
+    desired book.
+
+    Levels that are short are topped up with a new order for the difference.
+    Levels that are long shed their newest orders first, so the orders with
+    the best queue priority are kept: whole orders are cancelled while they
+    fit within the excess and the remainder is decreased in place. If
+    `use_decrease` is off, the partially excess order is cancelled and its
+    kept quantity re-posted instead."""
+
+    def __init__(self, use_decrease: bool = True):
+        self.use_decrease = use_decrease
+
+    def plan(
+        self,
+        market_id: str,
+        desired: OrderBook,
+        orders: List[RestingOrder],
+        expiration_unix_ts: int,
+    ) -> ActionPlan:
+        """`orders` must be listed oldest first."""
+        plan = ActionPlan()
+        current = OrderBook.from_orders(orders)
+
+        levels: Dict[Tuple[bool, int], List[RestingOrder]] = {}
+        for order in orders:
+            levels.setdefault((order.is_yes, order.price), []).append(order)
+
+        for is_yes in (True, False):
+            side = "yes" if is_yes else "no"
+            excess = current.side(is_yes) - desired.side(is_yes)
+
+            for i in np.flatnonzero(excess):
+                price = int(i) + 1
+                level_excess = int(excess[i])
+
+                if level_excess < 0:
+                    top_up = -level_excess
+                else:
+                    top_up = self._shed(plan, levels[(is_yes, price)], level_excess)
+
+                if top_up > 0:
+                    plan.posts.append(
+                        Order(
+                            count=top_up,
+                            expiration_unix_ts=expiration_unix_ts,
+                            market_id=market_id,
+                            price=price,
+                            side=side,
+                        )
+                    )
+
+        return plan
+
+    def _shed(self, plan: ActionPlan, level: List[RestingOrder], excess: int) -> int:
+        """Removes `excess` contracts from a level, newest orders first.
+
+        Returns the quantity that must be re-posted to make up for it."""
+        for order in reversed(level):
+            if excess == 0:
+                break
+            if order.remaining_count <= excess:
+                plan.cancels.append(order.order_id)
+                excess -= order.remaining_count
+            elif self.use_decrease:
+                plan.decreases.append(Decrease(order.order_id, excess))
+                excess = 0
+            else:
+                plan.cancels.append(order.order_id)
+                return order.remaining_count - excess
+        return 0
@@ -0,0 +1,321 @@
+import json
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import IO, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from market_maker.classes.order_book import PRICE_LEVELS, OrderBook
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.jsonl"
+
+# Market ids and order ids are UUIDs.
+ID = "S36"
+
+BOOK_DTYPE = np.dtype(
+    [
+        ("time", "f8"),
+        ("market_id", ID),
+        ("yes", "i4", (PRICE_LEVELS,)),
+        ("no", "i4", (PRICE_LEVELS,)),
+    ]
+)
+MARKET_DTYPE = np.dtype(
+    [
+        ("time", "f8"),
+        ("market_id", ID),
+        ("status", "S16"),
+        ("yes_bid", "i2"),
+        ("yes_ask", "i2"),
+        ("volume", "i8"),
+    ]
+)
+POSITION_DTYPE = np.dtype(
+    [
+        ("time", "f8"),
+        ("market_id", ID),
+        ("position", "i8"),
+        ("position_cost", "i8"),
+    ]
+)
+ACTION_DTYPE = np.dtype(
+    [
+        ("time", "f8"),
+        ("market_id", ID),
+        ("action", "u1"),
+        ("order_id", ID),
+        ("is_yes", "?"),
+        ("price", "i2"),
+        ("count", "i4"),
+    ]
+)
+
+DTYPES = {
+    "books": BOOK_DTYPE,
+    "markets": MARKET_DTYPE,
+    "positions": POSITION_DTYPE,
+    "actions": ACTION_DTYPE,
+}
+
+# Values of the `action` field of action records.
+POST = 1
+CANCEL = 2
+DECREASE = 3
+FILL = 4
+
+
+@dataclass
+class RecorderConfig:
+    # Recordings are written under this directory, one subdirectory per kind.
+    directory: str = "recordings"
+    # Records per segment file before a new one is started.
+    segment_records: int = 100000
+    # When polling, fetch the order book of each market when it is requoted so
+    # that it can be recorded. This costs one read per requote. Streaming
+    # records the feed's books without extra requests.
+    record_books: bool = True
+
+
+class Segment:
+    """One append-only file of fixed-size records of a single kind."""
+
+    def __init__(self, directory: str, kind: str):
+        self.kind = kind
+        self.name = "%s/%020d.bin" % (kind, time.time_ns())
+        self.path = os.path.join(directory, self.name)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file: IO[bytes] = open(self.path, "ab")
+        self.records = 0
+        self.start: Optional[float] = None
+        self.end: Optional[float] = None
+        self.markets: set = set()
+
+    def write(self, records: np.ndarray) -> None:
+        self.file.write(records.tobytes())
+        self.records += len(records)
+        times = records["time"]
+        self.start = float(times.min()) if self.start is None else self.start
+        self.end = float(times.max())
+        self.markets.update(records["market_id"].tolist())
+
+    def close(self) -> dict:
+        """Closes the file and returns its manifest entry."""
+        self.file.close()
+        return {
+            "version": FORMAT_VERSION,
+            "kind": self.kind,
+            "file": self.name,
+            "records": self.records,
+            "start": self.start,
+            "end": self.end,
+            "markets": sorted(m.decode() for m in self.markets),
+        }
+
+
+class Recorder:
+    """Records market data and our order actions for backtests and
+    post-mortems.
+
+    Callers only copy the record onto a queue; a background thread converts
+    batches into fixed-size numpy records and appends them to segment files.
+    Each kind of record is written to its own segments, and every closed
+    segment is listed in a manifest with its time range and markets so that
+    RecordingReader can skip segments a query does not need."""
+
+    def __init__(self, config: Optional[RecorderConfig] = None):
+        self.config = config if config is not None else RecorderConfig()
+        self.queue: "queue.SimpleQueue[Optional[Tuple[str, tuple]]]" = (
+            queue.SimpleQueue()
+        )
+        self.segments: Dict[str, Segment] = {}
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self) -> "Recorder":
+        os.makedirs(self.config.directory, exist_ok=True)
+        self.thread.start()
+        return self
+
+    def close(self) -> None:
+        """Writes every queued record and closes the open segments."""
+        self.queue.put(None)
+        self.thread.join()
+
+    def record_book(self, market_id: str, book: OrderBook) -> None:
+        self.queue.put(
+            ("books", (time.time(), market_id, book.yes.copy(), book.no.copy()))
+        )
+
+    def record_markets(self, recs: Iterable[dict]) -> None:
+        now = time.time()
+        for rec in recs:
+            self.queue.put(
+                (
+                    "markets",
+                    (
+                        now,
+                        rec["id"],
+                        rec["status"],
+                        rec["yes_bid"],
+                        rec["yes_ask"],
+                        rec["volume"],
+                    ),
+                )
+            )
+
+    def record_positions(self, recs: Iterable[dict]) -> None:
+        now = time.time()
+        for rec in recs:
+            self.queue.put(
+                (
+                    "positions",
+                    (now, rec["market_id"], rec["position"], rec["position_cost"]),
+                )
+            )
+
+    def record_action(
+        self,
+        action: int,
+        market_id: str,
+        order_id: str = "",
+        is_yes: bool = False,
+        price: int = 0,
+        count: int = 0,
+    ) -> None:
+        self.queue.put(
+            (
+                "actions",
+                (time.time(), market_id, action, order_id, is_yes, price, count),
+            )
+        )
+
+    def run(self) -> None:
+        while True:
+            item = self.queue.get()
+            batch: Dict[str, List[tuple]] = {}
+            stopping = item is None
+            while item is not None:
+                batch.setdefault(item[0], []).append(item[1])
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                stopping = stopping or item is None
+
+            for kind, rows in batch.items():
+                try:
+                    self.write(kind, np.array(rows, dtype=DTYPES[kind]))
+                except (OSError, ValueError, TypeError) as e:
+                    print("Failed to record", len(rows), kind)
+                    print(str(e))
+            if stopping:
+                for kind in list(self.segments):
+                    self.roll(kind)
+                return
+
+    def write(self, kind: str, records: np.ndarray) -> None:
+        segment_records = self.config.segment_records
+        while len(records) > 0:
+            segment = self.segments.get(kind)
+            if segment is None:
+                segment = self.segments[kind] = Segment(self.config.directory, kind)
+            room = segment_records - segment.records
+            segment.write(records[:room])
+            segment.file.flush()
+            records = records[room:]
+            if segment.records >= segment_records:
+                self.roll(kind)
+
+    def roll(self, kind: str) -> None:
+        entry = self.segments.pop(kind).close()
+        with open(os.path.join(self.config.directory, MANIFEST), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+class RecordingReader:
+    """Queries a recording by kind, market and time range.
+
+    Segments are memory-mapped, and closed segments whose time range or
+    markets fall outside a query are never opened. The segments still being
+    written are read up to their last complete record."""
+
+    def __init__(self, directory: str = "recordings"):
+        self.directory = directory
+
+    def manifest(self) -> Dict[str, dict]:
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        return {entry["file"]: entry for entry in entries}
+
+    def segments(self, kind: str) -> List[str]:
+        kind_dir = os.path.join(self.directory, kind)
+        if not os.path.isdir(kind_dir):
+            return []
+        return sorted(
+            "%s/%s" % (kind, name)
+            for name in os.listdir(kind_dir)
+            if name.endswith(".bin")
+        )
+
+    def read(
+        self,
+        kind: str,
+        market_id: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> np.ndarray:
+        """Records of one kind, in time order, optionally limited to one market
+        and to times in [start, end)."""
+        dtype = DTYPES[kind]
+        manifest = self.manifest()
+        parts: List[np.ndarray] = []
+        for name in self.segments(kind):
+            entry = manifest.get(name)
+            if entry is not None and (
+                entry["records"] == 0
+                or (market_id is not None and market_id not in entry["markets"])
+                or (start is not None and entry["end"] < start)
+                or (end is not None and entry["start"] >= end)
+            ):
+                continue
+
+            path = os.path.join(self.directory, name)
+            count = os.path.getsize(path) // dtype.itemsize
+            if count == 0:
+                continue
+            records = np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+            mask = np.ones(count, dtype=bool)
+            if market_id is not None:
+                mask &= records["market_id"] == market_id.encode()
+            if start is not None:
+                mask &= records["time"] >= start
+            if end is not None:
+                mask &= records["time"] < end
+            parts.append(records[mask])
+
+        if len(parts) == 0:
+            return np.empty(0, dtype=dtype)
+        matched = np.concatenate(parts)
+        return matched[np.argsort(matched["time"], kind="stable")]
+
+    def books(
+        self,
+        market_id: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The recorded books of a market as times and (T, 99) yes and no
+        arrays, laid out as MarketHistory expects them."""
+        records = self.read("books", market_id, start, end)
+        return (
+            records["time"],
+            records["yes"].astype(np.int64),
+            records["no"].astype(np.int64),
+        )
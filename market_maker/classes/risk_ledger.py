@@ -0,0 +1,183 @@
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional
+
+
+@dataclass
+class RiskLimits:
+    # The most that our position and resting orders in any one market may cost,
+    # in cents, or None for no limit. Quoting keeps each side of a market near
+    # its `max_exposure_cents`; this caps both sides together.
+    max_market_cents: Optional[int] = None
+    # The most that every market of one event may cost together, or None.
+    max_event_cents: Optional[int] = None
+    # The most that every market may cost together, or None. This counts our
+    # positions in every market of the account, not only those being made.
+    max_total_cents: Optional[int] = None
+
+
+class RiskLimitError(Exception):
+    """Raised when posting orders would take exposure past a limit, in which
+    case none of them are posted."""
+
+    def __init__(self, scope: str, key: str, limit_cents: int, cents: int):
+        super().__init__(
+            "%s exposure of %s would be %d cents, over its limit of %d"
+            % (scope, key, cents, limit_cents)
+        )
+        self.scope = scope
+        self.key = key
+        self.limit_cents = limit_cents
+        self.cents = cents
+
+
+class RiskLedger:
+    """What our positions and resting orders cost, per market, per event and in
+    total.
+
+    The order state and position store report every change to a market's
+    resting orders or position as it happens, so each sum is kept current in
+    constant time and checking a batch of orders only touches the markets and
+    events in it. Orders being posted are reserved until their response is
+    recorded, so concurrent posts cannot pass the limits together."""
+
+    def __init__(self, limits: Optional[RiskLimits] = None):
+        self.limits = limits if limits is not None else RiskLimits()
+        self.resting: Dict[str, int] = {}
+        self.positions: Dict[str, int] = {}
+        self.pending: Dict[str, int] = {}
+        # The event of each market. Markets of unknown events stand alone.
+        self.events: Dict[str, str] = {}
+        self.event_cents: Dict[str, int] = {}
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def set_events(self, events: Dict[str, str]) -> None:
+        """Records the event of each market, moving their exposure with them."""
+        with self.lock:
+            for market_id, event in events.items():
+                previous = self.event_of(market_id)
+                if previous == event:
+                    continue
+                cents = self._market_cents(market_id)
+                self._add_event(previous, -cents)
+                self.events[market_id] = event
+                self._add_event(event, cents)
+
+    def event_of(self, market_id: str) -> str:
+        return self.events.get(market_id, market_id)
+
+    def _market_cents(self, market_id: str) -> int:
+        return (
+            self.resting.get(market_id, 0)
+            + self.positions.get(market_id, 0)
+            + self.pending.get(market_id, 0)
+        )
+
+    def _add_event(self, event: str, cents: int) -> None:
+        cents += self.event_cents.get(event, 0)
+        if cents == 0:
+            self.event_cents.pop(event, None)
+        else:
+            self.event_cents[event] = cents
+
+    def _move(self, book: Dict[str, int], market_id: str, cents: int) -> None:
+        """Adds `cents` to one of a market's sums and to the sums above it."""
+        if cents == 0:
+            return
+        total = book.get(market_id, 0) + cents
+        if total == 0:
+            book.pop(market_id, None)
+        else:
+            book[market_id] = total
+        self._add_event(self.event_of(market_id), cents)
+        self.total += cents
+
+    def add_resting(self, market_id: str, cents: int) -> None:
+        """Moves the cost of a market's resting orders, by a negative amount
+        for cancels and fills."""
+        with self.lock:
+            self._move(self.resting, market_id, cents)
+
+    def set_position(self, market_id: str, cents: int) -> None:
+        with self.lock:
+            self._move(
+                self.positions, market_id, cents - self.positions.get(market_id, 0)
+            )
+
+    def set_positions(self, positions: Dict[str, int]) -> None:
+        """Replaces every position, such as after a snapshot."""
+        with self.lock:
+            for market_id in list(self.positions):
+                if market_id not in positions:
+                    self._move(self.positions, market_id, -self.positions[market_id])
+            for market_id, cents in positions.items():
+                self._move(
+                    self.positions, market_id, cents - self.positions.get(market_id, 0)
+                )
+
+    def reserve(self, costs: Dict[str, int]) -> None:
+        """Holds the cost of orders about to be posted, by market.
+
+        Raises RiskLimitError, reserving nothing, if that would take a market,
+        an event or the total past its limit."""
+        limits = self.limits
+        with self.lock:
+            event_costs: Dict[str, int] = {}
+            for market_id, cents in costs.items():
+                market_cents = self._market_cents(market_id) + cents
+                if (
+                    limits.max_market_cents is not None
+                    and market_cents > limits.max_market_cents
+                ):
+                    raise RiskLimitError(
+                        "market", market_id, limits.max_market_cents, market_cents
+                    )
+                event = self.event_of(market_id)
+                event_costs[event] = event_costs.get(event, 0) + cents
+            if limits.max_event_cents is not None:
+                for event, cents in event_costs.items():
+                    event_cents = self.event_cents.get(event, 0) + cents
+                    if event_cents > limits.max_event_cents:
+                        raise RiskLimitError(
+                            "event", event, limits.max_event_cents, event_cents
+                        )
+            total = self.total + sum(costs.values())
+            if limits.max_total_cents is not None and total > limits.max_total_cents:
+                raise RiskLimitError(
+                    "total", "all markets", limits.max_total_cents, total
+                )
+            for market_id, cents in costs.items():
+                self._move(self.pending, market_id, cents)
+
+    def release(self, costs: Dict[str, int]) -> None:
+        """Drops a reservation once the posted orders are recorded as resting."""
+        with self.lock:
+            for market_id, cents in costs.items():
+                self._move(self.pending, market_id, -cents)
+
+    def market_cents(self, market_id: str) -> int:
+        with self.lock:
+            return self._market_cents(market_id)
+
+    def markets_cents(self, market_ids: Iterable[str]) -> int:
+        """What our positions and resting orders in several markets cost."""
+        with self.lock:
+            return sum(self._market_cents(market_id) for market_id in market_ids)
+
+    def total_cents(self) -> int:
+        with self.lock:
+            return self.total
+
+    def summary(self) -> Dict[str, Any]:
+        """Every nonzero exposure by market and by event, and the total."""
+        with self.lock:
+            markets = dict(self.resting)
+            for book in (self.positions, self.pending):
+                for market_id, cents in book.items():
+                    markets[market_id] = markets.get(market_id, 0) + cents
+            return {
+                "markets": markets,
+                "events": dict(self.event_cents),
+                "total": self.total,
+            }
@@ -0,0 +1,237 @@
+import os
+import threading
+from dataclasses import replace
+from time import sleep
+from typing import Dict, List, Optional, Tuple
+
+from market_maker.classes.environment import Environment
+from market_maker.classes.maker_client import MakerClient
+from market_maker.classes.market_data import MarketData
+from market_maker.classes.market_maker import MarketMaker
+from market_maker.classes.metrics import create_metrics
+from market_maker.classes.mock_exchange import MockExchange
+from market_maker.classes.mock_feed import LOCAL_FEED_PORT, MockFeedServer
+from market_maker.classes.profiles import StrategyProfile
+from market_maker.classes.rate_limiter import RateLimiter
+from market_maker.classes.recorder import Recorder
+from market_maker.classes.transport import Transport
+from market_maker.utils.credentials import get_credentials
+
+# Seconds between checks on the profiles' threads.
+CHECK_INTERVAL_SECS = 1.0
+
+# An environment and an account under it, or None for its own entry.
+Account = Tuple[Environment, Optional[str]]
+
+
+def account_of(strategy: StrategyProfile) -> Account:
+    # The local mock exchange keeps a single set of orders and positions, so
+    # every local profile trades the same account.
+    if strategy.env == Environment.LOCAL:
+        return (Environment.LOCAL, None)
+    return (strategy.env, strategy.account)
+
+
+def account_name(account: Account) -> str:
+    env, name = account
+    return "%s-%s" % (env.name.lower(), name if name is not None else "default")
+
+
+class Runner:
+    """Runs several strategy profiles in one process, each on a thread of its
+    own.
+
+    Profiles trading the same account share one client, so that the account's
+    orders, positions, exposure and rate budget are tracked once. The account's
+    settings, such as its rate limit, risk limits and metrics, are those of its
+    first profile. Every client reuses the connection pools of one transport,
+    and the market list and order books of each environment are fetched once
+    for every profile trading it, at most as often as the shortest refresh
+    interval of their schedulers. A profile whose thread fails has its orders
+    cancelled, and the others carry on."""
+
+    def __init__(
+        self,
+        strategies: Dict[str, StrategyProfile],
+        use_async: bool = False,
+        use_stream: bool = False,
+        record: bool = False,
+        metrics: bool = False,
+        config_path: Optional[str] = None,
+        reload: bool = False,
+    ):
+        self.strategies = {
+            profile: self.profile_strategy(profile, strategy)
+            for profile, strategy in strategies.items()
+        }
+        self.options = (use_async, use_stream)
+        self.config_path = config_path
+        self.reload = reload
+
+        self.accounts: Dict[Account, List[str]] = {}
+        for profile, strategy in self.strategies.items():
+            self.accounts.setdefault(account_of(strategy), []).append(profile)
+        self.check_markets()
+
+        # Local profiles share one mock exchange listing all of their markets.
+        self.exchange: Optional[MockExchange] = None
+        self.feed_server: Optional[MockFeedServer] = None
+        local = [s for s in self.strategies.values() if s.env == Environment.LOCAL]
+        if len(local) > 0:
+            self.exchange = MockExchange(local[0].local_exchange).start()
+            for strategy in local:
+                for market in strategy.markets:
+                    self.exchange.add_market(market.market_ticker)
+            if use_stream:
+                self.feed_server = MockFeedServer(LOCAL_FEED_PORT).start()
+
+        first = next(iter(self.strategies.values()))
+        transport = Transport(first.transport)
+        self.clients: Dict[Account, MakerClient] = {}
+        for slot, (account, profiles) in enumerate(self.accounts.items()):
+            self.clients[account] = self.build_client(
+                account,
+                self.strategies[profiles[0]],
+                transport if slot == 0 else transport.fork(),
+                slot,
+                record,
+                metrics,
+            )
+
+        self.market_data: Dict[Environment, MarketData] = {}
+        for (env, _), client in self.clients.items():
+            if env not in self.market_data:
+                self.market_data[env] = MarketData(
+                    client,
+                    min(
+                        strategy.scheduler.refresh_interval_secs
+                        for strategy in self.strategies.values()
+                        if strategy.env == env
+                    ),
+                )
+
+        self.threads: Dict[str, threading.Thread] = {}
+
+    def profile_strategy(
+        self, profile: str, strategy: StrategyProfile
+    ) -> StrategyProfile:
+        """The strategy a profile runs: in a single thread, with its own state
+        file, since the profiles save their state concurrently."""
+        if strategy.supervisor.workers > 1:
+            print("Running %s without worker processes." % profile)
+        state_path = strategy.fills.state_path
+        if state_path is not None:
+            root, ext = os.path.splitext(state_path)
+            state_path = "%s.%s%s" % (root, profile, ext)
+        return replace(
+            strategy,
+            fills=replace(strategy.fills, state_path=state_path),
+            supervisor=replace(strategy.supervisor, workers=1),
+        )
+
+    def check_markets(self) -> None:
+        """Refuses to make a market from two profiles of the same account,
+        whose quotes would cancel each other's orders."""
+        for account, profiles in self.accounts.items():
+            owners: Dict[str, str] = {}
+            for profile in profiles:
+                for market in self.strategies[profile].markets:
+                    owner = owners.setdefault(market.market_ticker, profile)
+                    if owner != profile:
+                        raise ValueError(
+                            "%s is made by both %s and %s in account %s"
+                            % (
+                                market.market_ticker,
+                                owner,
+                                profile,
+                                account_name(account),
+                            )
+                        )
+
+    def build_client(
+        self,
+        account: Account,
+        strategy: StrategyProfile,
+        transport: Transport,
+        slot: int,
+        record: bool,
+        metrics: bool,
+    ) -> MakerClient:
+        """The client of an account, with its own metrics port and recording
+        directory."""
+        env, name = account
+        credentials = get_credentials(env, name)
+        config = strategy.metrics
+        client = MakerClient(
+            env,
+            credentials.email,
+            credentials.password,
+            credentials.advanced_api,
+            transport,
+            RateLimiter(strategy.rate_limit),
+            create_metrics(
+                replace(
+                    config,
+                    enabled=config.enabled or metrics,
+                    port=config.port + slot if config.port is not None else None,
+                )
+            ),
+            strategy.session,
+            strategy.risk,
+        )
+        if env == Environment.LOCAL and self.exchange is not None:
+            client.host = self.exchange.url
+        if record:
+            client.recorder = Recorder(
+                replace(
+                    strategy.recorder,
+                    directory=os.path.join(
+                        strategy.recorder.directory, account_name(account)
+                    ),
+                )
+            ).start()
+        return client
+
+    def run_profile(self, profile: str) -> None:
+        strategy = self.strategies[profile]
+        use_async, use_stream = self.options
+        MarketMaker(
+            "make",
+            profile,
+            use_async=use_async,
+            use_stream=use_stream,
+            strategy=strategy,
+            exchange=self.exchange,
+            config_path=self.config_path,
+            reload=self.reload,
+            client=self.clients[account_of(strategy)],
+            market_data=self.market_data[strategy.env],
+        )
+
+    def run(self) -> None:
+        try:
+            for client in self.clients.values():
+                # Logging in one account at a time keeps the session cache
+                # from being written by several threads at once.
+                client.ensure_session()
+            for profile in self.strategies:
+                thread = threading.Thread(
+                    target=self.run_profile, args=(profile,), name=profile, daemon=True
+                )
+                thread.start()
+                self.threads[profile] = thread
+            while len(self.threads) > 0:
+                sleep(CHECK_INTERVAL_SECS)
+                for profile, thread in list(self.threads.items()):
+                    if not thread.is_alive():
+                        print("Stopped Strategy:", profile)
+                        self.threads.pop(profile)
+        finally:
+            for client in self.clients.values():
+                if client.recorder is not None:
+                    client.recorder.close()
+            if self.exchange is not None:
+                self.exchange.stop()
+            if self.feed_server is not None:
+                self.feed_server.shutdown()
+                self.feed_server.server_close()
@@ -0,0 +1,157 @@
+import heapq
+from dataclasses import dataclass
+from enum import Enum
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+
+
+class MarketOutcome(Enum):
+    # Orders were reconciled against the desired book.
+    QUOTED = 1
+    # The market is waiting out its snipe timeout.
+    SNIPED = 2
+    # The spread is wider than the profile's max_spread.
+    WIDE_SPREAD = 3
+    # The market has never traded.
+    NO_VOLUME = 4
+    # The market closed or passed its clear time and is no longer managed.
+    RETIRED = 5
+
+
+@dataclass
+class SchedulerConfig:
+    # Seconds between requotes of a market with no price movement or fills.
+    base_interval_secs: float = 5.0
+    # Bounds on how often any single market can be requoted.
+    min_interval_secs: float = 0.5
+    max_interval_secs: float = 60.0
+    # Seconds a snapshot of the market list and our fills is reused for by the
+    # markets due after it. Each refresh pages through the whole market list,
+    # so this bounds those requests however many markets come due.
+    refresh_interval_secs: float = 2.0
+    # Weight of past observations in the volatility and fill rate averages.
+    smoothing: float = 0.7
+
+
+@dataclass
+class MarketActivity:
+    last_mid: Optional[float] = None
+    last_position: Optional[int] = None
+    # Moving averages of the midpoint's movement in cents and of contracts
+    # filled, per visit.
+    volatility: float = 0.0
+    fill_rate: float = 0.0
+    # How many times in a row the market was skipped for its spread or volume.
+    idle_visits: int = 0
+
+
+class MarketScheduler:
+    """Decides when each market is next requoted.
+
+    Markets wait in a heap ordered by when they are next due. Markets whose
+    midpoint moves or whose orders fill are revisited more often, quiet and
+    skipped markets less often, and sniped markets not until their snipe
+    timeout ends."""
+
+    def __init__(self, config: Optional[SchedulerConfig] = None):
+        self.config = config if config is not None else SchedulerConfig()
+        self.heap: List[Tuple[float, int, str]] = []
+        # Entries are invalidated lazily: only the latest sequence number for a
+        # market in `due` is live.
+        self.due: Dict[str, Tuple[float, int]] = {}
+        self.activity: Dict[str, MarketActivity] = {}
+        self.sequence = 0
+
+    def schedule(self, market_id: str, due: float) -> None:
+        self.sequence += 1
+        self.due[market_id] = (due, self.sequence)
+        heapq.heappush(self.heap, (due, self.sequence, market_id))
+
+    def add(self, market_id: str, due: Optional[float] = None) -> None:
+        self.activity.setdefault(market_id, MarketActivity())
+        self.schedule(market_id, due if due is not None else monotonic())
+
+    def remove(self, market_id: str) -> None:
+        self.due.pop(market_id, None)
+        self.activity.pop(market_id, None)
+
+    def _prune(self) -> None:
+        while self.heap:
+            due, sequence, market_id = self.heap[0]
+            if self.due.get(market_id) == (due, sequence):
+                return
+            heapq.heappop(self.heap)
+
+    def next_due(self) -> Optional[float]:
+        self._prune()
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now: Optional[float] = None) -> List[str]:
+        """Removes and returns every market that is due, most overdue first."""
+        now = now if now is not None else monotonic()
+        markets: List[str] = []
+        while self.next_due() is not None and self.heap[0][0] <= now:
+            _, _, market_id = heapq.heappop(self.heap)
+            self.due.pop(market_id)
+            markets.append(market_id)
+        return markets
+
+    def interval(self, activity: MarketActivity) -> float:
+        config = self.config
+        interval = config.base_interval_secs / (
+            1 + activity.volatility + activity.fill_rate
+        )
+        interval *= 2 ** min(activity.idle_visits, 4)
+        return min(config.max_interval_secs, max(config.min_interval_secs, interval))
+
+    def record(
+        self,
+        market_id: str,
+        outcome: MarketOutcome,
+        mid: Optional[float] = None,
+        position: Optional[int] = None,
+        resume_at: Optional[float] = None,
+    ) -> None:
+        """Reschedules a market after a visit.
+
+        `resume_at` is the earliest time a sniped market may be quoted again."""
+        if outcome == MarketOutcome.RETIRED:
+            self.remove(market_id)
+            return
+
+        activity = self.activity.setdefault(market_id, MarketActivity())
+        alpha = self.config.smoothing
+        if mid is not None:
+            moved = abs(mid - activity.last_mid) if activity.last_mid is not None else 0
+            activity.volatility = alpha * activity.volatility + (1 - alpha) * moved
+            activity.last_mid = mid
+        if position is not None:
+            filled = (
+                abs(position - activity.last_position)
+                if activity.last_position is not None
+                else 0
+            )
+            activity.fill_rate = alpha * activity.fill_rate + (1 - alpha) * filled
+            activity.last_position = position
+
+        if outcome in (MarketOutcome.WIDE_SPREAD, MarketOutcome.NO_VOLUME):
+            activity.idle_visits += 1
+        else:
+            activity.idle_visits = 0
+
+        now = monotonic()
+        due = now + self.interval(activity)
+        if outcome == MarketOutcome.SNIPED and resume_at is not None:
+            due = max(now + self.config.min_interval_secs, resume_at)
+        self.schedule(market_id, due)
+
+    def queue_depth(self, now: Optional[float] = None) -> int:
+        """The number of markets that are due but not yet visited."""
+        now = now if now is not None else monotonic()
+        return sum(1 for due, _ in self.due.values() if due <= now)
+
+    def lag(self, now: Optional[float] = None) -> float:
+        """How many seconds the most overdue market has been waiting."""
+        now = now if now is not None else monotonic()
+        next_due = self.next_due()
+        return max(0.0, now - next_due) if next_due is not None else 0.0
@@ -0,0 +1,94 @@
+import multiprocessing
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Set, TypeVar
+
+from market_maker.classes.rate_limiter import RateLimiter
+
+T = TypeVar("T")
+
+
+@dataclass
+class SupervisorConfig:
+    # Worker processes that markets are split across. With 1, every market is
+    # made in a single process without a supervisor.
+    workers: int = 1
+    # The most that every worker's positions and resting orders may cost
+    # together, in cents, or None for no global limit.
+    max_total_exposure_cents: Optional[int] = None
+    # Seconds to wait before restarting a worker that exited.
+    restart_delay_secs: float = 5.0
+    # A worker that exits this many times within `restart_window_secs` is
+    # retired and its markets are moved to the other workers.
+    max_restarts: int = 3
+    restart_window_secs: float = 300.0
+    # Markets are moved between workers once the largest and smallest shares
+    # differ by more than this many markets, as markets close.
+    max_imbalance: int = 5
+
+
+class ExposureLedger:
+    """The exposure of every worker process, in shared memory, held under one
+    global limit.
+
+    Each worker owns a slot. It reserves the cost of new orders before posting
+    them and resets its slot to its actual exposure once a cycle."""
+
+    def __init__(self, slots: int, limit_cents: Optional[int] = None):
+        context = multiprocessing.get_context("spawn")
+        self.limit_cents = limit_cents
+        self.exposures = context.RawArray("q", slots)
+        self.lock = context.Lock()
+
+    def set(self, slot: int, cents: int) -> None:
+        with self.lock:
+            self.exposures[slot] = cents
+
+    def total_cents(self) -> int:
+        with self.lock:
+            return sum(self.exposures)
+
+    def reserve(self, slot: int, cents: int) -> bool:
+        """Adds `cents` to a slot if every slot's total stays within the limit.
+
+        Returns whether it did."""
+        with self.lock:
+            total = sum(self.exposures) + cents
+            if self.limit_cents is not None and total > self.limit_cents:
+                return False
+            self.exposures[slot] += cents
+            return True
+
+
+@dataclass
+class WorkerContext:
+    """What a worker process shares with its supervisor and the other workers."""
+
+    slot: int
+    rate_limiter: RateLimiter
+    ledger: ExposureLedger
+    # A multiprocessing queue the worker puts the tickers of retired markets on.
+    retired: Any
+    # Overrides the exchange's REST host, such as a supervisor's mock exchange.
+    host: Optional[str] = None
+
+
+def split(items: Sequence[T], slots: Sequence[int]) -> Dict[int, List[T]]:
+    """Deals items out to slots in turn."""
+    shares: Dict[int, List[T]] = {slot: [] for slot in slots}
+    for i, item in enumerate(items):
+        shares[slots[i % len(slots)]].append(item)
+    return shares
+
+
+def rebalance(shares: Dict[int, List[T]]) -> Set[int]:
+    """Moves items from the largest shares to the smallest until no two differ
+    by more than one. Returns the slots whose shares changed."""
+    changed: Set[int] = set()
+    while len(shares) > 1:
+        largest = max(shares, key=lambda slot: len(shares[slot]))
+        smallest = min(shares, key=lambda slot: len(shares[slot]))
+        if len(shares[largest]) - len(shares[smallest]) <= 1:
+            break
+        shares[smallest].append(shares[largest].pop())
+        changed |= {largest, smallest}
+    return changed
@@ -0,0 +1,238 @@
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+from dataclasses import replace
+from multiprocessing.process import BaseProcess
+from time import monotonic, sleep
+from typing import Any, Dict, List, Optional
+
+from market_maker.classes.environment import Environment
+from market_maker.classes.market_maker import MarketMaker
+from market_maker.classes.mock_exchange import MockExchange
+from market_maker.classes.mock_feed import LOCAL_FEED_PORT, MockFeedServer
+from market_maker.classes.profiles import MarketProfile, StrategyProfile
+from market_maker.classes.rate_limiter import RateLimiter
+from market_maker.classes.sharding import (
+    ExposureLedger,
+    WorkerContext,
+    rebalance,
+    split,
+)
+
+# Seconds between checks on the workers.
+CHECK_INTERVAL_SECS = 1.0
+
+
+def run_worker(
+    profile: str,
+    strategy: StrategyProfile,
+    worker: WorkerContext,
+    use_async: bool,
+    use_stream: bool,
+    record: bool,
+    metrics: bool,
+) -> None:
+    # Exit through MarketMaker, which cancels this worker's orders, when the
+    # supervisor stops us. An interrupt from the terminal is left to the
+    # supervisor, which then stops every worker this way.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    MarketMaker(
+        "make",
+        profile,
+        use_async=use_async,
+        use_stream=use_stream,
+        record=record,
+        strategy=strategy,
+        metrics=metrics,
+        worker=worker,
+    )
+
+
+class Supervisor:
+    """Splits a strategy's markets across worker processes and keeps them
+    running.
+
+    Every worker runs its own client and loop over its share of the markets.
+    They draw from one shared rate limit budget and reserve the cost of their
+    orders in one shared exposure ledger. A worker that exits is restarted,
+    and one that keeps exiting is retired with its markets moved to the
+    others. Markets are also moved when closed markets leave the shares
+    uneven."""
+
+    def __init__(
+        self,
+        profile: str,
+        strategy: StrategyProfile,
+        use_async: bool = False,
+        use_stream: bool = False,
+        record: bool = False,
+        metrics: bool = False,
+    ):
+        self.profile = profile
+        self.strategy = strategy
+        self.config = strategy.supervisor
+        self.options = (use_async, use_stream, record, metrics)
+        self.context = multiprocessing.get_context("spawn")
+
+        self.rate_limiter = RateLimiter(strategy.rate_limit, shared=True)
+        self.ledger = ExposureLedger(
+            self.config.workers, self.config.max_total_exposure_cents
+        )
+        self.retired: Any = self.context.Queue()
+        self.shares: Dict[int, List[MarketProfile]] = split(
+            strategy.markets, list(range(self.config.workers))
+        )
+        self.processes: Dict[int, BaseProcess] = {}
+        self.exits: Dict[int, List[float]] = {slot: [] for slot in self.shares}
+        self.restart_at: Dict[int, float] = {}
+
+        # Workers in the local environment share one mock exchange.
+        self.exchange: Optional[MockExchange] = None
+        self.feed_server: Optional[MockFeedServer] = None
+        if strategy.env == Environment.LOCAL:
+            self.exchange = MockExchange(strategy.local_exchange).start()
+            for market in strategy.markets:
+                self.exchange.add_market(market.market_ticker)
+            if use_stream:
+                self.feed_server = MockFeedServer(LOCAL_FEED_PORT).start()
+
+    def worker_strategy(self, slot: int) -> StrategyProfile:
+        """The strategy a worker runs: its share of the markets, with its own
+        metrics port, recording directory and state file."""
+        metrics = self.strategy.metrics
+        recorder = self.strategy.recorder
+        state_path = self.strategy.fills.state_path
+        if state_path is not None:
+            root, ext = os.path.splitext(state_path)
+            state_path = "%s.worker-%d%s" % (root, slot, ext)
+        return replace(
+            self.strategy,
+            markets=list(self.shares[slot]),
+            fills=replace(self.strategy.fills, state_path=state_path),
+            metrics=replace(
+                metrics,
+                port=metrics.port + slot if metrics.port is not None else None,
+            ),
+            recorder=replace(
+                recorder,
+                directory=os.path.join(recorder.directory, "worker-%d" % slot),
+            ),
+        )
+
+    def start(self, slot: int) -> None:
+        worker = WorkerContext(
+            slot,
+            self.rate_limiter,
+            self.ledger,
+            self.retired,
+            self.exchange.url if self.exchange is not None else None,
+        )
+        process = self.context.Process(
+            target=run_worker,
+            args=(self.profile, self.worker_strategy(slot), worker, *self.options),
+            name="worker-%d" % slot,
+        )
+        process.start()
+        self.processes[slot] = process
+        print(
+            "Started worker %d (pid %s) with %d markets"
+            % (slot, process.pid, len(self.shares[slot]))
+        )
+
+    def stop(self, slot: int) -> None:
+        process = self.processes.pop(slot, None)
+        if process is None:
+            return
+        process.terminate()
+        process.join(timeout=10)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def restart(self, slots: List[int]) -> None:
+        """Stops every worker before starting any, so that no market is ever
+        quoted by two workers at once."""
+        for slot in slots:
+            self.stop(slot)
+        for slot in slots:
+            self.restart_at.pop(slot, None)
+            self.start(slot)
+
+    def run(self) -> None:
+        for slot in self.shares:
+            self.start(slot)
+        try:
+            while len(self.shares) > 0:
+                sleep(CHECK_INTERVAL_SECS)
+                self.collect_retired()
+                self.check_workers()
+                self.check_balance()
+        finally:
+            for slot in list(self.processes):
+                self.stop(slot)
+            if self.exchange is not None:
+                self.exchange.stop()
+            if self.feed_server is not None:
+                self.feed_server.shutdown()
+                self.feed_server.server_close()
+
+    def collect_retired(self) -> None:
+        """Drops markets that workers have stopped making from their shares."""
+        while True:
+            try:
+                ticker = self.retired.get_nowait()
+            except queue.Empty:
+                return
+            for share in self.shares.values():
+                share[:] = [m for m in share if m.market_ticker != ticker]
+
+    def check_workers(self) -> None:
+        now = monotonic()
+        for slot in list(self.shares):
+            process = self.processes.get(slot)
+            if process is not None and process.is_alive():
+                continue
+
+            if process is not None:
+                self.processes.pop(slot)
+                exits = self.exits[slot] = [
+                    t
+                    for t in self.exits[slot]
+                    if now - t < self.config.restart_window_secs
+                ] + [now]
+                print("Worker %d exited with code %s" % (slot, process.exitcode))
+                if len(exits) >= self.config.max_restarts:
+                    self.retire(slot)
+                    continue
+                self.restart_at[slot] = now + self.config.restart_delay_secs
+
+            if now >= self.restart_at.get(slot, now):
+                self.restart([slot])
+
+    def retire(self, slot: int) -> None:
+        """Gives up on a worker and moves its markets to the other workers."""
+        markets = self.shares.pop(slot)
+        self.restart_at.pop(slot, None)
+        print("Retiring worker %d, moving %d markets" % (slot, len(markets)))
+        if len(self.shares) == 0:
+            print("No workers left.")
+            return
+
+        changed = set()
+        for market in markets:
+            smallest = min(self.shares, key=lambda s: len(self.shares[s]))
+            self.shares[smallest].append(market)
+            changed.add(smallest)
+        self.restart(sorted(changed))
+        # The new owners' exposure includes the retired worker's positions.
+        self.ledger.set(slot, 0)
+
+    def check_balance(self) -> None:
+        sizes = [len(share) for share in self.shares.values()]
+        if len(sizes) > 1 and max(sizes) - min(sizes) > self.config.max_imbalance:
+            changed = rebalance(self.shares)
+            print("Rebalancing markets across workers", sorted(changed))
+            self.restart(sorted(changed))
@@ -0,0 +1,158 @@
+import copy
+from dataclasses import dataclass, field
+from typing import Any, Dict, Mapping, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from market_maker.utils.serialization import loads
+
+
+@dataclass
+class TransportConfig:
+    # The number of distinct hosts to keep connection pools for.
+    pool_connections: int = 4
+    # The number of keep-alive connections held open per host. This bounds
+    # how many requests can be in flight to Kalshi at once.
+    pool_maxsize: int = 16
+    # Seconds to wait for a TCP/TLS connection to be established.
+    connect_timeout_secs: float = 3.05
+    # Seconds to wait between bytes of a response before giving up.
+    read_timeout_secs: float = 10.0
+    # Negotiate HTTP/2 when available. Requires `httpx[http2]` to be installed.
+    http2: bool = False
+
+
+class TransportError(Exception):
+    """Raised when a request fails before an HTTP response is received, such as
+    on a connect or read timeout."""
+
+
+@dataclass
+class Response:
+    """A transport-agnostic view of an HTTP response."""
+
+    status: int
+    reason: str
+    content: bytes
+    headers: Mapping[str, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+    def json(self) -> Any:
+        return loads(self.content)
+
+
+class Transport:
+    """A persistent, pooled HTTP session shared by every call a client makes.
+
+    Connections are kept alive between requests so that only the first call to
+    a host pays for the TCP and TLS handshakes."""
+
+    def __init__(self, config: Optional[TransportConfig] = None):
+        self.config = config if config is not None else TransportConfig()
+        self.timeout = (
+            self.config.connect_timeout_secs,
+            self.config.read_timeout_secs,
+        )
+
+        self.session: Any = None
+        self.http2_client: Any = None
+        if self.config.http2:
+            self.http2_client = self._build_http2_client()
+        else:
+            self.session = self._build_session()
+
+    def _build_session(self, adapter: Optional[HTTPAdapter] = None) -> requests.Session:
+        session = requests.Session()
+        if adapter is None:
+            adapter = HTTPAdapter(
+                pool_connections=self.config.pool_connections,
+                pool_maxsize=self.config.pool_maxsize,
+            )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def fork(self) -> "Transport":
+        """A transport for another account that reuses this one's connection
+        pools but keeps its own cookies. Over HTTP/2, the client is shared.
+        Closing either transport closes the pools of both."""
+        transport = copy.copy(self)
+        if self.session is not None:
+            transport.session = self._build_session(
+                self.session.get_adapter("https://")
+            )
+        return transport
+
+    def _build_http2_client(self) -> Any:
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError(
+                "HTTP/2 support requires httpx. Run `pip install httpx[http2]`."
+            )
+
+        return httpx.Client(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=self.config.pool_maxsize,
+                max_keepalive_connections=self.config.pool_maxsize,
+            ),
+            timeout=httpx.Timeout(
+                self.config.read_timeout_secs,
+                connect=self.config.connect_timeout_secs,
+            ),
+        )
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        data: Optional[bytes] = None,
+    ) -> Response:
+        if self.http2_client is not None:
+            return self._http2_request(method, url, headers, params, data)
+
+        try:
+            response = self.session.request(
+                method,
+                url,
+                headers=headers,
+                params=params,
+                data=data,
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            raise TransportError("%s %s failed: %s" % (method, url, e)) from e
+        return Response(
+            response.status_code, response.reason, response.content, response.headers
+        )
+
+    def _http2_request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]],
+        params: Optional[Dict[str, Any]],
+        data: Optional[bytes],
+    ) -> Response:
+        import httpx
+
+        try:
+            r = self.http2_client.request(
+                method, url, headers=headers, params=params, content=data
+            )
+        except httpx.TransportError as e:
+            raise TransportError("%s %s failed: %s" % (method, url, e)) from e
+        return Response(r.status_code, r.reason_phrase, r.content, r.headers)
+
+    def close(self) -> None:
+        if self.http2_client is not None:
+            self.http2_client.close()
+        else:
+            self.session.close()
@@ -0,0 +1,185 @@
+import base64
+import hashlib
+import os
+import socket
+import ssl
+import struct
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+HANDSHAKE_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class WebSocketClosed(Exception):
+    """Raised when the other end closes the connection."""
+
+
+def accept_key(key: str) -> str:
+    digest = hashlib.sha1((key + HANDSHAKE_GUID).encode()).digest()
+    return base64.b64encode(digest).decode()
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool) -> bytes:
+    """Encodes a single, final frame. Clients must mask, servers must not."""
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 1 << 16:
+        header.append(mask_bit | 126)
+        header += struct.pack("!H", length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack("!Q", length)
+
+    if not mask:
+        return bytes(header) + payload
+    mask_key = os.urandom(4)
+    masked = bytes(b ^ mask_key[i % 4] for i, b in enumerate(payload))
+    return bytes(header) + mask_key + masked
+
+
+def _recv_exact(sock: socket.socket, n: int, started: bool = True) -> bytes:
+    """Reads `n` bytes. A timeout before any byte of a frame arrives is
+    raised as is, but one partway through a frame closes the connection,
+    since the stream can no longer be followed."""
+    buf = bytearray()
+    while len(buf) < n:
+        try:
+            chunk = sock.recv(n - len(buf))
+        except socket.timeout:
+            if started or len(buf) > 0:
+                raise WebSocketClosed("connection stalled partway through a frame")
+            raise
+        if not chunk:
+            raise WebSocketClosed("connection closed")
+        buf += chunk
+    return bytes(buf)
+
+
+def read_frame(sock: socket.socket) -> Tuple[bool, int, bytes]:
+    """Reads one frame. Returns whether it is final, its opcode and payload.
+
+    Raises socket.timeout if no frame starts within the socket's timeout."""
+    first, second = _recv_exact(sock, 2, started=False)
+    length = second & 0x7F
+    if length == 126:
+        (length,) = struct.unpack("!H", _recv_exact(sock, 2))
+    elif length == 127:
+        (length,) = struct.unpack("!Q", _recv_exact(sock, 8))
+
+    mask_key = _recv_exact(sock, 4) if second & 0x80 else None
+    payload = _recv_exact(sock, length)
+    if mask_key is not None:
+        payload = bytes(b ^ mask_key[i % 4] for i, b in enumerate(payload))
+    return bool(first & 0x80), first & 0x0F, payload
+
+
+class WebSocket:
+    """A minimal RFC 6455 client for exchanging text messages.
+
+    Pings are answered automatically and fragmented messages reassembled.
+    With a `ping_interval`, the server is pinged whenever it has sent nothing
+    for that long, and the connection is closed if it still sends nothing,
+    so that a connection that died silently is noticed."""
+
+    def __init__(self, sock: socket.socket, ping_interval: Optional[float] = None):
+        self.sock = sock
+        self.sock.settimeout(ping_interval)
+        # Frames may be sent from other threads while one thread receives.
+        self.send_lock = threading.Lock()
+
+    @classmethod
+    def connect(
+        cls,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        ping_interval: Optional[float] = None,
+    ) -> "WebSocket":
+        parsed = urlparse(url)
+        secure = parsed.scheme == "wss"
+        port = parsed.port or (443 if secure else 80)
+        host = parsed.hostname or ""
+
+        sock = socket.create_connection((host, port), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = (parsed.path or "/") + ("?" + parsed.query if parsed.query else "")
+        lines = [
+            "GET %s HTTP/1.1" % path,
+            "Host: %s:%d" % (host, port),
+            "Upgrade: websocket",
+            "Connection: Upgrade",
+            "Sec-WebSocket-Key: " + key,
+            "Sec-WebSocket-Version: 13",
+        ]
+        lines += ["%s: %s" % item for item in (headers or {}).items()]
+        sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode())
+
+        # Read the handshake a byte at a time so that no frame sent right after
+        # it is consumed along with it.
+        response = bytearray()
+        while not response.endswith(b"\r\n\r\n"):
+            response += _recv_exact(sock, 1)
+        head = response[:-4].decode("latin-1").split("\r\n")
+        status = head[0].split(" ")
+        if len(status) < 2 or status[1] != "101":
+            sock.close()
+            raise WebSocketClosed("handshake rejected: " + head[0])
+        fields = dict(line.split(": ", 1) for line in head[1:] if ": " in line)
+        if fields.get("Sec-WebSocket-Accept") != accept_key(key):
+            sock.close()
+            raise WebSocketClosed("handshake returned a bad accept key")
+
+        return cls(sock, ping_interval)
+
+    def send_frame(self, opcode: int, payload: bytes) -> None:
+        with self.send_lock:
+            self.sock.sendall(encode_frame(opcode, payload, mask=True))
+
+    def send_text(self, message: str) -> None:
+        self.send_frame(OP_TEXT, message.encode())
+
+    def recv_text(self) -> str:
+        """Blocks until a complete text message arrives."""
+        message = bytearray()
+        pinged = False
+        while True:
+            try:
+                final, opcode, payload = read_frame(self.sock)
+            except socket.timeout:
+                if pinged:
+                    raise WebSocketClosed("no reply to ping")
+                self.send_frame(OP_PING, b"")
+                pinged = True
+                continue
+            pinged = False
+            if opcode == OP_PING:
+                self.send_frame(OP_PONG, payload)
+            elif opcode == OP_CLOSE:
+                self.close()
+                raise WebSocketClosed("closed by peer")
+            elif opcode in (OP_TEXT, OP_BINARY, OP_CONTINUATION):
+                message += payload
+                if final:
+                    return message.decode()
+
+    def close(self) -> None:
+        try:
+            self.send_frame(OP_CLOSE, b"")
+        except OSError:
+            pass
+        self.sock.close()
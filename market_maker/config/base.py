@@ -57,6 +57,11 @@ def get_strategies() -> Dict[str, profiles.StrategyProfile]:
             # The manner you'd like to distribute your liquidity across
             # the 'depth' of ticks. Supported strategies:
             # LINEAR: Resting orders of equal size are placed at each tick.
+            # GEOMETRIC: Each tick holds 70% of the size of the tick above it.
+            # TOP_HEAVY: Sizes shrink in equal steps away from the top tick.
+            # EXPOSURE_SKEWED: Equal sizes, shrunk on the side that adds to
+            # your position and grown on the side that reduces it.
+            # Every strategy rests about the same total liquidity.
             distribution=Distribution.LINEAR,
         )
     ]
@@ -1,10 +1,24 @@
+import os
+from typing import Optional
+
 import yaml
 
 from market_maker.classes.credentials import Credentials
 from market_maker.classes.environment import Environment
 
 
-def get_credentials(env: Environment) -> Credentials:
+def get_credentials(env: Environment, account: Optional[str] = None) -> Credentials:
+    """The credentials of an environment's own entry, or of one of the
+    accounts listed under its `accounts`."""
+    # The local mock exchange accepts any login, so it needs no credentials.
+    if env == Environment.LOCAL and not os.path.isfile("./credentials.yaml"):
+        return Credentials("local", "local", True)
+
     with open("./credentials.yaml") as f:
-        data = yaml.safe_load(f.read())[env.name.lower()]
+        data = yaml.safe_load(f.read())
+    if env == Environment.LOCAL and "local" not in data:
+        return Credentials("local", "local", True)
+    data = data[env.name.lower()]
+    if account is not None:
+        data = data["accounts"][account]
     return Credentials(data["email"], data["password"], data["advanced_api"])
@@ -0,0 +1,18 @@
+import json
+import os
+from typing import Any
+
+
+def write_json(path: str, data: Any, mode: int = 0o644) -> None:
+    """Writes JSON to a file through a temporary file that replaces it
+    atomically, so that concurrent processes never see half of it."""
+    temp_path = "%s.%d.tmp" % (path, os.getpid())
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -0,0 +1,50 @@
+import json
+from typing import Dict, Iterable
+
+from market_maker.classes.environment import Environment
+from market_maker.utils.files import write_json
+
+
+def read_index(path: str) -> Dict[str, dict]:
+    """Every cached ticker, by environment, or none if the cache is missing or
+    unreadable."""
+    try:
+        with open(path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return index if isinstance(index, dict) else {}
+
+
+def load_market_ids(
+    path: str, env: Environment, tickers: Iterable[str], now: float, ttl_secs: float
+) -> Dict[str, str]:
+    """The cached market ids of those tickers that were resolved within the
+    last `ttl_secs`."""
+    markets = read_index(path).get(env.name.lower())
+    if not isinstance(markets, dict):
+        return {}
+    market_ids: Dict[str, str] = {}
+    for ticker in tickers:
+        entry = markets.get(ticker)
+        if (
+            isinstance(entry, dict)
+            and isinstance(entry.get("id"), str)
+            and isinstance(entry.get("resolved_at"), (int, float))
+            and 0 <= now - entry["resolved_at"] < ttl_secs
+        ):
+            market_ids[ticker] = entry["id"]
+    return market_ids
+
+
+def save_market_ids(
+    path: str, env: Environment, market_ids: Dict[str, str], resolved_at: float
+) -> None:
+    """Adds newly resolved tickers to the cache, keeping every other entry."""
+    index = read_index(path)
+    markets = index.get(env.name.lower())
+    if not isinstance(markets, dict):
+        markets = index[env.name.lower()] = {}
+    for ticker, market_id in market_ids.items():
+        markets[ticker] = {"id": market_id, "resolved_at": resolved_at}
+    write_json(path, index)
@@ -0,0 +1,24 @@
+import json
+from typing import Any, Union
+
+# orjson encodes and decodes several times faster than the standard library and
+# is used when it is installed.
+try:
+    import orjson
+except ImportError:
+    BACKEND = "json"
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    def loads(data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+else:
+    BACKEND = "orjson"
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def loads(data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
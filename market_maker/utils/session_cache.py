@@ -0,0 +1,48 @@
+import json
+import os
+import stat
+from typing import Dict, Optional
+
+from market_maker.classes.environment import Environment
+from market_maker.utils.files import write_json
+
+
+def session_key(env: Environment, email: str) -> str:
+    return "%s:%s" % (env.name.lower(), email)
+
+
+def read_sessions(path: str) -> Dict[str, dict]:
+    """Every cached session, or none if the cache is missing, unreadable or
+    readable by anyone but its owner."""
+    try:
+        if os.stat(path).st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+            print("Ignoring session cache readable by others:", path)
+            return {}
+        with open(path) as f:
+            sessions = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return sessions if isinstance(sessions, dict) else {}
+
+
+def load_session(path: str, env: Environment, email: str) -> Optional[dict]:
+    """The cached token, user id and login time of an account, if any."""
+    session = read_sessions(path).get(session_key(env, email))
+    if not isinstance(session, dict) or not {"token", "user_id", "issued_at"} <= set(
+        session
+    ):
+        return None
+    return session
+
+
+def save_session(
+    path: str, env: Environment, email: str, token: str, user_id: str, issued_at: float
+) -> None:
+    """Caches an account's session in a file only its owner can read."""
+    sessions = read_sessions(path)
+    sessions[session_key(env, email)] = {
+        "token": token,
+        "user_id": user_id,
+        "issued_at": issued_at,
+    }
+    write_json(path, sessions, mode=0o600)
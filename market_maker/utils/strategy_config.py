@@ -0,0 +1,87 @@
+import importlib.util
+import os
+from dataclasses import fields, is_dataclass
+from enum import Enum
+from typing import Any, Dict, List, Union, get_origin, get_type_hints
+
+import yaml
+
+from market_maker.classes.profiles import StrategyProfile
+
+# The strategies used when no config file is given.
+DEFAULT_CONFIG_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "config", "custom.py"
+)
+
+
+def load_strategies(path: str) -> Dict[str, StrategyProfile]:
+    """Reads strategies from a Python file defining `get_strategies`, like
+    custom.py, or from a YAML file mapping profile names to strategies.
+
+    The file is read afresh on every call."""
+    if path.endswith((".yaml", ".yml")):
+        with open(path) as f:
+            data = yaml.safe_load(f.read())
+        if not isinstance(data, dict):
+            raise ValueError("%s does not map profile names to strategies" % path)
+        return {
+            name: build(StrategyProfile, strategy, name)
+            for name, strategy in data.items()
+        }
+
+    spec = importlib.util.spec_from_file_location("_strategy_config", path)
+    if spec is None or spec.loader is None:
+        raise ValueError("%s is not a Python or YAML file" % path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.get_strategies()
+
+
+def build(cls: Any, data: Any, where: str) -> Any:
+    """Builds a config dataclass from a YAML mapping of its fields. Enums are
+    given by member name, and nested dataclasses by mappings of their own."""
+    if not isinstance(data, dict):
+        raise ValueError("%s should be a mapping" % where)
+    names = {field.name for field in fields(cls)}
+    unknown = set(data) - names
+    if unknown:
+        raise ValueError("Unknown settings in %s: %s" % (where, sorted(unknown)))
+    hints = get_type_hints(cls)
+    return cls(
+        **{
+            name: convert(hints[name], value, where + "." + name)
+            for name, value in data.items()
+        }
+    )
+
+
+def convert(kind: Any, value: Any, where: str) -> Any:
+    if get_origin(kind) is Union:
+        if value is None:
+            return None
+        kind = next(arg for arg in kind.__args__ if arg is not type(None))
+    if get_origin(kind) in (list, List):
+        if not isinstance(value, list):
+            raise ValueError("%s should be a list" % where)
+        return [
+            convert(kind.__args__[0], item, "%s[%d]" % (where, i))
+            for i, item in enumerate(value)
+        ]
+    if get_origin(kind) in (dict, Dict):
+        if not isinstance(value, dict):
+            raise ValueError("%s should be a mapping" % where)
+        return {
+            key: convert(kind.__args__[1], item, "%s.%s" % (where, key))
+            for key, item in value.items()
+        }
+    if isinstance(kind, type) and issubclass(kind, Enum):
+        if value not in kind.__members__:
+            raise ValueError(
+                "%s should be one of %s" % (where, ", ".join(kind.__members__))
+            )
+        return kind[value]
+    if is_dataclass(kind):
+        return build(kind, value, where)
+    if kind is float and isinstance(value, int):
+        return float(value)
+    return value
@@ -0,0 +1,41 @@
+import json
+from typing import Dict, Optional
+
+from market_maker.classes.environment import Environment
+from market_maker.utils.files import write_json
+
+
+def state_key(env: Environment, profile: str) -> str:
+    return "%s:%s" % (env.name.lower(), profile)
+
+
+def read_states(path: str) -> Dict[str, dict]:
+    """Every saved strategy state, or none if the file is missing or
+    unreadable."""
+    try:
+        with open(path) as f:
+            states = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return states if isinstance(states, dict) else {}
+
+
+def load_state(
+    path: str, env: Environment, profile: str, now: float, max_age_secs: float
+) -> Optional[dict]:
+    """The state a profile last saved, if it was saved within `max_age_secs`."""
+    state = read_states(path).get(state_key(env, profile))
+    if (
+        not isinstance(state, dict)
+        or not isinstance(state.get("saved_at"), (int, float))
+        or not isinstance(state.get("markets"), dict)
+        or not 0 <= now - state["saved_at"] < max_age_secs
+    ):
+        return None
+    return state
+
+
+def save_state(path: str, env: Environment, profile: str, state: dict) -> None:
+    states = read_states(path)
+    states[state_key(env, profile)] = state
+    write_json(path, states)